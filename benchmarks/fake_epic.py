@@ -0,0 +1,219 @@
+# BSD 3 - Clause License
+
+# Copyright(c) 2020, Zenotech
+# All rights reserved.
+
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+
+# 1. Redistributions of source code must retain the above copyright notice, this
+# list of conditions and the following disclaimer.
+
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and / or other materials provided with the distribution.
+
+# 3. Neither the name of the copyright holder nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES(INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+#         SERVICES
+#         LOSS OF USE, DATA, OR PROFITS
+#         OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT(INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""A stand-in for the parts of the EPIC REST API the benchmarks use.
+
+Jobs and projects are generated from their position in the listing when
+they are requested, so an account with a million jobs costs nothing until
+it is listed. The data session hands out credentials for the S3 stand-in in
+fake_s3.
+"""
+
+import datetime
+import json
+import re
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+BUCKET = "epic-benchmarks"
+PREFIX = "benchmark-user/"
+REGION = "eu-west-1"
+
+DEFAULT_PAGE_SIZE = 10
+
+APPS = ("zCFD", "OpenFOAM", "Sleep")
+STATUSES = ("Finished", "Running", "Failed")
+
+_EPOCH = datetime.datetime(2026, 1, 1, tzinfo=datetime.timezone.utc)
+
+
+def _time(moment):
+    return moment.isoformat().replace("+00:00", "Z")
+
+
+def _money(amount):
+    return {"currency_symbol": "£", "currency": "GBP", "amount": amount}
+
+
+def _page(count, item, query):
+    limit = int(query.get("limit", DEFAULT_PAGE_SIZE))
+    offset = int(query.get("offset", 0))
+    end = min(offset + limit, count)
+    return {
+        "count": count,
+        "next": "offset={}".format(end) if end < count else None,
+        "previous": None,
+        "results": [item(index) for index in range(offset, end)],
+    }
+
+
+class EpicHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    ROUTES = [
+        (re.compile(r"/api/v2/data/session/$"), "data_session"),
+        (re.compile(r"/api/v2/profile/settings/$"), "profile_settings"),
+        (re.compile(r"/api/v2/projects/$"), "project_list"),
+        (re.compile(r"/api/v2/projects/(\d+)/$"), "project_details"),
+        (re.compile(r"/api/v2/job/$"), "job_list"),
+        (re.compile(r"/api/v2/job/(\d+)/$"), "job_details"),
+    ]
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, status, data):
+        body = json.dumps(data).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        self.server.count()
+        url = urlparse(self.path)
+        query = {k: v[0] for k, v in parse_qs(url.query).items()}
+        for pattern, name in self.ROUTES:
+            match = pattern.match(url.path)
+            if match:
+                data = getattr(self, name)(query, *(int(g) for g in match.groups()))
+                if data is None:
+                    return self._send(404, {"detail": "Not found."})
+                return self._send(200, data)
+        self._send(404, {"detail": "Not found."})
+
+    def data_session(self, query):
+        expiration = datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(
+            hours=12
+        )
+        return {
+            "s3_obj_key": PREFIX,
+            "s3_location": BUCKET,
+            "aws_region": REGION,
+            "session_token": {
+                "aws_key_id": "benchmark",
+                "aws_secret_key": "benchmark",
+                "aws_session_token": "benchmark",
+                "expiration": _time(expiration),
+            },
+        }
+
+    def profile_settings(self, query):
+        return {"id": 1, "display_currency": "GBP", "display_currency_symbol": "£"}
+
+    def project(self, index):
+        return {
+            "pk": index + 1,
+            "project_id": "PROJECT{:07d}".format(index + 1),
+            "description": "",
+            "closed": index % 7 == 6,
+        }
+
+    def project_list(self, query):
+        return _page(self.server.projects, self.project, query)
+
+    def project_details(self, query, pk):
+        if not 0 < pk <= self.server.projects:
+            return None
+        details = self.project(pk - 1)
+        details.update(
+            {
+                "all_users": True,
+                "authorized_user_profiles": [],
+                "has_budget": pk % 2 == 0,
+                "spend_limit": _money(1000.0),
+                "current_spend": _money(float(pk % 1000)),
+            }
+        )
+        return details
+
+    def job(self, index):
+        """ The job at index in the listing, newest first """
+        job_id = self.server.jobs - index
+        submitted = _EPOCH - datetime.timedelta(minutes=index)
+        return {
+            "id": job_id,
+            "name": "job{}".format(job_id),
+            "app": APPS[index % len(APPS)],
+            "status": STATUSES[index % len(STATUSES)],
+            "submitted_by": "user{}".format(index % 4),
+            "submitted_at": _time(submitted),
+            "finished": True,
+            "job_steps": [],
+            "project": None,
+            "array": None,
+            "resource": None,
+            "cost": None,
+            "invoice_reference": None,
+            "config": None,
+        }
+
+    def job_list(self, query):
+        return _page(self.server.jobs, self.job, query)
+
+    def job_details(self, query, job_id):
+        if not 0 < job_id <= self.server.jobs:
+            return None
+        return self.job(self.server.jobs - job_id)
+
+
+class FakeEpic(ThreadingHTTPServer):
+    """An EPIC API stand-in listening on host:port, port 0 picks a free port.
+
+    The account has the given number of jobs and projects, which can be
+    changed between requests. requests counts the requests received since it
+    was last reset.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, host="127.0.0.1", port=0, jobs=0, projects=0):
+        super().__init__((host, port), EpicHandler)
+        self.jobs = jobs
+        self.projects = projects
+        self.requests = 0
+        self._count_lock = threading.Lock()
+
+    @property
+    def url(self):
+        return "http://{}:{}".format(*self.server_address)
+
+    def count(self):
+        with self._count_lock:
+            self.requests += 1
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
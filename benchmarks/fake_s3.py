@@ -0,0 +1,413 @@
+# BSD 3 - Clause License
+
+# Copyright(c) 2020, Zenotech
+# All rights reserved.
+
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+
+# 1. Redistributions of source code must retain the above copyright notice, this
+# list of conditions and the following disclaimer.
+
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and / or other materials provided with the distribution.
+
+# 3. Neither the name of the copyright holder nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES(INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+#         SERVICES
+#         LOSS OF USE, DATA, OR PROFITS
+#         OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT(INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""An in-memory stand-in for the parts of the S3 API the CLI uses.
+
+Keys are held in a sorted list so listings, with or without a delimiter,
+cost the same as on S3 however many objects there are, and synthetic
+objects only store their size, the content of which is generated when they
+are read. This lets the benchmarks list trees of a million objects without
+the memory, or the time to create them, of a real store.
+"""
+
+import bisect
+import datetime
+import hashlib
+import threading
+import time
+import uuid
+import xml.etree.ElementTree as ElementTree
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlparse
+from xml.sax.saxutils import escape
+
+
+MAX_KEYS = 1000
+
+# Sorts after every character that can appear in a key
+_LAST = "\U0010ffff"
+
+_NAMESPACE = "http://s3.amazonaws.com/doc/2006-03-01/"
+
+
+def _synthetic_body(size):
+    return b"x" * size
+
+
+class StoredObject(object):
+    """ An object, with body None if it is synthetic """
+
+    __slots__ = ("size", "etag", "modified", "body")
+
+    def __init__(self, size, etag, modified, body=None):
+        self.size = size
+        self.etag = etag
+        self.modified = modified
+        self.body = body
+
+    def read(self):
+        return self.body if self.body is not None else _synthetic_body(self.size)
+
+
+class Bucket(object):
+    """The objects of one bucket.
+
+    Deleted keys are left in the sorted list and skipped until more than
+    half of it is deleted, so deleting a large tree does not shift the list
+    once for every key.
+    """
+
+    def __init__(self):
+        self.objects = {}
+        self._keys = []
+        self._lock = threading.Lock()
+        self.uploads = {}
+
+    def put(self, key, obj):
+        with self._lock:
+            if key not in self.objects:
+                index = bisect.bisect_left(self._keys, key)
+                if index == len(self._keys) or self._keys[index] != key:
+                    self._keys.insert(index, key)
+            self.objects[key] = obj
+
+    def add_synthetic(self, keys, size, modified):
+        """Add objects of size bytes for each of keys, replacing any
+        already stored"""
+        etag = '"{}"'.format(hashlib.md5(_synthetic_body(size)).hexdigest())
+        with self._lock:
+            for key in keys:
+                self.objects[key] = StoredObject(size, etag, modified)
+            self._keys = sorted(self.objects)
+
+    def get(self, key):
+        return self.objects.get(key)
+
+    def delete(self, key):
+        with self._lock:
+            self.objects.pop(key, None)
+            if len(self._keys) > 2 * len(self.objects) + MAX_KEYS:
+                self._keys = sorted(self.objects)
+
+    def delete_prefix(self, prefix):
+        with self._lock:
+            for key in [k for k in self.objects if k.startswith(prefix)]:
+                del self.objects[key]
+            self._keys = sorted(self.objects)
+
+    def count(self, prefix=""):
+        return sum(1 for key in self.objects if key.startswith(prefix))
+
+    def list(self, prefix, delimiter, start, max_keys):
+        """Return the objects and common prefixes of the first max_keys
+        entries at or after start and the start of the next page, if any"""
+        keys = self._keys
+        index = bisect.bisect_left(keys, max(prefix, start))
+        contents = []
+        prefixes = []
+        while index < len(keys):
+            key = keys[index]
+            if not key.startswith(prefix):
+                break
+            if len(contents) + len(prefixes) == max_keys:
+                return contents, prefixes, key
+            obj = self.objects.get(key)
+            if obj is None:
+                index += 1
+                continue
+            position = key.find(delimiter, len(prefix)) if delimiter else -1
+            if position < 0:
+                contents.append((key, obj))
+                index += 1
+            else:
+                common = key[: position + len(delimiter)]
+                prefixes.append(common)
+                index = bisect.bisect_left(keys, common + _LAST, index)
+        return contents, prefixes, None
+
+
+class S3Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    @property
+    def store(self):
+        return self.server.store
+
+    def _parse(self):
+        url = urlparse(self.path)
+        bucket, _, key = url.path.lstrip("/").partition("/")
+        query = {k: v[0] for k, v in parse_qs(url.query, keep_blank_values=True).items()}
+        self.server.count(self.command)
+        return self.store.setdefault(bucket, Bucket()), unquote(key), query
+
+    def _read_body(self):
+        length = int(self.headers.get("Content-Length", 0))
+        body = self.rfile.read(length)
+        if "aws-chunked" in self.headers.get("Content-Encoding", ""):
+            body = _decode_chunked(body)
+        return body
+
+    def _send(self, status, body=b"", headers=None):
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(body)
+
+    def _send_xml(self, status, body):
+        self._send(
+            status,
+            '<?xml version="1.0" encoding="UTF-8"?>\n{}'.format(body).encode("utf-8"),
+            {"Content-Type": "application/xml"},
+        )
+
+    def _error(self, status, code):
+        self._send_xml(
+            status, "<Error><Code>{}</Code><Message>{}</Message></Error>".format(code, code)
+        )
+
+    def _object_headers(self, obj):
+        return {
+            "ETag": obj.etag,
+            "Last-Modified": formatdate(obj.modified, usegmt=True),
+            "Content-Type": "binary/octet-stream",
+            "Accept-Ranges": "bytes",
+        }
+
+    def do_HEAD(self):
+        bucket, key, _ = self._parse()
+        obj = bucket.get(key)
+        if obj is None:
+            return self._send(404)
+        headers = self._object_headers(obj)
+        self.send_response(200)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(obj.size))
+        self.end_headers()
+
+    def do_GET(self):
+        bucket, key, query = self._parse()
+        if not key:
+            return self._list(bucket, query)
+        if "uploadId" in query:
+            return self._list_parts(bucket, key, query)
+        obj = bucket.get(key)
+        if obj is None:
+            return self._error(404, "NoSuchKey")
+        if_match = self.headers.get("If-Match")
+        if if_match and if_match != obj.etag:
+            return self._error(412, "PreconditionFailed")
+        body = obj.read()
+        headers = self._object_headers(obj)
+        ranged = self.headers.get("Range")
+        if ranged:
+            first, _, last = ranged.split("=", 1)[1].partition("-")
+            first = int(first)
+            last = min(int(last) if last else obj.size - 1, obj.size - 1)
+            headers["Content-Range"] = "bytes {}-{}/{}".format(first, last, obj.size)
+            return self._send(206, body[first : last + 1], headers)
+        self._send(200, body, headers)
+
+    def do_PUT(self):
+        bucket, key, query = self._parse()
+        body = self._read_body()
+        etag = '"{}"'.format(hashlib.md5(body).hexdigest())
+        if "uploadId" in query:
+            upload = bucket.uploads.get(query["uploadId"])
+            if upload is None:
+                return self._error(404, "NoSuchUpload")
+            upload[int(query["partNumber"])] = (etag, body)
+        else:
+            bucket.put(key, StoredObject(len(body), etag, self.server.clock(), body))
+        self._send(200, headers={"ETag": etag})
+
+    def do_POST(self):
+        bucket, key, query = self._parse()
+        body = self._read_body()
+        if "delete" in query:
+            return self._delete_objects(bucket, body)
+        if "uploads" in query:
+            upload_id = uuid.uuid4().hex
+            bucket.uploads[upload_id] = {}
+            return self._send_xml(
+                200,
+                "<InitiateMultipartUploadResult><Bucket>{}</Bucket><Key>{}</Key>"
+                "<UploadId>{}</UploadId></InitiateMultipartUploadResult>".format(
+                    "", escape(key), upload_id
+                ),
+            )
+        upload = bucket.uploads.pop(query.get("uploadId"), None)
+        if upload is None:
+            return self._error(404, "NoSuchUpload")
+        parts = [upload[number] for number in sorted(upload)]
+        data = b"".join(part for _, part in parts)
+        digest = hashlib.md5(b"".join(bytes.fromhex(etag.strip('"')) for etag, _ in parts))
+        etag = '"{}-{}"'.format(digest.hexdigest(), len(parts))
+        bucket.put(key, StoredObject(len(data), etag, self.server.clock(), data))
+        self._send_xml(
+            200,
+            "<CompleteMultipartUploadResult><Key>{}</Key><ETag>{}</ETag>"
+            "</CompleteMultipartUploadResult>".format(escape(key), escape(etag)),
+        )
+
+    def do_DELETE(self):
+        bucket, key, query = self._parse()
+        if "uploadId" in query:
+            bucket.uploads.pop(query["uploadId"], None)
+        else:
+            bucket.delete(key)
+        self._send(204)
+
+    def _list(self, bucket, query):
+        prefix = query.get("prefix", "")
+        delimiter = query.get("delimiter", "")
+        max_keys = min(int(query.get("max-keys", MAX_KEYS)), MAX_KEYS)
+        token = query.get("continuation-token")
+        start = bytes.fromhex(token).decode("utf-8") if token else query.get("start-after", "")
+        contents, prefixes, following = bucket.list(prefix, delimiter, start, max_keys)
+        parts = [
+            "<ListBucketResult xmlns=\"{}\">".format(_NAMESPACE),
+            "<Prefix>{}</Prefix>".format(escape(prefix)),
+            "<KeyCount>{}</KeyCount>".format(len(contents) + len(prefixes)),
+            "<MaxKeys>{}</MaxKeys>".format(max_keys),
+            "<IsTruncated>{}</IsTruncated>".format("true" if following else "false"),
+        ]
+        if delimiter:
+            parts.append("<Delimiter>{}</Delimiter>".format(escape(delimiter)))
+        if token:
+            parts.append("<ContinuationToken>{}</ContinuationToken>".format(token))
+        if following:
+            parts.append(
+                "<NextContinuationToken>{}</NextContinuationToken>".format(
+                    following.encode("utf-8").hex()
+                )
+            )
+        for key, obj in contents:
+            parts.append(
+                "<Contents><Key>{}</Key><LastModified>{}</LastModified>"
+                "<ETag>{}</ETag><Size>{}</Size><StorageClass>STANDARD</StorageClass>"
+                "</Contents>".format(
+                    escape(key), _iso_time(obj.modified), escape(obj.etag), obj.size
+                )
+            )
+        for common in prefixes:
+            parts.append(
+                "<CommonPrefixes><Prefix>{}</Prefix></CommonPrefixes>".format(escape(common))
+            )
+        parts.append("</ListBucketResult>")
+        self._send_xml(200, "".join(parts))
+
+    def _list_parts(self, bucket, key, query):
+        upload = bucket.uploads.get(query["uploadId"])
+        if upload is None:
+            return self._error(404, "NoSuchUpload")
+        parts = "".join(
+            "<Part><PartNumber>{}</PartNumber><ETag>{}</ETag><Size>{}</Size></Part>".format(
+                number, escape(etag), len(data)
+            )
+            for number, (etag, data) in sorted(upload.items())
+        )
+        self._send_xml(
+            200,
+            "<ListPartsResult><Key>{}</Key><UploadId>{}</UploadId>"
+            "<IsTruncated>false</IsTruncated>{}</ListPartsResult>".format(
+                escape(key), query["uploadId"], parts
+            ),
+        )
+
+    def _delete_objects(self, bucket, body):
+        root = ElementTree.fromstring(body)
+        deleted = []
+        for element in root.iter():
+            if element.tag.rsplit("}", 1)[-1] == "Key":
+                bucket.delete(element.text)
+                deleted.append(
+                    "<Deleted><Key>{}</Key></Deleted>".format(escape(element.text))
+                )
+        self._send_xml(200, "<DeleteResult>{}</DeleteResult>".format("".join(deleted)))
+
+
+def _decode_chunked(body):
+    """ The payload of a body sent with aws-chunked content encoding """
+    data = []
+    position = 0
+    while True:
+        end = body.index(b"\r\n", position)
+        size = int(body[position:end].split(b";", 1)[0], 16)
+        if size == 0:
+            return b"".join(data)
+        data.append(body[end + 2 : end + 2 + size])
+        position = end + 2 + size + 2
+
+
+def _iso_time(timestamp):
+    moment = datetime.datetime.fromtimestamp(timestamp, datetime.timezone.utc)
+    return moment.strftime("%Y-%m-%dT%H:%M:%S.000Z")
+
+
+class FakeS3(ThreadingHTTPServer):
+    """An S3 stand-in listening on host:port, port 0 picks a free port.
+
+    requests counts the requests received by HTTP method since it was last
+    reset.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, host="127.0.0.1", port=0, clock=None):
+        super().__init__((host, port), S3Handler)
+        self.store = {}
+        self.clock = clock or time.time
+        self.requests = {}
+        self._count_lock = threading.Lock()
+
+    @property
+    def url(self):
+        return "http://{}:{}".format(*self.server_address)
+
+    def bucket(self, name):
+        return self.store.setdefault(name, Bucket())
+
+    def count(self, method):
+        with self._count_lock:
+            self.requests[method] = self.requests.get(method, 0) + 1
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
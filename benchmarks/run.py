@@ -0,0 +1,390 @@
+# BSD 3 - Clause License
+
+# Copyright(c) 2020, Zenotech
+# All rights reserved.
+
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+
+# 1. Redistributions of source code must retain the above copyright notice, this
+# list of conditions and the following disclaimer.
+
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and / or other materials provided with the distribution.
+
+# 3. Neither the name of the copyright holder nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES(INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+#         SERVICES
+#         LOSS OF USE, DATA, OR PROFITS
+#         OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT(INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""Time CLI commands against a local EPIC API and S3 stand-in.
+
+A fake EPIC API (fake_epic.py) and an in-memory S3 stand-in (fake_s3.py)
+are started in this process, and for each size the account is given that
+many jobs and a synthetic tree of that many files. Each command then runs
+in a fresh interpreter, with the median wall clock time of --runs runs
+recorded together with the number of requests it made. Cold start is
+measured as in startup.py. The results are written to JSON, and comparing
+them with those of an earlier release shows which commands have become
+slower:
+
+    python benchmarks/run.py --sizes 1000,10000 --output results.json
+    python benchmarks/run.py --baseline results.json
+
+Transfers of a million files take hours, so sync and rm only run for sizes
+up to --max-transfer.
+"""
+
+import argparse
+import datetime
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from fake_epic import BUCKET, PREFIX, REGION, FakeEpic
+from fake_s3 import FakeS3
+from startup import SCENARIOS, time_command
+
+
+DEFAULT_SIZES = "1000,10000"
+DEFAULT_RUNS = 3
+DEFAULT_FILE_SIZE = 1024
+DEFAULT_MAX_TRANSFER = 10000
+
+# Nobody has a million projects, and each is fetched on its own
+MAX_PROJECTS = 1000
+
+FILES_PER_FOLDER = 100
+
+# A result more than this much slower than the baseline is a regression
+DEFAULT_TOLERANCE = 1.2
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CLI = "import sys; from epiccli.cli import main; sys.argv[0] = 'epic'; main()"
+
+
+class Benchmark(object):
+    """A CLI command to time.
+
+    setup is called before every run and check after each, returning an
+    error message if the command did not do what it should. Transfers are
+    skipped for sizes above --max-transfer.
+    """
+
+    def __init__(self, name, args, setup=None, check=None, transfer=False):
+        self.name = name
+        self.args = args
+        self.setup = setup
+        self.check = check
+        self.transfer = transfer
+
+
+class Environment(object):
+    """ The fake services and a home directory with a profile using them """
+
+    def __init__(self, directory, file_size):
+        self.directory = directory
+        self.file_size = file_size
+        self.epic = FakeEpic().start()
+        self.s3 = FakeS3().start()
+        self.bucket = self.s3.bucket(BUCKET)
+        self.local = os.path.join(directory, "local")
+        self.config_file = os.path.join(directory, ".epic", "config")
+        os.makedirs(os.path.dirname(self.config_file))
+        with open(self.config_file, "w") as f:
+            f.write("[default]\nurl = {}\ntoken = benchmark\n".format(self.epic.url))
+        self.env = dict(
+            os.environ,
+            HOME=directory,
+            USERPROFILE=directory,
+            EPIC_NO_DAEMON="1",
+            EPIC_S3_ENDPOINT_URL=self.s3.url,
+            AWS_ENDPOINT_URL_S3=self.s3.url,
+            AWS_DEFAULT_REGION=REGION,
+        )
+
+    def close(self):
+        self.epic.shutdown()
+        self.s3.shutdown()
+
+    def seed(self, folder, count):
+        """ Replace the files in folder with count synthetic files """
+        prefix = PREFIX + folder
+        self.bucket.delete_prefix(prefix)
+        self.bucket.add_synthetic(
+            (
+                "{}dir{:05d}/file{:07d}.dat".format(prefix, i // FILES_PER_FOLDER, i)
+                for i in range(count)
+            ),
+            self.file_size,
+            time.time() - 3600,
+        )
+
+    def remote_count(self, folder):
+        return self.bucket.count(PREFIX + folder)
+
+    def local_count(self):
+        return sum(len(files) for _, _, files in os.walk(self.local))
+
+    def run(self, args):
+        """Run the CLI with args, returning the seconds it took and an
+        error message if it failed"""
+        self.epic.requests = 0
+        self.s3.requests = {}
+        started = time.perf_counter()
+        process = subprocess.run(
+            [sys.executable, "-c", CLI, "--config", self.config_file] + args,
+            env=self.env,
+            cwd=self.directory,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.PIPE,
+            text=True,
+        )
+        elapsed = time.perf_counter() - started
+        if process.returncode != 0:
+            return elapsed, "exit status {}: {}".format(
+                process.returncode, process.stderr.strip()[-500:]
+            )
+        return elapsed, None
+
+
+def benchmarks(environment, size):
+    """ The commands timed for a tree and an account of size files and jobs """
+
+    def empty_local():
+        shutil.rmtree(environment.local, ignore_errors=True)
+        os.makedirs(environment.local)
+
+    def expect_local():
+        count = environment.local_count()
+        if count != size:
+            return "{} files downloaded, expected {}".format(count, size)
+
+    def empty_upload():
+        environment.bucket.delete_prefix(PREFIX + "upload/")
+
+    def expect_upload():
+        count = environment.remote_count("upload/")
+        if count != size:
+            return "{} files uploaded, expected {}".format(count, size)
+
+    def expect_deleted():
+        count = environment.remote_count("upload/")
+        if count:
+            return "{} files left after rm".format(count)
+
+    local = environment.local + os.sep
+    return [
+        Benchmark("project list", ["project", "list"]),
+        Benchmark("job list", ["job", "list", "--all"]),
+        Benchmark("data ls", ["data", "ls", "--recursive", "epic://tree/"]),
+        Benchmark(
+            "sync download",
+            ["data", "sync", "--rescan", "epic://tree/", local],
+            setup=empty_local,
+            check=expect_local,
+            transfer=True,
+        ),
+        Benchmark(
+            "sync download no-op",
+            ["data", "sync", "epic://tree/", local],
+            check=expect_local,
+            transfer=True,
+        ),
+        Benchmark(
+            "sync upload",
+            ["data", "sync", "--rescan", local, "epic://upload/"],
+            setup=empty_upload,
+            check=expect_upload,
+            transfer=True,
+        ),
+        Benchmark(
+            "sync upload no-op",
+            ["data", "sync", local, "epic://upload/"],
+            check=expect_upload,
+            transfer=True,
+        ),
+        Benchmark(
+            "rm",
+            ["data", "rm", "epic://upload/"],
+            setup=lambda: environment.seed("upload/", size),
+            check=expect_deleted,
+            transfer=True,
+        ),
+    ]
+
+
+def time_benchmark(environment, benchmark, runs):
+    timings = []
+    for _ in range(runs):
+        if benchmark.setup is not None:
+            benchmark.setup()
+        elapsed, error = environment.run(benchmark.args)
+        if error is None and benchmark.check is not None:
+            error = benchmark.check()
+        if error is not None:
+            return {"error": error}
+        timings.append(elapsed)
+    return {
+        "seconds": statistics.median(timings),
+        "timings": timings,
+        "api_requests": environment.epic.requests,
+        "s3_requests": dict(environment.s3.requests),
+    }
+
+
+def run_benchmarks(args):
+    results = []
+    directory = tempfile.mkdtemp(prefix="epic-benchmarks-")
+    environment = Environment(directory, args.file_size)
+    try:
+        for size in args.sizes:
+            environment.epic.jobs = size
+            environment.epic.projects = min(size, MAX_PROJECTS)
+            environment.seed("tree/", size)
+            for benchmark in benchmarks(environment, size):
+                if args.only and benchmark.name not in args.only:
+                    continue
+                if benchmark.transfer and size > args.max_transfer:
+                    continue
+                result = {"name": benchmark.name, "size": size}
+                result.update(time_benchmark(environment, benchmark, args.runs))
+                report(result)
+                results.append(result)
+    finally:
+        environment.close()
+        shutil.rmtree(directory, ignore_errors=True)
+    return results
+
+
+def report(result, baseline=None):
+    if "error" in result:
+        line = "failed, {}".format(result["error"])
+    else:
+        line = "{:9.3f} s  {:6} API {:8} S3 requests".format(
+            result["seconds"], result["api_requests"], sum(result["s3_requests"].values())
+        )
+    if baseline is not None:
+        line += "  {:+.0%}".format(result["seconds"] / baseline["seconds"] - 1)
+    print("{:20} {:>9}  {}".format(result["name"], result["size"], line), flush=True)
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            cwd=ROOT,
+            check=True,
+            capture_output=True,
+            text=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline_file, tolerance):
+    """Print how each result compares with the same one in baseline_file,
+    returning the number that are more than tolerance times slower"""
+    with open(baseline_file) as f:
+        baseline = {
+            (r["name"], r["size"]): r for r in json.load(f)["results"] if "seconds" in r
+        }
+    print("\nCompared with {}:".format(baseline_file))
+    regressions = 0
+    for result in results:
+        previous = baseline.get((result["name"], result["size"]))
+        if previous is None or "seconds" not in result:
+            continue
+        report(result, previous)
+        if result["seconds"] > previous["seconds"] * tolerance:
+            regressions += 1
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--sizes",
+        default=DEFAULT_SIZES,
+        type=lambda value: [int(float(size)) for size in value.split(",")],
+        help="Comma separated numbers of files and jobs, e.g. 1e3,1e6",
+    )
+    parser.add_argument("--runs", type=int, default=DEFAULT_RUNS)
+    parser.add_argument(
+        "--file-size",
+        type=int,
+        default=DEFAULT_FILE_SIZE,
+        help="Size in bytes of each file in the tree",
+    )
+    parser.add_argument(
+        "--max-transfer",
+        type=int,
+        default=DEFAULT_MAX_TRANSFER,
+        help="Largest size to run sync and rm for",
+    )
+    parser.add_argument(
+        "--only", action="append", help="Only run this benchmark, can be repeated"
+    )
+    parser.add_argument("--output", help="Write the results to this JSON file")
+    parser.add_argument("--baseline", help="Compare with results written by --output")
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=DEFAULT_TOLERANCE,
+        help="Exit with a non-zero status if a command takes this many times "
+        "longer than in the baseline",
+    )
+    args = parser.parse_args()
+
+    # Time this checkout rather than any installed version of the CLI
+    os.environ["PYTHONPATH"] = os.pathsep.join(
+        path for path in (ROOT, os.environ.get("PYTHONPATH")) if path
+    )
+    startup = {name: time_command(code, args.runs) for name, code in SCENARIOS}
+    print("{:20} {:>9}  {:9.3f} s".format("cold start", "", startup["help"] / 1000))
+    results = run_benchmarks(args)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(
+                {
+                    "created": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+                    "commit": git_commit(),
+                    "python": platform.python_version(),
+                    "platform": platform.platform(),
+                    "runs": args.runs,
+                    "file_size": args.file_size,
+                    "startup_ms": startup,
+                    "results": results,
+                },
+                f,
+                indent=2,
+            )
+    failed = any("error" in result for result in results)
+    if args.baseline and compare(results, args.baseline, args.tolerance):
+        failed = True
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,132 @@
+# BSD 3 - Clause License
+
+# Copyright(c) 2020, Zenotech
+# All rights reserved.
+
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+
+# 1. Redistributions of source code must retain the above copyright notice, this
+# list of conditions and the following disclaimer.
+
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and / or other materials provided with the distribution.
+
+# 3. Neither the name of the copyright holder nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES(INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+#         SERVICES
+#         LOSS OF USE, DATA, OR PROFITS
+#         OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT(INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""Check how long the CLI takes to start.
+
+Each measurement runs a fresh interpreter, so nothing is cached between
+runs apart from the operating system's file cache. The time taken by an
+interpreter that imports nothing is subtracted, and the script exits with
+a non-zero status if importing the CLI takes longer than the budget.
+
+    python benchmarks/startup.py --runs 20 --budget 150
+"""
+
+import argparse
+import statistics
+import subprocess
+import sys
+import time
+
+
+DEFAULT_RUNS = 10
+
+# Milliseconds that importing epiccli.cli may add to interpreter startup
+DEFAULT_BUDGET = 150
+
+SCENARIOS = [
+    ("interpreter", "pass"),
+    ("import", "import epiccli.cli"),
+    (
+        "help",
+        "import sys; from epiccli.cli import main; "
+        "sys.argv = ['epic', '--help']; main()",
+    ),
+]
+
+HEAVY_MODULES = ["pyepic", "boto3", "botocore", "pyfiglet"]
+
+
+def time_command(code, runs):
+    """ Return the median wall clock time in milliseconds of running code """
+    timings = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        subprocess.run(
+            [sys.executable, "-c", code],
+            check=True,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+
+def heavy_imports():
+    """ Return the slow optional modules that importing the CLI loads """
+    code = (
+        "import sys, epiccli.cli; "
+        "print(' '.join(m for m in {!r} if m in sys.modules))".format(HEAVY_MODULES)
+    )
+    output = subprocess.run(
+        [sys.executable, "-c", code], check=True, capture_output=True, text=True
+    ).stdout
+    return output.split()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=DEFAULT_RUNS)
+    parser.add_argument(
+        "--budget",
+        type=float,
+        default=DEFAULT_BUDGET,
+        help="Maximum milliseconds importing the CLI may take",
+    )
+    args = parser.parse_args()
+
+    results = {name: time_command(code, args.runs) for name, code in SCENARIOS}
+    baseline = results["interpreter"]
+    for name, _ in SCENARIOS:
+        print(
+            "{:12} {:8.1f} ms  (+{:.1f} ms)".format(
+                name, results[name], results[name] - baseline
+            )
+        )
+
+    failed = False
+    overhead = results["import"] - baseline
+    if overhead > args.budget:
+        print(
+            "Importing the CLI took {:.1f} ms, over the budget of {:.1f} ms".format(
+                overhead, args.budget
+            )
+        )
+        failed = True
+    loaded = heavy_imports()
+    if loaded:
+        print("Importing the CLI also imported {}".format(", ".join(loaded)))
+        failed = True
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
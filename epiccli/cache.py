@@ -0,0 +1,156 @@
+# BSD 3 - Clause License
+
+# Copyright(c) 2020, Zenotech
+# All rights reserved.
+
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+
+# 1. Redistributions of source code must retain the above copyright notice, this
+# list of conditions and the following disclaimer.
+
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and / or other materials provided with the distribution.
+
+# 3. Neither the name of the copyright holder nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES(INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+#         SERVICES
+#         LOSS OF USE, DATA, OR PROFITS
+#         OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT(INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import hashlib
+import json
+import os
+import tempfile
+import time
+from pathlib import Path
+
+
+CACHE_DIR = os.path.join(Path.home(), ".epic", "cache", "responses")
+
+# Catalog data rarely changes, so by default responses are kept for an hour
+DEFAULT_TTL = 3600
+
+DEFAULT_MAX_BYTES = 16 * 1024 * 1024
+
+
+class CachedResponse(object):
+    """ A response read back from a ResponseCache """
+
+    __slots__ = ("status", "headers", "body")
+
+    def __init__(self, status, headers, body):
+        self.status = status
+        self.headers = headers
+        self.body = body
+
+
+class ResponseCache(object):
+    """On disk cache of API responses that expire after ttl seconds.
+
+    Entries are keyed by namespace, which should identify the profile and
+    API endpoint, and by the request URL. Each entry is a file that is
+    written to a temporary name and renamed into place, so several processes
+    can share the cache without seeing partly written entries. When the
+    cache grows beyond max_bytes the least recently used entries are
+    removed. If refresh is set entries are never read, only replaced.
+    """
+
+    def __init__(
+        self,
+        namespace,
+        ttl=DEFAULT_TTL,
+        max_bytes=DEFAULT_MAX_BYTES,
+        directory=CACHE_DIR,
+        refresh=False,
+    ):
+        self.namespace = namespace
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.directory = directory
+        self.refresh = refresh
+
+    def _path(self, key):
+        digest = hashlib.sha256(
+            "{}\n{}".format(self.namespace, key).encode("utf-8")
+        ).hexdigest()
+        return os.path.join(self.directory, digest + ".json")
+
+    def get(self, key):
+        """ Return the CachedResponse for key, or None if there is no fresh one """
+        if self.refresh:
+            return None
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as entry_file:
+                entry = json.load(entry_file)
+        except (OSError, ValueError):
+            return None
+        if entry.get("key") != key or entry["stored"] + self.ttl < time.time():
+            return None
+        try:
+            # Record the use for least recently used eviction
+            os.utime(path)
+        except OSError:
+            pass
+        return CachedResponse(entry["status"], entry["headers"], entry["body"])
+
+    def put(self, key, status, headers, body):
+        os.makedirs(self.directory, mode=0o700, exist_ok=True)
+        entry = {
+            "key": key,
+            "stored": time.time(),
+            "status": status,
+            "headers": headers,
+            "body": body,
+        }
+        fd, temp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as entry_file:
+                json.dump(entry, entry_file)
+            os.replace(temp_path, self._path(key))
+        except BaseException:
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+            raise
+        self._evict()
+
+    def _evict(self):
+        entries = []
+        total = 0
+        with os.scandir(self.directory) as scan:
+            for item in scan:
+                if not item.name.endswith(".json"):
+                    continue
+                try:
+                    stat = item.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, item.path))
+                total += stat.st_size
+        if total <= self.max_bytes:
+            return
+        entries.sort()
+        for _, size, path in entries:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                # Already evicted by another process
+                pass
+            total -= size
+            if total <= self.max_bytes:
+                break
@@ -0,0 +1,365 @@
+# BSD 3 - Clause License
+
+# Copyright(c) 2020, Zenotech
+# All rights reserved.
+
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+
+# 1. Redistributions of source code must retain the above copyright notice, this
+# list of conditions and the following disclaimer.
+
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and / or other materials provided with the distribution.
+
+# 3. Neither the name of the copyright holder nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES(INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+#         SERVICES
+#         LOSS OF USE, DATA, OR PROFITS
+#         OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT(INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import contextlib
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+
+
+MIN_PART_SIZE = 5 * 1024 * 1024
+MAX_PARTS = 10000
+DEFAULT_PART_SIZE = 64 * 1024 * 1024
+DEFAULT_CONCURRENCY = 8
+
+# Size of the reads used to stream a downloaded part to disk
+READ_CHUNK_SIZE = 1024 * 1024
+
+DOWNLOAD_SUFFIX = ".epicdownload"
+
+
+def choose_part_size(size, part_size=DEFAULT_PART_SIZE):
+    """Return a part size no smaller than part_size that splits size into at
+    most MAX_PARTS parts."""
+    part_size = max(part_size, MIN_PART_SIZE)
+    while (size + part_size - 1) // part_size > MAX_PARTS:
+        part_size *= 2
+    return part_size
+
+
+def part_ranges(size, part_size):
+    """Yield (part_number, offset, length) for each part of a file, part
+    numbers start at 1 as they do in S3."""
+    part_number = 1
+    offset = 0
+    while offset < size:
+        length = min(part_size, size - offset)
+        yield part_number, offset, length
+        part_number += 1
+        offset += length
+
+
+def _cancel_parts(futures):
+    """Cancel the parts that have not started and wait for the rest to
+    finish, so none is still using the file when it is closed. Its
+    descriptor could otherwise be reused for another file."""
+    for future in futures:
+        future.cancel()
+    wait(futures)
+
+
+class _PositionedFile(object):
+    """Thread safe positioned reads and writes on a single file descriptor.
+
+    os.pread/os.pwrite are used where available, elsewhere (Windows) seek and
+    read/write are serialised with a lock.
+    """
+
+    def __init__(self, path, flags):
+        self.path = path
+        self.fd = os.open(path, flags | getattr(os, "O_BINARY", 0), 0o666)
+        self._lock = None if hasattr(os, "pwrite") else threading.Lock()
+
+    def read(self, length, offset):
+        if self._lock is None:
+            return os.pread(self.fd, length, offset)
+        with self._lock:
+            os.lseek(self.fd, offset, os.SEEK_SET)
+            return os.read(self.fd, length)
+
+    def write(self, data, offset):
+        view = memoryview(data)
+        while view:
+            if self._lock is None:
+                written = os.pwrite(self.fd, view, offset)
+            else:
+                with self._lock:
+                    os.lseek(self.fd, offset, os.SEEK_SET)
+                    written = os.write(self.fd, view)
+            view = view[written:]
+            offset += written
+
+    def allocate(self, size):
+        if hasattr(os, "posix_fallocate") and size > 0:
+            try:
+                os.posix_fallocate(self.fd, 0, size)
+                return
+            except OSError:
+                # Not supported by every file system, fall back to a sparse file
+                pass
+        os.ftruncate(self.fd, size)
+
+    def close(self):
+        os.close(self.fd)
+
+
+class ChunkedTransfer(object):
+    """Upload and download files in parts of part_size bytes.
+
+    Parts are transferred concurrently on a pool of concurrency threads that
+    is shared by every file handled by this instance, so at most
+    concurrency * part_size bytes are held in memory at once. Files no larger
+    than part_size are sent with a single request. Downloads are written
+    straight into a preallocated temporary file with positioned writes and
+    renamed into place once every part has arrived.
+
+    If a TransferJournal is supplied every finished part is recorded in it,
+    and unfinished multipart uploads and partial downloads are left in place
+    on failure so that a later transfer with the same journal can pick up
+    where this one stopped.
+
+    max_connections caps the number of requests carrying file data that are
+    in flight at once, across every thread using this instance.
+    """
+
+    def __init__(
+        self,
+        storage,
+        part_size=DEFAULT_PART_SIZE,
+        concurrency=DEFAULT_CONCURRENCY,
+        journal=None,
+        max_connections=None,
+    ):
+        self.storage = storage
+        self.part_size = max(part_size, MIN_PART_SIZE)
+        self.concurrency = max(concurrency, 1)
+        self.journal = journal
+        if max_connections:
+            self._connections = threading.BoundedSemaphore(max_connections)
+        else:
+            self._connections = contextlib.nullcontext()
+        self._executor = None
+        self._executor_lock = threading.Lock()
+
+    @property
+    def executor(self):
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.concurrency)
+            return self._executor
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def upload(self, filename, key):
+        """ Upload local file filename to key and return the new object's ETag """
+        stat = os.stat(filename)
+        size = stat.st_size
+        if size <= self.part_size:
+            with self._connections, open(filename, "rb") as body:
+                response = self.storage.s3_client.put_object(
+                    Bucket=self.storage.bucket,
+                    Key=key,
+                    Body=body,
+                    Metadata=self.storage.meta_data,
+                )
+            return response["ETag"]
+        part_size = choose_part_size(size, self.part_size)
+        sig = "{}:{}".format(size, stat.st_mtime_ns)
+        upload_id, done = self._resumable_upload(key, sig, part_size)
+        if upload_id is None:
+            upload_id = self.storage.s3_client.create_multipart_upload(
+                Bucket=self.storage.bucket, Key=key, Metadata=self.storage.meta_data
+            )["UploadId"]
+            if self.journal is not None:
+                self.journal.start_upload(key, upload_id, sig, part_size)
+        source = _PositionedFile(filename, os.O_RDONLY)
+        futures = []
+        try:
+            for part_number, offset, length in part_ranges(size, part_size):
+                if part_number in done:
+                    continue
+                futures.append(
+                    self.executor.submit(
+                        self._upload_part,
+                        source,
+                        key,
+                        upload_id,
+                        part_number,
+                        offset,
+                        length,
+                    )
+                )
+            for future in futures:
+                part_number, etag = future.result()
+                done[part_number] = etag
+            response = self.storage.s3_client.complete_multipart_upload(
+                Bucket=self.storage.bucket,
+                Key=key,
+                UploadId=upload_id,
+                MultipartUpload={
+                    "Parts": [
+                        {"PartNumber": part_number, "ETag": done[part_number]}
+                        for part_number in sorted(done)
+                    ]
+                },
+            )
+        except BaseException:
+            _cancel_parts(futures)
+            if self.journal is None:
+                self.storage.s3_client.abort_multipart_upload(
+                    Bucket=self.storage.bucket, Key=key, UploadId=upload_id
+                )
+            raise
+        finally:
+            source.close()
+        return response["ETag"]
+
+    def _resumable_upload(self, key, sig, part_size):
+        """Find an unfinished multipart upload of key in the journal, keeping
+        only the parts that S3 still holds"""
+        from botocore.exceptions import ClientError
+
+        if self.journal is None:
+            return None, {}
+        upload_id, done = self.journal.upload_state(key, sig, part_size)
+        if upload_id is None:
+            return None, {}
+        stored = {}
+        try:
+            paginator = self.storage.s3_client.get_paginator("list_parts")
+            for page in paginator.paginate(
+                Bucket=self.storage.bucket, Key=key, UploadId=upload_id
+            ):
+                for part in page.get("Parts", []):
+                    stored[part["PartNumber"]] = part["ETag"]
+        except ClientError as error:
+            if error.response["Error"]["Code"] == "NoSuchUpload":
+                return None, {}
+            raise
+        return upload_id, {
+            part_number: etag
+            for part_number, etag in done.items()
+            if stored.get(part_number) == etag
+        }
+
+    def _upload_part(self, source, key, upload_id, part_number, offset, length):
+        data = source.read(length, offset)
+        with self._connections:
+            response = self.storage.s3_client.upload_part(
+                Bucket=self.storage.bucket,
+                Key=key,
+                UploadId=upload_id,
+                PartNumber=part_number,
+                Body=data,
+            )
+        if self.journal is not None:
+            self.journal.record_upload_part(key, part_number, response["ETag"])
+        return part_number, response["ETag"]
+
+    def download(self, key, filename, size=None, etag=None):
+        """Download key to local file filename.
+
+        size and etag can be supplied from a listing to save a HEAD request.
+        """
+        if size is None or etag is None:
+            head = self.storage.s3_client.head_object(
+                Bucket=self.storage.bucket, Key=key
+            )
+            size = head["ContentLength"]
+            etag = head["ETag"]
+        temp_filename = filename + DOWNLOAD_SUFFIX
+        if size <= self.part_size:
+            target = _PositionedFile(
+                temp_filename, os.O_WRONLY | os.O_CREAT | os.O_TRUNC
+            )
+            try:
+                target.allocate(size)
+                self._download_part(target, key, etag, 0, size, ranged=False)
+            except BaseException:
+                target.close()
+                os.remove(temp_filename)
+                raise
+        else:
+            part_size = choose_part_size(size, self.part_size)
+            sig = "{}:{}".format(size, etag)
+            done = None
+            if self.journal is not None and os.path.isfile(temp_filename):
+                done = self.journal.download_state(temp_filename, sig, part_size)
+            if done is None:
+                done = set()
+                target = _PositionedFile(
+                    temp_filename, os.O_WRONLY | os.O_CREAT | os.O_TRUNC
+                )
+                target.allocate(size)
+                if self.journal is not None:
+                    self.journal.start_download(temp_filename, sig, part_size)
+            else:
+                target = _PositionedFile(temp_filename, os.O_WRONLY)
+            futures = []
+            try:
+                for _, offset, length in part_ranges(size, part_size):
+                    if offset in done:
+                        continue
+                    futures.append(
+                        self.executor.submit(
+                            self._download_part, target, key, etag, offset, length
+                        )
+                    )
+                for future in futures:
+                    future.result()
+            except BaseException:
+                _cancel_parts(futures)
+                target.close()
+                if self.journal is None:
+                    os.remove(temp_filename)
+                raise
+        target.close()
+        os.replace(temp_filename, filename)
+        return size
+
+    def _download_part(self, target, key, etag, offset, length, ranged=True):
+        args = {"Bucket": self.storage.bucket, "Key": key}
+        if etag is not None:
+            # Fail rather than mix parts if the object is replaced mid-download
+            args["IfMatch"] = etag
+        if ranged:
+            args["Range"] = "bytes={}-{}".format(offset, offset + length - 1)
+        position = offset
+        with self._connections:
+            body = self.storage.s3_client.get_object(**args)["Body"]
+            try:
+                for chunk in iter(lambda: body.read(READ_CHUNK_SIZE), b""):
+                    target.write(chunk, position)
+                    position += len(chunk)
+            finally:
+                body.close()
+        if ranged and self.journal is not None:
+            self.journal.record_download_part(target.path, offset)
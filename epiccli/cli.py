@@ -31,23 +31,80 @@
 # OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 
 import click
-import pyfiglet
+import collections
 import os
+import sys
 import errno
-import pprint
 import json
 import configparser
-import botocore
+import datetime
+import functools
+import itertools
+import time
 
 from pathlib import Path
-from pyepic.client import EPICClient
-from pyepic.applications.openfoam import OpenFoamJob
-from pyepic.applications.zcfd import ZCFDJob
-from pyepic.desktops import Desktop
-from pyepic.desktops.desktop import MountType
 
 from .core import EpicConfig
+from .context import CliContext, DEFAULT_CONFIG_FILE
+from .shell import run_shell, run_batch
 from .path import check_path_is_folder
+from .storage import connect_storage
+from .transfer import (
+    plan_sync,
+    delete_extra,
+    TransferPool,
+    DEFAULT_WORKERS,
+    COMPARE_MODES,
+    COMPARE_MTIME,
+    COPY,
+    SKIP,
+    DELETE,
+    UPLOAD,
+)
+from .chunked import (
+    ChunkedTransfer,
+    DEFAULT_CONCURRENCY,
+    MIN_PART_SIZE,
+)
+from .journal import TransferJournal
+from .manifest import SyncManifest, forget_removed
+from .units import parse_size, parse_rate, format_size
+from .usage import DiskUsage, DEFAULT_WORKERS as DU_WORKERS
+from .delete import BatchDeleter, DEFAULT_WORKERS as DELETE_WORKERS
+from .filters import PathFilter
+from .jobs import (
+    JobFilter,
+    iter_jobs,
+    filter_from_settings,
+    parse_job_ids,
+    read_job_ids,
+    map_jobs,
+    openfoam_job,
+    zcfd_job,
+)
+from .watch import JobWatcher, LOGS, DEFAULT_INTERVAL, DEFAULT_MAX_INTERVAL
+from .output import (
+    FORMATS,
+    TEXT,
+    Table,
+    Records,
+    render,
+    set_format,
+    machine_readable,
+)
+from .sweep import (
+    load_manifest,
+    results_path as sweep_results_path,
+    SweepResults,
+    SweepSubmitter,
+    DEFAULT_RATE as SWEEP_RATE,
+    SUBMITTED,
+    SKIPPED,
+    FAILED,
+    DRYRUN,
+)
+from .trace import start_tracing
+from .pool import ordered_map, DEFAULT_WORKERS as POOL_WORKERS
 from .exceptions import ConfigurationException, CommandError
 
 
@@ -58,7 +115,86 @@ def format_localised_currency(data):
     return "{} {:.2f}".format(data.currency_symbol, data.amount)
 
 
-@click.group()
+def catalog_cache_options(command):
+    """Add --no-cache and --refresh to a command that reads the EPIC catalog,
+    and answer its catalog requests from the response cache"""
+
+    @functools.wraps(command)
+    def wrapper(*args, no_cache, refresh, **kwargs):
+        click.get_current_context().obj.cache_catalog(
+            enabled=not no_cache, refresh=refresh
+        )
+        return command(*args, **kwargs)
+
+    wrapper = click.option(
+        "--refresh", help="Fetch fresh catalog data and update the cache", is_flag=True
+    )(wrapper)
+    wrapper = click.option(
+        "--no-cache", help="Do not use or update the catalog cache", is_flag=True
+    )(wrapper)
+    return wrapper
+
+
+class ByteSize(click.ParamType):
+    """ Click parameter type for sizes such as "64MB" or "8MiB" """
+
+    name = "size"
+
+    def __init__(self, minimum=0):
+        self.minimum = minimum
+
+    def convert(self, value, param, ctx):
+        try:
+            size = parse_size(value)
+        except ValueError:
+            self.fail(f"{value!r} is not a valid size", param, ctx)
+        if size < self.minimum:
+            self.fail(f"{value!r} is smaller than the minimum of {self.minimum} bytes", param, ctx)
+        return size
+
+
+class ByteRate(click.ParamType):
+    """ Click parameter type for transfer rates such as "200MB/s" """
+
+    name = "rate"
+
+    def convert(self, value, param, ctx):
+        try:
+            rate = parse_rate(value)
+        except ValueError:
+            self.fail(f"{value!r} is not a valid rate", param, ctx)
+        if rate <= 0:
+            self.fail(f"{value!r} must be greater than zero", param, ctx)
+        return rate
+
+
+class EpicGroup(click.Group):
+    """ Root command group that hands read only queries to a running daemon """
+
+    def invoke(self, ctx):
+        from .daemon import forwardable, forward, socket_path
+
+        # Click 8.2 deprecated protected_args in favour of the private name
+        protected_args = getattr(ctx, "_protected_args", None)
+        if protected_args is None:
+            protected_args = ctx.protected_args
+        args = [*protected_args, *ctx.args]
+        # Requests made by the daemon cannot be traced here
+        tracing = ctx.params.get("timings") or ctx.params.get("trace")
+        if forwardable(args) and not tracing:
+            config = ctx.params.get("config")
+            config_file = os.path.expanduser(config) if config else DEFAULT_CONFIG_FILE
+            status = forward(
+                socket_path(config_file, ctx.params["profile"]),
+                args,
+                ctx.params["output"],
+            )
+            if status is not None:
+                ctx.exit(status)
+        return super().invoke(ctx)
+
+
+@click.group(cls=EpicGroup)
 @click.pass_context
 @click.option(
     "-c", "--config", help="Configuration file to load (default is ~/.epic/config)"
@@ -70,39 +206,64 @@ def format_localised_currency(data):
     default="default",
     show_default=True,
 )
-def main(ctx, config, profile):
+@click.option(
+    "--banner/--no-banner",
+    default=None,
+    help="Print the EPIC banner, by default only when output is a terminal",
+)
+@click.option(
+    "-o",
+    "--output",
+    type=click.Choice(FORMATS, case_sensitive=False),
+    default=TEXT,
+    help="Format of the results of list and details commands",
+    show_default=True,
+)
+@click.option(
+    "--timings",
+    is_flag=True,
+    help="Print the time spent on the HTTP requests made when the command exits",
+)
+@click.option(
+    "--trace",
+    type=click.Path(dir_okay=False, writable=True),
+    help="Write every HTTP request made to this file as JSON",
+)
+def main(ctx, config, profile, banner, output, timings, trace):
     """CLI for communicating with the EPIC"""
-    click.echo(pyfiglet.Figlet().renderText("EPIC by Zenotech"))
+    output = output.lower()
+    set_format(output)
+    if timings or trace:
+        ctx.call_on_close(functools.partial(_finish_trace, start_tracing(), timings, trace))
+    if banner is None:
+        banner = sys.stdout.isatty() and output == TEXT
+    if banner:
+        import pyfiglet
+
+        click.echo(pyfiglet.Figlet().renderText("EPIC by Zenotech"))
 
     # Don't attempt to load an API client when we're configuring
     if ctx.invoked_subcommand == "configure":
         return
 
-    config_file = os.path.join(Path.home(), ".epic", "config")
+    config_file = DEFAULT_CONFIG_FILE
     if config is not None:
         if os.path.isfile(os.path.expanduser(config)):
             config_file = os.path.expanduser(config)
         else:
             click.echo("Config file %s not found" % config)
             exit(1)
-    try:
-        click.echo("Loading config from %s" % config_file)
 
-        config = EpicConfig(config_file=config_file, config_section=profile)
+    # The config and SDK client are loaded when a command first uses them
+    ctx.obj = CliContext(config_file, profile)
 
-        # V2 API Client
-        epic = EPICClient(
-            connection_token=config.EPIC_TOKEN,
-            connection_url="{}/api/v2".format(config.EPIC_API_URL),
-        )
-        # Set the data source for file meta-data
-        epic.data.meta_source = "CLI"
 
-        # Store the config and SDK client in CLI context
-        ctx.obj = (config, epic)
-    except ConfigurationException:
-        click.echo("Configuration file not found or invalid, please run configure.")
-        exit(1)
+def _finish_trace(tracer, timings, trace):
+    if trace:
+        tracer.dump(trace)
+    if timings:
+        for line in tracer.report():
+            click.echo(line, err=True)
 
 
 @main.command()
@@ -149,6 +310,100 @@ def configure(ctx):
         click.echo("Config file written to %s" % config_file)
 
 
+@main.command()
+@click.pass_context
+def shell(ctx):
+    """Run EPIC commands interactively in a single session.
+
+    The configuration is loaded and the connection to EPIC is set up once and
+    reused by every command, so commands after the first respond quickly.
+    Enter commands without the leading "epic", e.g. "job list".
+    """
+    run_shell(ctx)
+
+
+@main.command()
+@click.pass_context
+@click.argument("file", type=click.File("r"), default="-")
+@click.option(
+    "--stop-on-error", help="Stop at the first command that fails", is_flag=True
+)
+@click.option("--echo", help="Print each command before running it", is_flag=True)
+def batch(ctx, file, stop_on_error, echo):
+    """Run the EPIC commands listed in FILE, one per line, or read them from
+    stdin if FILE is "-" or not given.
+
+    Commands are written without the leading "epic" and lines starting with
+    "#" are ignored. All commands share one configuration and connection to
+    EPIC. The exit status is non zero if any command failed.
+    """
+    failed = run_batch(ctx, file, stop_on_error=stop_on_error, echo=echo)
+    if failed:
+        ctx.exit(1)
+
+
+@main.group()
+@click.pass_context
+def daemon(ctx):
+    """Share one EPIC connection and cache between epic commands.
+
+    While a daemon is running for a profile, list and details queries from
+    other epic commands using that profile are answered by the daemon. Set
+    EPIC_NO_DAEMON to stop a command from using a running daemon.
+    """
+    pass
+
+
+@daemon.command()
+@click.pass_context
+def start(ctx):
+    """Run a daemon for the current profile until it is stopped"""
+    from .daemon import EpicDaemon, socket_path
+
+    path = socket_path(ctx.obj.config_file, ctx.obj.profile)
+    # Connect before accepting requests so that they share one client
+    ctx.obj.client
+    click.echo(f"EPIC daemon listening on {path}")
+    try:
+        EpicDaemon(ctx, path).serve()
+    except KeyboardInterrupt:
+        pass
+    except Exception as e:
+        click.echo("Daemon failed, %s" % e)
+        ctx.exit(1)
+    click.echo("EPIC daemon stopped")
+
+
+def _daemon_control(ctx, command):
+    from .daemon import control, socket_path
+
+    path = socket_path(ctx.obj.config_file, ctx.obj.profile)
+    try:
+        state = control(path, command)
+    except OSError:
+        click.echo("No EPIC daemon is running for this profile")
+        ctx.exit(1)
+    click.echo(
+        "Daemon {pid} up for {uptime:.0f}s, served {requests} requests, "
+        "{hits} from cache".format(**state)
+    )
+
+
+@daemon.command()
+@click.pass_context
+def status(ctx):
+    """Show whether a daemon is running for the current profile"""
+    _daemon_control(ctx, "status")
+
+
+@daemon.command()
+@click.pass_context
+def stop(ctx):
+    """Stop the daemon for the current profile"""
+    _daemon_control(ctx, "stop")
+    click.echo("EPIC daemon stopped")
+
+
 @main.group()
 @click.pass_context
 def project(ctx):
@@ -156,30 +411,125 @@ def project(ctx):
     pass
 
 
+PROJECT_FIELDS = {
+    "id": "ID",
+    "name": "Name",
+    "budget": "Budget",
+    "spend": "Spend",
+    "open": "Open",
+}
+
+# Fields that need a request per project to fetch the project details
+PROJECT_DETAIL_FIELDS = ("budget", "spend")
+
+
+class FieldList(click.ParamType):
+    """ Click parameter type for a comma separated selection of fields """
+
+    name = "fields"
+
+    def __init__(self, choices):
+        self.choices = choices
+
+    def convert(self, value, param, ctx):
+        if not isinstance(value, str):
+            return value
+        fields = [field.strip().lower() for field in value.split(",") if field.strip()]
+        unknown = [field for field in fields if field not in self.choices]
+        if unknown or not fields:
+            self.fail(
+                "{!r} is not a comma separated list of {}".format(
+                    value, ", ".join(self.choices)
+                ),
+                param,
+                ctx,
+            )
+        return fields
+
+
+class Setting(click.ParamType):
+    """ Click parameter type for KEY=VALUE settings """
+
+    name = "key=value"
+
+    def convert(self, value, param, ctx):
+        if isinstance(value, tuple):
+            return value
+        key, sep, setting = value.partition("=")
+        if not sep or not key.strip():
+            self.fail(f"{value!r} is not of the form KEY=VALUE", param, ctx)
+        return key.strip(), setting
+
+
 @project.command("list")
 @click.pass_context
-def list_projectcodes(ctx):
+@click.option(
+    "--fields",
+    type=FieldList(PROJECT_FIELDS),
+    default=",".join(PROJECT_FIELDS),
+    help="Comma separated list of the fields to show",
+    show_default=True,
+)
+@click.option(
+    "--workers",
+    default=POOL_WORKERS,
+    help="Number of project details to fetch concurrently",
+    show_default=True,
+)
+def list_projectcodes(ctx, fields, workers):
     """List your available project codes"""
-    click.echo("Your available EPIC Projects:")
-    click.echo("ID | Name | Budget | Spend | Open")
-    click.echo("-----------------------------")
-    for project in ctx.obj[1].projects.list():
-        project_details = ctx.obj[1].projects.get_details(project.pk)
-        open_str = "No" if project_details.closed else "Yes"
-        budget = (
+    client = ctx.obj.client
+
+    def with_details(project):
+        return project, client.projects.get_details(project.pk)
+
+    projects = client.projects.list()
+    if any(field in PROJECT_DETAIL_FIELDS for field in fields):
+        rows = ordered_map(with_details, projects, workers=workers)
+    else:
+        rows = ((project, None) for project in projects)
+    table = Table(
+        [(field, PROJECT_FIELDS[field]) for field in fields],
+        title="Your available EPIC Projects:",
+    )
+    with table:
+        for project, project_details in rows:
+            table.row(*_project_values(project, project_details, fields))
+
+
+def _project_values(project, project_details, fields):
+    values = {
+        "id": project.pk,
+        "name": project.project_id,
+        "open": "No" if project.closed else "Yes",
+    }
+    if project_details is not None:
+        values["budget"] = (
             format_localised_currency(project_details.spend_limit)
             if project_details.has_budget
             else "--"
         )
-        click.echo(
-            "{} | {} | {} | {} | {}".format(
-                project.pk,
-                project.project_id,
-                budget,
-                format_localised_currency(project_details.current_spend),
-                open_str,
-            )
-        )
+        values["spend"] = format_localised_currency(project_details.current_spend)
+    return [values[field] for field in fields]
+
+
+def _path_filter(include, exclude):
+    """ The PathFilter for --include and --exclude, failing on invalid patterns """
+    try:
+        return PathFilter(include, exclude)
+    except CommandError as e:
+        raise click.UsageError(str(e))
+
+
+def _echo_progress(message):
+    """ Overwrite the current progress line on stderr, if it is a terminal """
+    if sys.stderr.isatty():
+        click.echo("\r" + message, nl=False, err=True)
+
+
+def _end_progress():
+    if sys.stderr.isatty():
+        click.echo("", err=True)
 
 
 @main.group()
@@ -192,19 +542,159 @@ def data(ctx):
 @data.command("ls")
 @click.pass_context
 @click.argument("epicpath", required=False, type=str)
-def list(ctx, epicpath):
+@click.option(
+    "-r", "--recursive", help="List every file below EPICPATH", is_flag=True
+)
+@click.option(
+    "-l",
+    "--long",
+    "long_format",
+    help="Show the size and last modified time of each file",
+    is_flag=True,
+)
+@click.option("--limit", type=int, help="Stop after listing this many entries")
+@click.option(
+    "--summarize",
+    help="Print the total number and size of the files listed",
+    is_flag=True,
+)
+@click.option(
+    "--include",
+    multiple=True,
+    help="Only list files matching this glob pattern, can be repeated",
+)
+@click.option(
+    "--exclude",
+    multiple=True,
+    help="Do not list files matching this glob pattern, can be repeated",
+)
+def list(ctx, epicpath, recursive, long_format, limit, summarize, include, exclude):
     """List data in your EPIC data store"""
-    click.echo("EPIC data list")
-    click.echo("-----------------------------")
+    table = Table(
+        [
+            ("path", "Path"),
+            ("size", "Size"),
+            ("last_modified", "Last modified"),
+            ("folder", "Folder"),
+        ],
+        title="EPIC data list",
+        header=False,
+    )
+
+    if epicpath is None:
+        epicpath = "epic://"
+    if not epicpath.endswith("/"):
+        epicpath = epicpath + "/"
+    path_filter = _path_filter(include, exclude)
+    files = 0
+    folders = 0
+    total_size = 0
+    try:
+        storage = connect_storage(ctx.obj.client.data)
+        prefix = storage.epic_path_to_key(epicpath)
+        if not path_filter:
+            entries = storage.list_folder(prefix, recursive=recursive)
+        elif recursive:
+            entries = storage.walk(prefix, path_filter)
+        else:
+            entries = (
+                item
+                for item in storage.list_folder(prefix)
+                if (
+                    not path_filter.prune(item.key[len(prefix) : -1])
+                    if item.last_modified is None
+                    else path_filter.matches(item.key[len(prefix) :])
+                )
+            )
+        with table:
+            for item in itertools.islice(entries, limit):
+                path = storage.key_to_epic_path(item.key)
+                if item.folder:
+                    folders += 1
+                else:
+                    files += 1
+                    total_size += item.size
+                modified = (
+                    None
+                    if item.last_modified is None
+                    else datetime.datetime.fromtimestamp(item.last_modified)
+                )
+                if not long_format:
+                    text = path
+                elif modified is None:
+                    text = "{:>14}  {:19}  {}".format("PRE", "", path)
+                else:
+                    text = "{:>14}  {:%Y-%m-%d %H:%M:%S}  {}".format(
+                        item.size, modified, path
+                    )
+                table.row(
+                    path,
+                    None if item.folder else item.size,
+                    modified,
+                    item.folder,
+                    text=text,
+                )
+    except Exception as e:
+        click.echo("Error: {}".format(str(e)), err=not table.text)
+    if summarize:
+        click.echo("-----------------------------", err=not table.text)
+        click.echo(
+            "Total: {} files, {} folders, {}".format(
+                files, folders, format_size(total_size)
+            ),
+            err=not table.text,
+        )
+
+
+@data.command("du")
+@click.pass_context
+@click.argument("epicpath", required=False, type=str)
+@click.option(
+    "--depth",
+    default=1,
+    help="Number of folder levels to show totals for",
+    show_default=True,
+)
+@click.option(
+    "--workers",
+    default=DU_WORKERS,
+    help="Number of folders to list concurrently",
+    show_default=True,
+)
+def du(ctx, epicpath, depth, workers):
+    """Show how much storage the folders in your EPIC data store use"""
+    table = Table(
+        [("size", "Size"), ("objects", "Objects"), ("path", "Path"), ("depth", "Depth")],
+        title="EPIC disk usage",
+        header="Size | Objects | Path",
+    )
 
     if epicpath is None:
         epicpath = "epic://"
+    if not epicpath.endswith("/"):
+        epicpath = epicpath + "/"
+    def progress(objects, size):
+        _echo_progress("Scanned {} objects, {}".format(objects, format_size(size)))
+
     try:
-        response = ctx.obj[1].data.ls(epicpath)
-        for item in response:
-            click.echo(f"{item.obj_path}")
+        storage = connect_storage(ctx.obj.client.data, max_connections=workers)
+        usage = DiskUsage(storage, depth=depth, workers=workers)
+        root = usage.scan(storage.epic_path_to_key(epicpath), progress=progress)
+        _end_progress()
+        with table:
+            for level, node in root.walk():
+                path = storage.key_to_epic_path(node.key)
+                table.row(
+                    node.size,
+                    node.count,
+                    path,
+                    level,
+                    text="{:>10} | {:>10} | {}{}".format(
+                        format_size(node.size), node.count, "  " * level, path
+                    ),
+                )
     except Exception as e:
-        click.echo("Error: {}".format(str(e)))
+        click.echo("Error: {}".format(str(e)), err=machine_readable())
 
 
 @data.command("info")
@@ -212,11 +702,16 @@ def list(ctx, epicpath):
 @click.argument("epicpath")
 def info(ctx, epicpath):
     """List any file meta-data from EPIC"""
+    from botocore.exceptions import ClientError
+
     if not epicpath.endswith("/"):
         try:
-            meta = ctx.obj[1].data.get_file_meta_data(epicpath)
-            click.echo(meta)
-        except botocore.exceptions.ClientError as error:
+            meta = ctx.obj.client.data.get_file_meta_data(epicpath)
+            if machine_readable():
+                render(meta)
+            else:
+                click.echo(meta)
+        except ClientError as error:
             if error.response["Error"]["Code"] == "404":
                 click.echo(f'File "{epicpath}" not found.')
     else:
@@ -232,21 +727,68 @@ def info(ctx, epicpath):
     help="Show what actions will take place but do not execute them",
     is_flag=True,
 )
-def delete(ctx, epicpath, dryrun):
+@click.option(
+    "--include",
+    multiple=True,
+    help="Only delete files matching this glob pattern, can be repeated",
+)
+@click.option(
+    "--exclude",
+    multiple=True,
+    help="Do not delete files matching this glob pattern, can be repeated",
+)
+@click.option(
+    "--workers",
+    default=DELETE_WORKERS,
+    help="Number of delete requests to send concurrently",
+    show_default=True,
+)
+def delete(ctx, epicpath, dryrun, include, exclude, workers):
     """Delete a file from EPIC"""
     if epicpath.endswith("/"):
+        path_filter = _path_filter(include, exclude)
         click.echo(
             "Deleting folder {} {}".format(epicpath, "(dryrun)" if dryrun else "")
         )
-        items = ctx.obj[1].data.delete(epicpath, dryrun=dryrun)
+        storage = connect_storage(ctx.obj.client.data, max_connections=workers)
+        prefix = storage.epic_path_to_key(epicpath)
+        keys = (obj.key for obj in storage.walk(prefix, path_filter, workers))
+        if dryrun:
+            for key in keys:
+                click.echo("Deleted {} (dryrun)".format(storage.key_to_epic_path(key)))
+            return
+        result = BatchDeleter(storage, workers=workers).delete(
+            keys, progress=lambda deleted: _echo_progress(f"Deleted {deleted} files")
+        )
+        _end_progress()
+        forget_removed([_canonical_path(storage, epicpath)])
+        for key, error in result.errors:
+            click.echo("Failed to delete {}, {}".format(storage.key_to_epic_path(key), error))
+        click.echo("Deleted {} files".format(result.deleted))
     else:
         click.echo("Deleting file {} {}".format(epicpath, "(dryrun)" if dryrun else ""))
-        items = ctx.obj[1].data.delete(epicpath, dryrun=dryrun)
-    for item in items:
-        click.echo("Deleted {} {}".format(item, "(dryrun)" if dryrun else ""))
+        data_client = ctx.obj.client.data
+        items = data_client.delete(epicpath, dryrun=dryrun)
+        if not dryrun:
+            forget_removed(
+                [
+                    "s3://{}/{}".format(
+                        data_client._s3_bucket, data_client._epic_path_to_s3(epicpath)
+                    )
+                ]
+            )
+        for item in items:
+            click.echo("Deleted {} {}".format(item, "(dryrun)" if dryrun else ""))
     return
 
 
+def _canonical_path(storage, path):
+    """ Identify a local or EPIC path independently of how it was typed """
+    if path.startswith("epic://"):
+        return "s3://{}/{}".format(storage.bucket, storage.epic_path_to_key(path))
+    return os.path.abspath(os.path.expanduser(path))
+
+
 @data.command()
 @click.pass_context
 @click.argument(
@@ -254,7 +796,45 @@ def delete(ctx, epicpath, dryrun):
 )
 @click.argument("destination")
 @click.option("-f", help="Overwrite file if it exists locally", is_flag=True)
-def download(ctx, source, destination, f):
+@click.option(
+    "--part-size",
+    type=ByteSize(MIN_PART_SIZE),
+    default="64MiB",
+    help="Size of the parts large files are downloaded in, e.g. 64MiB",
+    show_default=True,
+)
+@click.option(
+    "--concurrency",
+    default=DEFAULT_CONCURRENCY,
+    help="Number of parts to download in parallel",
+    show_default=True,
+)
+@click.option(
+    "--resume",
+    help="Resume an interrupted transfer, only copying what is missing",
+    is_flag=True,
+)
+@click.option(
+    "--max-bandwidth",
+    type=ByteRate(),
+    help="Limit the combined transfer rate, e.g. 200MB/s",
+)
+@click.option(
+    "--max-connections",
+    type=click.IntRange(min=1),
+    help="Limit the number of connections transferring data at once",
+)
+def download(
+    ctx,
+    source,
+    destination,
+    f,
+    part_size,
+    concurrency,
+    resume,
+    max_bandwidth,
+    max_connections,
+):
     """Download a file from EPIC SOURCE to local DESTINATION
     SOURCE should be prefixed with "epic://"\n
     Example, download EPIC file from /my_sim_data/my.file to directory ./work/\n
@@ -272,12 +852,36 @@ def download(ctx, source, destination, f):
                     click.echo("Destination file exists. Use -f to overwrite")
                     return
         if not source.endswith("/"):
-            ctx.obj[1].data.download_file(source, destination)
+            storage = connect_storage(
+                ctx.obj.client.data,
+                max_connections=max_connections or concurrency,
+                max_bandwidth=max_bandwidth,
+            )
+            if destination.endswith(os.path.sep):
+                os.makedirs(destination, exist_ok=True)
+            if os.path.isdir(destination):
+                destination = os.path.join(destination, source.split("/")[-1])
+            with TransferJournal.open_for(
+                "download",
+                _canonical_path(storage, source),
+                _canonical_path(storage, destination),
+                resume=resume,
+            ) as journal, ChunkedTransfer(
+                storage,
+                part_size=part_size,
+                concurrency=concurrency,
+                journal=journal,
+                max_connections=max_connections,
+            ) as chunked:
+                started = time.monotonic()
+                size = chunked.download(storage.epic_path_to_key(source), destination)
+            click.echo(_throughput("Downloaded", size, time.monotonic() - started))
             click.echo("Download complete")
         else:
             click.echo("Please use 'sync' to download folders")
     except Exception as e:
         click.echo("Download failed, %s" % e)
+        click.echo("Run the download again with --resume to continue it")
 
 
 @data.command()
@@ -286,7 +890,44 @@ def download(ctx, source, destination, f):
     "source",
 )
 @click.argument("destination")
-def upload(ctx, source, destination):
+@click.option(
+    "--part-size",
+    type=ByteSize(MIN_PART_SIZE),
+    default="64MiB",
+    help="Size of the parts large files are uploaded in, e.g. 64MiB",
+    show_default=True,
+)
+@click.option(
+    "--concurrency",
+    default=DEFAULT_CONCURRENCY,
+    help="Number of parts to upload in parallel",
+    show_default=True,
+)
+@click.option(
+    "--resume",
+    help="Resume an interrupted transfer, only copying what is missing",
+    is_flag=True,
+)
+@click.option(
+    "--max-bandwidth",
+    type=ByteRate(),
+    help="Limit the combined transfer rate, e.g. 200MB/s",
+)
+@click.option(
+    "--max-connections",
+    type=click.IntRange(min=1),
+    help="Limit the number of connections transferring data at once",
+)
+def upload(
+    ctx,
+    source,
+    destination,
+    part_size,
+    concurrency,
+    resume,
+    max_bandwidth,
+    max_connections,
+):
     """Upload a file from local SOURCE to DESTINATION Folder
     Destinations should be prefixed with "epic://"\n
     Example, copy ~/my.file to EPIC folder /my_sim_data/\n
@@ -297,13 +938,95 @@ def upload(ctx, source, destination):
         if os.path.exists(source):
             if os.path.isfile(source):
                 source = click.format_filename(source)
-                ctx.obj[1].data.upload_file(source, destination)
+                if destination.endswith("/"):
+                    destination += os.path.basename(source)
+                storage = connect_storage(
+                    ctx.obj.client.data,
+                    max_connections=max_connections or concurrency,
+                    max_bandwidth=max_bandwidth,
+                )
+                with TransferJournal.open_for(
+                    "upload",
+                    _canonical_path(storage, source),
+                    _canonical_path(storage, destination),
+                    resume=resume,
+                ) as journal, ChunkedTransfer(
+                    storage,
+                    part_size=part_size,
+                    concurrency=concurrency,
+                    journal=journal,
+                    max_connections=max_connections,
+                ) as chunked:
+                    started = time.monotonic()
+                    chunked.upload(source, storage.epic_path_to_key(destination))
+                click.echo(
+                    _throughput(
+                        "Uploaded", os.path.getsize(source), time.monotonic() - started
+                    )
+                )
+                click.echo("Upload complete")
             else:
                 click.echo("Please use 'sync' to upload folders")
         else:
             click.echo("File {} not found.".format(source))
     except Exception as e:
         print("Upload failed, %s" % e)
+        print("Run the upload again with --resume to continue it")
+
+
+def _throughput(action, size, elapsed):
+    return "{} {} in {:.1f}s, {:.2f} MB/s".format(
+        action, format_size(size), elapsed, size / 1e6 / max(elapsed, 1e-6)
+    )
+
+
+def _count_actions(tasks, counts):
+    """ Yield tasks, counting them in counts by what will be done with them """
+    for task in tasks:
+        counts[task.action] += 1
+        yield task
+
+
+def _set_aside_deletes(tasks, deletes):
+    """ Yield the tasks that copy files, adding those that delete them to deletes """
+    for task in tasks:
+        if task.delete:
+            deletes.append(task)
+        else:
+            yield task
+
+
+def _delete_extra(storage, tasks, destination, dryrun, max_delete, workers, manifest):
+    """Delete the files a sync found only in its destination, returning
+    False if any were left"""
+
+    def display(target):
+        if tasks[0].direction == UPLOAD:
+            return storage.key_to_epic_path(target)
+        return target
+
+    if max_delete is not None and len(tasks) > max_delete:
+        click.echo(
+            "Not deleting {} files, more than --max-delete {}".format(len(tasks), max_delete)
+        )
+        return False
+    if dryrun:
+        for task in tasks:
+            click.echo("Deleted {} (dryrun)".format(display(task.target)))
+        return True
+    result = delete_extra(
+        storage,
+        tasks,
+        os.path.expanduser(destination),
+        workers=workers,
+        manifest=manifest,
+        progress=lambda deleted: _echo_progress(f"Deleted {deleted} files"),
+    )
+    _end_progress()
+    for target, error in result.errors:
+        click.echo("Failed to delete {}, {}".format(display(target), error))
+    click.echo("Deleted {} files".format(result.deleted))
+    return not result.errors
 
 
 def sync_callback(source_path, target_path, uploaded, dryrun):
@@ -328,12 +1051,84 @@ def sync_callback(source_path, target_path, uploaded, dryrun):
     default=True,
     show_default=True,
 )
-def sync(ctx, source, destination, dryrun, overwrite):
+@click.option(
+    "--compare",
+    type=click.Choice(COMPARE_MODES, case_sensitive=False),
+    default=COMPARE_MTIME,
+    help="How to decide if an existing file has changed: newer modification time, different size or different content hash",
+    show_default=True,
+)
+@click.option(
+    "--workers",
+    default=DEFAULT_WORKERS,
+    help="Number of files to transfer concurrently",
+    show_default=True,
+)
+@click.option(
+    "--resume",
+    help="Resume an interrupted transfer, only copying what is missing",
+    is_flag=True,
+)
+@click.option(
+    "--rescan",
+    help="Ignore the cached manifest of this sync and rebuild it from scratch",
+    is_flag=True,
+)
+@click.option(
+    "--max-bandwidth",
+    type=ByteRate(),
+    help="Limit the combined transfer rate, e.g. 200MB/s",
+)
+@click.option(
+    "--max-connections",
+    type=click.IntRange(min=1),
+    help="Limit the number of connections transferring data at once",
+)
+@click.option(
+    "--delete",
+    help="Delete files in DESTINATION that are not in SOURCE",
+    is_flag=True,
+)
+@click.option(
+    "--max-delete",
+    type=click.IntRange(min=0),
+    help="With --delete, do not delete anything if more than this many files would be deleted",
+)
+@click.option(
+    "--include",
+    multiple=True,
+    help="Only sync files matching this glob pattern, can be repeated",
+)
+@click.option(
+    "--exclude",
+    multiple=True,
+    help="Do not sync files matching this glob pattern, can be repeated",
+)
+def sync(
+    ctx,
+    source,
+    destination,
+    dryrun,
+    overwrite,
+    compare,
+    workers,
+    resume,
+    rescan,
+    max_bandwidth,
+    max_connections,
+    delete,
+    max_delete,
+    include,
+    exclude,
+):
     """Synchronise contents of SOURCE to DESTINATION.
     EPIC destinations should be prefixed with "epic://".
-    Copies files from SOURCE that do not exist in DESTINATION.\n
+    Copies files from SOURCE that do not exist in DESTINATION. With
+    --delete, files in DESTINATION that are not in SOURCE are deleted once
+    the copies have finished, and the exit status is 1 if any were not.\n
     Example, copy from EPIC folder to local folder:\n
     "epiccli sync epic://my_sim_data/ ./local_folder/" """
+    path_filter = _path_filter(include, exclude)
     try:
         if not check_path_is_folder(source):
             click.echo(
@@ -350,16 +1145,157 @@ def sync(ctx, source, destination, dryrun, overwrite):
                 source, destination, "(dryrun)" if dryrun else ""
             )
         )
-        ctx.obj[1].data.sync(
+        storage = connect_storage(
+            ctx.obj.client.data,
+            max_connections=max_connections or workers,
+            max_bandwidth=max_bandwidth,
+        )
+        source_id = _canonical_path(storage, source)
+        destination_id = _canonical_path(storage, destination)
+        with SyncManifest.open_for(
+            source_id, destination_id, rescan=rescan
+        ) as manifest:
+            tasks = plan_sync(
+                storage,
+                source,
+                destination,
+                overwrite=overwrite,
+                dryrun=dryrun,
+                manifest=manifest,
+                compare=compare,
+                path_filter=path_filter,
+                workers=workers,
+                delete=delete,
+            )
+            journal = None
+            if not dryrun:
+                journal = TransferJournal.open_for(
+                    "sync", source_id, destination_id, resume=resume
+                )
+            pool = TransferPool(
+                storage,
+                workers=workers,
+                dryrun=dryrun,
+                callback=sync_callback,
+                chunked=ChunkedTransfer(
+                    storage, journal=journal, max_connections=max_connections
+                ),
+                journal=journal,
+                manifest=manifest,
+            )
+            actions = collections.Counter()
+            extra = []
+            try:
+                stats = pool.run(_set_aside_deletes(_count_actions(tasks, actions), extra))
+            finally:
+                if journal is not None:
+                    journal.close()
+            found = "Found {} files, {} to copy".format(
+                actions[COPY] + actions[SKIP], actions[COPY]
+            )
+            if delete:
+                found += ", {} to delete".format(actions[DELETE])
+            click.echo(found)
+            for task, error in stats.failed:
+                click.echo(f"Failed to copy {task.source}, {error}")
+            click.echo(stats.summary())
+            deleted = True
+            if delete:
+                deleted = _delete_extra(
+                    storage, extra, destination, dryrun, max_delete, workers, manifest
+                )
+        if stats.failed:
+            click.echo("Run the sync again with --resume to retry the failed files")
+        else:
+            if journal is not None:
+                journal.remove()
+            if deleted:
+                click.echo("Sync complete")
+        if not deleted:
+            # The destination is not a mirror of the source
+            sys.exit(1)
+    except Exception as e:
+        print("Sync failed, %s" % e)
+
+
+@data.command()
+@click.pass_context
+@click.argument("source")
+@click.argument("destination")
+@click.option(
+    "--compare",
+    type=click.Choice(COMPARE_MODES, case_sensitive=False),
+    default=COMPARE_MTIME,
+    help="How to decide if an existing file has changed: newer modification time, different size or different content hash",
+    show_default=True,
+)
+@click.option(
+    "--all",
+    "show_all",
+    help="Also list the files that are up to date",
+    is_flag=True,
+)
+@click.option(
+    "--workers",
+    default=DEFAULT_WORKERS,
+    help="Number of folders to list concurrently",
+    show_default=True,
+)
+@click.option(
+    "--include",
+    multiple=True,
+    help="Only compare files matching this glob pattern, can be repeated",
+)
+@click.option(
+    "--exclude",
+    multiple=True,
+    help="Do not compare files matching this glob pattern, can be repeated",
+)
+def diff(ctx, source, destination, compare, show_all, workers, include, exclude):
+    """Show what a sync of SOURCE to DESTINATION would do.
+    One of them should be an EPIC folder prefixed with "epic://".
+    Each file is listed with whether sync would copy it or skip it, and
+    why. Files that are only in DESTINATION, which sync --delete would
+    delete, are listed as delete.\n
+    Example:\n
+    "epic data diff ./local_folder/ epic://my_sim_data/" """
+    table = Table(
+        [("action", "Action"), ("path", "Path"), ("reason", "Reason")],
+        header="{:8} {:40} {}".format("Action", "Path", "Reason"),
+    )
+    path_filter = _path_filter(include, exclude)
+    actions = collections.Counter()
+    try:
+        storage = connect_storage(ctx.obj.client.data, max_connections=workers)
+        tasks = plan_sync(
+            storage,
             source,
             destination,
-            dryrun=dryrun,
-            callback=sync_callback,
-            overwrite_existing=overwrite,
+            dryrun=True,
+            compare=compare,
+            path_filter=path_filter,
+            workers=workers,
+            delete=True,
         )
-        click.echo("Sync complete")
+        with table:
+            for task in _count_actions(tasks, actions):
+                if task.folder or (task.action == SKIP and not show_all):
+                    continue
+                table.row(
+                    task.action,
+                    task.path,
+                    task.reason,
+                    text="{:8} {:40} {}".format(task.action, task.path, task.reason),
+                )
     except Exception as e:
-        print("Sync failed, %s" % e)
+        click.echo("Error: {}".format(str(e)), err=not table.text)
+        sys.exit(1)
+    click.echo(
+        "{} to copy, {} to delete, {} up to date".format(
+            actions[COPY], actions[DELETE], actions[SKIP]
+        ),
+        err=not table.text,
+    )
 
 
 @main.group()
@@ -369,51 +1305,244 @@ def job(ctx):
     pass
 
 
+JOB_COLUMNS = [
+    ("id", "Job ID"),
+    ("name", "Name"),
+    ("app", "Application"),
+    ("submitted_by", "Submitted by"),
+    ("submitted_at", "Submitted"),
+    ("status", "Status"),
+]
+
+
 @job.command()
 @click.pass_context
 @click.option("--n", default=10, help="List last n jobs", show_default=True)
-def list(ctx, n):
+@click.option("--all", "all_jobs", is_flag=True, help="List every matching job")
+@click.option(
+    "--status",
+    multiple=True,
+    help="Only list jobs with this status, can be given more than once",
+)
+@click.option(
+    "--app",
+    multiple=True,
+    help="Only list jobs whose application contains this name, can be given more than once",
+)
+@click.option(
+    "--submitted-by",
+    multiple=True,
+    help="Only list jobs submitted by this user, can be given more than once",
+)
+@click.option(
+    "--since", type=click.DateTime(), help="Only list jobs submitted after this time"
+)
+@click.option(
+    "--until", type=click.DateTime(), help="Only list jobs submitted before this time"
+)
+def list(ctx, n, all_jobs, status, app, submitted_by, since, until):
     """List active jobs"""
-    click.echo("Your EPIC HPC Jobs")
-    click.echo("Job ID | Name | Application | Submitted by | Submitted | Status ")
-    click.echo("----------------------------------------------------------------")
-    jlist = ctx.obj[1].job.list(limit=n)
-    for job in jlist:
-        click.echo(
-            f"{job.id} | {job.name} | {job.app} | {job.submitted_by} | {job.submitted_at} | {job.status}"
-        )
+    job_filter = JobFilter(
+        status=status, app=app, submitted_by=submitted_by, since=since, until=until
+    )
+    jobs = iter_jobs(ctx.obj.client.job, job_filter, limit=None if all_jobs else n)
+    with Table(JOB_COLUMNS, title="Your EPIC HPC Jobs") as table:
+        for job in jobs:
+            table.row(
+                job.id, job.name, job.app, job.submitted_by, job.submitted_at, job.status
+            )
+
+
+def job_selection_options(command):
+    """ Add the arguments choosing the jobs a bulk job command acts on """
+    decorators = [
+        click.argument("job_ids", nargs=-1),
+        click.option(
+            "--from-file",
+            type=click.Path(exists=True, dir_okay=False),
+            help="Read job IDs from this file, one per line, or the job_id column of a CSV file",
+        ),
+        click.option(
+            "--filter",
+            "filters",
+            type=Setting(),
+            multiple=True,
+            help="Select jobs by KEY=VALUE, where KEY is status, app, submitted-by, since or until, can be repeated",
+        ),
+        click.option(
+            "--workers",
+            default=POOL_WORKERS,
+            help="Number of jobs to act on concurrently",
+            show_default=True,
+        ),
+    ]
+    for decorator in reversed(decorators):
+        command = decorator(command)
+    return command
+
+
+def _single_job(job_ids, from_file, filters):
+    """ The ID if exactly one job is given by ID, otherwise None """
+    if len(job_ids) == 1 and not from_file and not filters and job_ids[0].isdigit():
+        return int(job_ids[0])
+    return None
+
+
+def _selected_jobs(ctx, job_ids, from_file, filters):
+    """Return an iterator over the job IDs chosen by job_selection_options,
+    each given once. The jobs matching filters are read as they are
+    listed."""
+    if not (job_ids or from_file or filters):
+        raise click.UsageError("Give one or more JOB_IDS, --from-file or --filter")
+    try:
+        selected = [*parse_job_ids(job_ids)]
+        if from_file:
+            selected.extend(read_job_ids(from_file))
+        job_filter = filter_from_settings(filters) if filters else None
+    except (CommandError, OSError) as e:
+        click.echo("Error: {}".format(e), err=True)
+        sys.exit(1)
+    if job_filter is not None:
+        listed = (job.id for job in iter_jobs(ctx.obj.client.job, job_filter))
+        selected = itertools.chain(selected, listed)
+    seen = set()
+    return (
+        job_id for job_id in selected if not (job_id in seen or seen.add(job_id))
+    )
+
+
+def _api_error(error):
+    """ A one line description of an error from the EPIC API """
+    if getattr(error, "status", None) and getattr(error, "reason", None):
+        return "{} {}".format(error.status, error.reason)
+    return str(error)
+
+
+def _bulk_summary(action, done, failures):
+    """ Print how many jobs action succeeded for and why the rest failed """
+    click.echo(
+        "{} {} jobs, {} failed".format(action, done, len(failures)),
+        err=machine_readable(),
+    )
+    for job_id, error in failures:
+        click.echo("Job {}: {}".format(job_id, _api_error(error)), err=True)
+    if failures:
+        sys.exit(1)
 
 
 @job.command()
 @click.pass_context
-@click.argument("job_id")
-def cancel(ctx, job_id):
-    """Cancel a job"""
-    click.echo("Cancelling job ID {}".format(job_id))
-    pprint.pprint(ctx.obj[1].job.cancel(job_id))
+@job_selection_options
+def cancel(ctx, job_ids, from_file, filters, workers):
+    """Cancel jobs.
+
+    Jobs are given as JOB_IDS, which may include ranges such as 100-120, read
+    from a file with --from-file or selected with --filter.
+    """
+    job_id = _single_job(job_ids, from_file, filters)
+    if job_id is not None:
+        click.echo("Cancelling job ID {}".format(job_id), err=machine_readable())
+        render(ctx.obj.client.job.cancel(job_id))
+        return
+    selected = _selected_jobs(ctx, job_ids, from_file, filters)
+    client = ctx.obj.client
+    failures = []
+    done = 0
+    columns = [("job_id", "Job ID"), ("status", "Status"), ("error", "Error")]
+    with Table(columns, title="Cancelling jobs") as table:
+        for job_id, _, error in map_jobs(client.job.cancel, selected, workers):
+            if error is None:
+                done += 1
+                table.row(job_id, "cancelled", "")
+            else:
+                failures.append((job_id, error))
+                table.row(job_id, "failed", _api_error(error))
+    _bulk_summary("Cancelled", done, failures)
 
 
 @job.command()
 @click.pass_context
-@click.argument("job_id")
-def details(ctx, job_id):
-    """Get details of job ID"""
-    pprint.pprint(ctx.obj[1].job.get_details(job_id))
+@job_selection_options
+def details(ctx, job_ids, from_file, filters, workers):
+    """Get details of jobs.
+
+    Jobs are given as JOB_IDS, which may include ranges such as 100-120, read
+    from a file with --from-file or selected with --filter.
+    """
+    job_id = _single_job(job_ids, from_file, filters)
+    if job_id is not None:
+        render(ctx.obj.client.job.get_details(job_id))
+        return
+    selected = _selected_jobs(ctx, job_ids, from_file, filters)
+    client = ctx.obj.client
+    failures = []
+    done = 0
+    with Records() as records:
+        for job_id, job_details, error in map_jobs(
+            client.job.get_details, selected, workers
+        ):
+            if error is None:
+                done += 1
+                records.write(job_details, title=f"Job ID {job_id}")
+            else:
+                failures.append((job_id, error))
+    _bulk_summary("Fetched details of", done, failures)
+
+
+STEP_COLUMNS = [
+    ("id", "Step ID"),
+    ("step_name", "Step Name"),
+    ("status", "Status"),
+    ("start", "Start"),
+    ("end", "End"),
+    ("wallclock", "Wallclock"),
+    ("exit_code", "Exit Code"),
+]
+
+
+def _step_values(step):
+    return (
+        step.id,
+        step.step_name,
+        step.status,
+        step.start,
+        step.end,
+        step.wallclock,
+        step.exit_code,
+    )
 
 
 @job.command()
 @click.pass_context
-@click.argument("job_id")
-def steps(ctx, job_id):
-    """List the status of the job steps"""
-    click.echo(f"Job Steps for Job ID {job_id}")
-    click.echo("Step ID | Step Name | Status | Start | End | Wallclock | Exit Code")
-    click.echo("------------------------------------------------------------------")
-    details = ctx.obj[1].job.get_details(job_id)
-    for step in details.job_steps:
-        click.echo(
-            f"{step.id} | {step.step_name} | {step.status} | {step.start} | {step.end} | {step.wallclock} | {step.exit_code}"
-        )
+@job_selection_options
+def steps(ctx, job_ids, from_file, filters, workers):
+    """List the status of the job steps.
+
+    Jobs are given as JOB_IDS, which may include ranges such as 100-120, read
+    from a file with --from-file or selected with --filter.
+    """
+    job_id = _single_job(job_ids, from_file, filters)
+    if job_id is not None:
+        details = ctx.obj.client.job.get_details(job_id)
+        with Table(STEP_COLUMNS, title=f"Job Steps for Job ID {job_id}") as table:
+            for step in details.job_steps:
+                table.row(*_step_values(step))
+        return
+    selected = _selected_jobs(ctx, job_ids, from_file, filters)
+    client = ctx.obj.client
+    failures = []
+    done = 0
+    with Table([("job_id", "Job ID")] + STEP_COLUMNS, title="Job Steps") as table:
+        for job_id, job_details, error in map_jobs(
+            client.job.get_details, selected, workers
+        ):
+            if error is None:
+                done += 1
+                for step in job_details.job_steps or []:
+                    table.row(job_id, *_step_values(step))
+            else:
+                failures.append((job_id, error))
+    _bulk_summary("Listed steps of", done, failures)
 
 
 @job.command()
@@ -421,14 +1550,46 @@ def steps(ctx, job_id):
 @click.argument("step_id")
 @click.option(
     "--log",
-    type=click.Choice(["stdout", "stderr", "app"], case_sensitive=False),
+    type=click.Choice(LOGS, case_sensitive=False),
     default="stdout",
     help="Which log file to tail",
     show_default=True,
 )
-def tail(ctx, step_id, log):
+@click.option(
+    "-f",
+    "--follow",
+    help="Keep printing new log output until the step finishes, then exit with its exit code",
+    is_flag=True,
+)
+@click.option(
+    "--interval",
+    default=DEFAULT_INTERVAL,
+    help="Initial seconds between checks for new output when following",
+    show_default=True,
+)
+@click.option(
+    "--max-interval",
+    default=DEFAULT_MAX_INTERVAL,
+    help="Longest wait between checks when there is no new output",
+    show_default=True,
+)
+def tail(ctx, step_id, log, follow, interval, max_interval):
     """Get job log tail of step ID of job ID"""
-    log_tail = ctx.obj[1].job.get_step_logs(step_id)
+    if follow:
+        step = ctx.obj.client.job.get_step_details(step_id)
+        click.echo(f'Following "{log}" log for Job Step {step_id}')
+        click.echo(
+            "-------------------------------------------------------------------------"
+        )
+        watcher = JobWatcher(
+            ctx.obj.client,
+            step.parent_job,
+            log=log,
+            interval=interval,
+            max_interval=max_interval,
+        )
+        ctx.exit(watcher.follow_step(step.id, _write_log))
+    log_tail = ctx.obj.client.job.get_step_logs(step_id)
     click.echo(
         f'Tail of "{log}" log for Job Step {step_id} (last update {log_tail.last_update})'
     )
@@ -445,6 +1606,137 @@ def tail(ctx, step_id, log):
         raise CommandError("Unknown log specified")
 
 
+def _write_log(text):
+    click.echo(text, nl=False)
+    sys.stdout.flush()
+
+
+@job.command()
+@click.pass_context
+@click.argument("job_id")
+@click.option(
+    "--log",
+    type=click.Choice(LOGS, case_sensitive=False),
+    default="stdout",
+    help="Which log file to follow",
+    show_default=True,
+)
+@click.option(
+    "--interval",
+    default=DEFAULT_INTERVAL,
+    help="Initial seconds between checks for new output",
+    show_default=True,
+)
+@click.option(
+    "--max-interval",
+    default=DEFAULT_MAX_INTERVAL,
+    help="Longest wait between checks when there is no new output",
+    show_default=True,
+)
+def watch(ctx, job_id, log, interval, max_interval):
+    """Follow the logs of job JOB_ID until it finishes.
+
+    The log of each step is printed as it grows, checking more often while
+    output is arriving and less often while it is not. Exits with the exit
+    code of the first step that failed, or 0.
+    """
+
+    def on_step(step):
+        click.echo(f'==> "{log}" log for step {step.id} {step.step_name} <==')
+
+    watcher = JobWatcher(
+        ctx.obj.client, job_id, log=log, interval=interval, max_interval=max_interval
+    )
+    ctx.exit(watcher.watch(_write_log, on_step=on_step))
+
+
+@job.command("submit-batch")
+@click.pass_context
+@click.argument("manifest", type=click.Path(exists=True, dir_okay=False))
+@click.option(
+    "--set",
+    "settings",
+    type=Setting(),
+    multiple=True,
+    help="Default KEY=VALUE setting for every variant, such as queue=QUEUE_CODE, can be repeated",
+)
+@click.option(
+    "--results",
+    type=click.Path(dir_okay=False),
+    help="CSV file recording the submitted jobs (default is MANIFEST with .results.csv)",
+)
+@click.option(
+    "--workers",
+    default=POOL_WORKERS,
+    help="Number of jobs to submit concurrently",
+    show_default=True,
+)
+@click.option(
+    "--rate",
+    type=float,
+    default=SWEEP_RATE,
+    help="Maximum number of jobs submitted per second, 0 for no limit",
+    show_default=True,
+)
+@click.option(
+    "--dryrun",
+    help="Show the jobs that would be submitted but do not submit them",
+    is_flag=True,
+)
+def submit_batch(ctx, manifest, settings, results, workers, rate, dryrun):
+    """Submit a job for each variant of the sweep in MANIFEST.
+
+    MANIFEST is a YAML file with the settings shared by every job and a
+    matrix of parameters to sweep, or a CSV file with one job per row. Jobs
+    recorded in the results file by an earlier run are skipped, so an
+    interrupted sweep can be completed by running the same command again.
+    """
+    try:
+        variants = load_manifest(manifest, dict(settings))
+    except (CommandError, OSError) as e:
+        click.echo("Error: {}".format(e), err=True)
+        sys.exit(1)
+    sweep_results = SweepResults(results or sweep_results_path(manifest))
+    if dryrun:
+        rows = (
+            (variant, job_id, SKIPPED if job_id else DRYRUN, "")
+            for variant, job_id in (
+                (variant, sweep_results.job_id(variant.name)) for variant in variants
+            )
+        )
+    else:
+        submitter = SweepSubmitter(
+            ctx.obj.client.job, sweep_results, workers=workers, rate=rate
+        )
+        rows = submitter.submit(variants)
+    columns = [
+        ("name", "Name"),
+        ("app", "Application"),
+        ("queue", "Queue"),
+        ("job_id", "Job ID"),
+        ("status", "Status"),
+        ("error", "Error"),
+    ]
+    counts = {SUBMITTED: 0, SKIPPED: 0, FAILED: 0, DRYRUN: 0}
+    with Table(columns, title=f"Submitting {len(variants)} jobs from {manifest}") as table:
+        for variant, job_id, status, error in rows:
+            counts[status] += 1
+            table.row(
+                variant.name, variant.app, variant.queue, job_id or "", status, error
+            )
+    if not dryrun:
+        sweep_results.compact(variant.name for variant in variants)
+    click.echo(
+        "{} submitted, {} already submitted, {} failed".format(
+            counts[SUBMITTED], counts[SKIPPED], counts[FAILED]
+        ),
+        err=machine_readable(),
+    )
+    if counts[FAILED]:
+        click.echo("Run the command again to retry the failed jobs", err=machine_readable())
+        sys.exit(1)
+
+
 @job.group()
 @click.pass_context
 def create(ctx):
@@ -515,24 +1807,25 @@ def openfoam(
     """
     click.echo(f"Creating OpenFoam job {job_name}")
     click.echo("----------------------------------")
-    job = OpenFoamJob(foam_version, job_name, input_folder)
-
-    job.decomposePar.execute = decompose
-    job.decomposePar.runtime = rd
-
-    job.solver.execute = solve
-    job.solver.partitions = np
-    job.solver.runtime = rs
-    job.solver.endTime = cycles
-
-    job.reconstructPar.execute = reconstruct
-    job.reconstructPar.runtime = rr
+    job = openfoam_job(
+        foam_version,
+        job_name,
+        input_folder,
+        np=np,
+        cycles=cycles,
+        decompose=decompose,
+        solve=solve,
+        reconstruct=reconstruct,
+        rs=rs,
+        rd=rd,
+        rr=rr,
+    )
 
     click.echo(f"Submitting to {queue_code}...")
     job_spec = job.get_job_create_spec(queue_code)
 
     # Submit the job
-    job = ctx.obj[1].job.submit(job_spec)
+    job = ctx.obj.client.job.submit(job_spec)
 
     click.echo(f"Job {job_name} submitted. New job ID = {job[0].id}")
 
@@ -568,25 +1861,23 @@ def zcfd(
     """
     click.echo(f"Creating zCFDFoam job {job_name}")
     click.echo("----------------------------------")
-
-    job = ZCFDJob(
+    job = zcfd_job(
         zcfd_version,
         job_name,
         input_folder,
-        c,
-        p,
+        np=np,
+        r=r,
         cycles=cycles,
+        p=p,
+        c=c,
         restart=restart,
-        partitions=np,
     )
 
-    job.zcfd.runtime = r
-
     click.echo(f"Submitting to {queue_code}...")
     job_spec = job.get_job_create_spec(queue_code)
 
     # Submit the job
-    job = ctx.obj[1].job.submit(job_spec)
+    job = ctx.obj.client.job.submit(job_spec)
 
     click.echo(f"Job {job_name} submitted. New job ID = {job[0].id}")
 
@@ -602,11 +1893,10 @@ def team(ctx):
 @click.pass_context
 def list(ctx):
     """List your available EPIC teams"""
-    click.echo("Your available EPIC Teams")
-    click.echo("ID | Name")
-    click.echo("-----------------")
-    for team in ctx.obj[1].teams.list():
-        click.echo(f"{team.id} |  {team.name}")
+    teams = ctx.obj.client.teams.list()
+    with Table([("id", "ID"), ("name", "Name")], title="Your available EPIC Teams") as table:
+        for team in teams:
+            table.row(team.id, team.name)
 
 
 @main.group()
@@ -618,38 +1908,43 @@ def cluster(ctx):
 
 @cluster.command()
 @click.pass_context
+@catalog_cache_options
 def list(ctx):
     """List your available EPIC clusters"""
-    click.echo("Your available EPIC HPC queues")
-    click.echo(
-        "Queue Code | Cluster Name | Queue Name | CPU Type | GPU Type | Total CPU Cores "
-    )
-    click.echo("-----------------------------------------")
-    qlist = ctx.obj[1].catalog.list_clusters()
-    for queue in qlist:
-        click.echo(
-            "{} | {} | {} | {} | {} | {}".format(
+    qlist = ctx.obj.client.catalog.list_clusters()
+    columns = [
+        ("queue_code", "Queue Code"),
+        ("cluster_name", "Cluster Name"),
+        ("queue_name", "Queue Name"),
+        ("cpu_type", "CPU Type"),
+        ("gpu_type", "GPU Type"),
+        ("total_cpu_cores", "Total CPU Cores"),
+    ]
+    with Table(columns, title="Your available EPIC HPC queues") as table:
+        for queue in qlist:
+            table.row(
                 queue.queue_code,
-                queue.name,
                 queue.cluster_name,
+                queue.name,
                 queue.resource_config.cpu_generation,
                 queue.resource_config.accelerator.description
                 if queue.resource_config.accelerator
                 else "--",
                 queue.max_allocation,
             )
-        )
 
 
 @cluster.command()
 @click.pass_context
 @click.argument("ID")
+@catalog_cache_options
 def details(ctx, id):
     """Print the details of queue ID"""
-    click.echo(f"HPC Cluster {id} details")
-    click.echo("-----------------------------------------")
-    queue_details = ctx.obj[1].catalog.queue_details(id)
-    pprint.pprint(queue_details)
+    if not machine_readable():
+        click.echo(f"HPC Cluster {id} details")
+        click.echo("-----------------------------------------")
+    queue_details = ctx.obj.client.catalog.queue_details(id)
+    render(queue_details)
 
 
 @main.group()
@@ -661,22 +1956,25 @@ def apps(ctx):
 
 @apps.command()
 @click.pass_context
+@catalog_cache_options
 def list(ctx):
     """List your available EPIC applications"""
-    click.echo("Your available EPIC application versions")
-    click.echo("App Code | Product Name | Version | Available on cluster code")
-    click.echo("-------------------------------------------------")
-    alist = ctx.obj[1].catalog.list_applications()
-    for app in alist:
-        for version in app.versions:
-            click.echo(
-                "{} | {} | {} | {}".format(
+    alist = ctx.obj.client.catalog.list_applications()
+    columns = [
+        ("app_code", "App Code"),
+        ("product_name", "Product Name"),
+        ("version", "Version"),
+        ("available_on", "Available on cluster code"),
+    ]
+    with Table(columns, title="Your available EPIC application versions") as table:
+        for app in alist:
+            for version in app.versions:
+                table.row(
                     version.app_code,
                     app.product.name,
                     version.version,
                     version.available_on,
                 )
-            )
 
 
 @main.group()
@@ -690,24 +1988,36 @@ def desktop(ctx):
 @click.pass_context
 def list(ctx):
     """List your EPIC Desktop instances"""
-    click.echo("Your available EPIC Teams")
-    click.echo("ID | Status | Node Type | Launched by | Created")
-    click.echo("-----------------")
-    for desktop in ctx.obj[1].desktops.list():
-        click.echo(
-            f"{desktop.id} |  {desktop.status} | {desktop.node_type.node_code} | {desktop.launched_by} | {desktop.created.strftime('%Y-%m-%d %H:%M')}"
-        )
+    desktops = ctx.obj.client.desktops.list()
+    columns = [
+        ("id", "ID"),
+        ("status", "Status"),
+        ("node_type", "Node Type"),
+        ("launched_by", "Launched by"),
+        ("created", "Created"),
+    ]
+    with Table(columns, title="Your EPIC Desktops") as table:
+        for desktop in desktops:
+            table.row(
+                desktop.id,
+                desktop.status,
+                desktop.node_type.node_code,
+                desktop.launched_by,
+                desktop.created,
+                text=f"{desktop.id} | {desktop.status} | {desktop.node_type.node_code} | {desktop.launched_by} | {desktop.created.strftime('%Y-%m-%d %H:%M')}",
+            )
 
 
 @desktop.command()
 @click.pass_context
+@catalog_cache_options
 def nodes(ctx):
     """List the available Desktop node types"""
-    click.echo("Available EPIC Desktop node types")
-    click.echo("Node Code | Name | Description")
-    click.echo("-----------------------------")
-    for desktop in ctx.obj[1].catalog.list_desktops():
-        click.echo(f"{desktop.node_code} |  {desktop.name} | {desktop.description}")
+    nodes = ctx.obj.client.catalog.list_desktops()
+    columns = [("node_code", "Node Code"), ("name", "Name"), ("description", "Description")]
+    with Table(columns, title="Available EPIC Desktop node types") as table:
+        for desktop in nodes:
+            table.row(desktop.node_code, desktop.name, desktop.description)
 
 
 @desktop.command()
@@ -715,7 +2025,7 @@ def nodes(ctx):
 @click.argument("desktop_id")
 def details(ctx, desktop_id):
     """Get details of Desktop ID"""
-    pprint.pprint(ctx.obj[1].desktops.get_details(desktop_id))
+    render(ctx.obj.client.desktops.get_details(desktop_id))
 
 
 @desktop.command()
@@ -743,12 +2053,15 @@ def details(ctx, desktop_id):
 )
 def launch(ctx, data_path, node_type, runtime, mount_mode, p):
     """Launch a new desktop using node with the node_code NODE_TYPE for RUNTIME hours. Mount data at epic path DATA_PATH on the Desktop."""
-    click.echo("Launching new desktop...")
+    click.echo("Launching new desktop...", err=machine_readable())
+    from pyepic.desktops import Desktop
+    from pyepic.desktops.desktop import MountType
+
     desktop = Desktop(data_path, node_type)
     desktop.runtime = runtime
     desktop.mount_type = MountType(mount_mode)
     desktop.project_id = p
-    pprint.pprint(ctx.obj[1].desktops.launch(desktop.get_launch_spec()))
+    render(ctx.obj.client.desktops.launch(desktop.get_launch_spec()))
 
 
 @desktop.command()
@@ -756,8 +2069,8 @@ def launch(ctx, data_path, node_type, runtime, mount_mode, p):
 @click.argument("desktop_id", type=int)
 def terminate(ctx, desktop_id):
     """Terminate desktop ID"""
-    click.echo("Terminating desktop ID {}".format(desktop_id))
-    pprint.pprint(ctx.obj[1].desktops.terminate(desktop_id))
+    click.echo("Terminating desktop ID {}".format(desktop_id), err=machine_readable())
+    render(ctx.obj.client.desktops.terminate(desktop_id))
 
 
 if __name__ == "__main__":
@@ -0,0 +1,115 @@
+# BSD 3 - Clause License
+
+# Copyright(c) 2020, Zenotech
+# All rights reserved.
+
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+
+# 1. Redistributions of source code must retain the above copyright notice, this
+# list of conditions and the following disclaimer.
+
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and / or other materials provided with the distribution.
+
+# 3. Neither the name of the copyright holder nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES(INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+#         SERVICES
+#         LOSS OF USE, DATA, OR PROFITS
+#         OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT(INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import os
+import sys
+from pathlib import Path
+
+import click
+
+from .core import EpicConfig
+from .exceptions import ConfigurationException
+from .cache import ResponseCache, DEFAULT_TTL
+from .output import machine_readable
+from .retry import RetryPolicy, set_policy
+from .http import share_connections, use_response_cache
+
+
+DEFAULT_CONFIG_FILE = os.path.join(Path.home(), ".epic", "config")
+
+
+class CliContext(object):
+    """State shared by the commands of one CLI invocation.
+
+    The configuration is parsed and the EPIC client built the first time a
+    command asks for them, so commands that never talk to EPIC, and --help,
+    do not pay for importing and setting up the API client.
+    """
+
+    def __init__(self, config_file, profile="default"):
+        self.config_file = config_file
+        self.profile = profile
+        self._config = None
+        self._client = None
+
+    @property
+    def config(self):
+        if self._config is None:
+            try:
+                # Keep stdout clean for programs reading json or csv results
+                click.echo(
+                    "Loading config from %s" % self.config_file,
+                    err=machine_readable(),
+                )
+                self._config = EpicConfig(
+                    config_file=self.config_file, config_section=self.profile
+                )
+            except ConfigurationException:
+                click.echo(
+                    "Configuration file not found or invalid, please run configure."
+                )
+                sys.exit(1)
+        return self._config
+
+    @property
+    def client(self):
+        if self._client is None:
+            from pyepic.client import EPICClient
+
+            config = self.config
+            set_policy(RetryPolicy.from_config(config))
+            share_connections()
+            # V2 API Client
+            client = EPICClient(
+                connection_token=config.EPIC_TOKEN,
+                connection_url="{}/api/v2".format(config.EPIC_API_URL),
+            )
+            # Set the data source for file meta-data
+            client.data.meta_source = "CLI"
+            self._client = client
+        return self._client
+
+    def cache_catalog(self, enabled=True, refresh=False):
+        """Answer catalog requests from the on-disk response cache, or stop
+        doing so if enabled is False. If refresh is set the cached responses
+        are fetched again."""
+        if not enabled:
+            use_response_cache(None)
+            return
+        config = self.config
+        use_response_cache(
+            ResponseCache(
+                "{}\n{}".format(self.profile, config.EPIC_API_URL),
+                ttl=config.CACHE_TTL if config.CACHE_TTL is not None else DEFAULT_TTL,
+                refresh=refresh,
+            )
+        )
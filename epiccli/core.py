@@ -51,6 +51,13 @@ class EpicConfig(object):
         """
         self.EPIC_API_URL = None
         self.EPIC_TOKEN = None
+        self.CACHE_TTL = None
+        self.RETRIES = None
+        self.RETRY_BACKOFF = None
+        self.RETRY_MAX_BACKOFF = None
+        self.HEDGE_AFTER = None
+        self.CONNECT_TIMEOUT = None
+        self.READ_TIMEOUT = None
         if config_file is not None:
             self._load_config_file(config_file, config_section)
             self._config_file = config_file
@@ -78,6 +85,26 @@ class EpicConfig(object):
             if parser.has_section(config_section):
                 self.EPIC_API_URL = parser.get(config_section, "url")
                 self.EPIC_TOKEN = parser.get(config_section, "token")
+                try:
+                    self.CACHE_TTL = parser.getint(config_section, "cache_ttl", fallback=None)
+                    self.RETRIES = parser.getint(config_section, "retries", fallback=None)
+                    self.RETRY_BACKOFF = parser.getfloat(
+                        config_section, "retry_backoff", fallback=None
+                    )
+                    self.RETRY_MAX_BACKOFF = parser.getfloat(
+                        config_section, "retry_max_backoff", fallback=None
+                    )
+                    self.HEDGE_AFTER = parser.getfloat(
+                        config_section, "hedge_after", fallback=None
+                    )
+                    self.CONNECT_TIMEOUT = parser.getfloat(
+                        config_section, "connect_timeout", fallback=None
+                    )
+                    self.READ_TIMEOUT = parser.getfloat(
+                        config_section, "read_timeout", fallback=None
+                    )
+                except ValueError as e:
+                    raise ConfigurationException(f"Invalid EPIC configuration, {e}")
             else:
                 raise ConfigurationException(f"Invalid EPIC configuration, cannot find section {config_section}")
         else:
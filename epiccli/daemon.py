@@ -0,0 +1,284 @@
+# BSD 3 - Clause License
+
+# Copyright(c) 2020, Zenotech
+# All rights reserved.
+
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+
+# 1. Redistributions of source code must retain the above copyright notice, this
+# list of conditions and the following disclaimer.
+
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and / or other materials provided with the distribution.
+
+# 3. Neither the name of the copyright holder nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES(INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+#         SERVICES
+#         LOSS OF USE, DATA, OR PROFITS
+#         OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT(INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import hashlib
+import io
+import json
+import os
+import socket
+import socketserver
+import sys
+import threading
+import time
+from pathlib import Path
+
+import click
+
+from .output import TEXT, set_format
+from .shell import run_command
+
+
+DAEMON_DIR = os.path.join(Path.home(), ".epic", "daemon")
+
+# Seconds a forwarded command waits for the daemon before giving up
+CLIENT_TIMEOUT = 300
+
+CATALOG_TTL = 300
+JOB_TTL = 10
+
+# Read only queries that are forwarded to a running daemon, and how long in
+# seconds the daemon may reuse their output for identical command lines
+CACHE_TTLS = {
+    ("cluster", "list"): CATALOG_TTL,
+    ("cluster", "details"): CATALOG_TTL,
+    ("apps", "list"): CATALOG_TTL,
+    ("desktop", "nodes"): CATALOG_TTL,
+    ("team", "list"): CATALOG_TTL,
+    ("project", "list"): CATALOG_TTL,
+    ("job", "list"): JOB_TTL,
+    ("job", "details"): JOB_TTL,
+    ("job", "steps"): JOB_TTL,
+    ("desktop", "list"): JOB_TTL,
+}
+
+
+def socket_path(config_file, profile):
+    """ The socket of the daemon serving profile from config_file """
+    name = hashlib.sha1(
+        "{}\n{}".format(os.path.abspath(config_file), profile).encode("utf-8")
+    ).hexdigest()[:16]
+    return os.path.join(DAEMON_DIR, name + ".sock")
+
+
+def forwardable(args):
+    """ True if the command line args can be served by a daemon """
+    if "--help" in args:
+        return False
+    # Relative paths would be read from the daemon's working directory
+    if any(arg == "--from-file" or arg.startswith("--from-file=") for arg in args):
+        return False
+    return tuple(args[:2]) in CACHE_TTLS
+
+
+def _request(path, message, timeout=CLIENT_TIMEOUT):
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        client.settimeout(timeout)
+        client.connect(path)
+        client.sendall(json.dumps(message).encode("utf-8") + b"\n")
+        client.shutdown(socket.SHUT_WR)
+        with client.makefile("rb") as response:
+            return json.loads(response.read().decode("utf-8"))
+    finally:
+        client.close()
+
+
+def forward(path, args, output=TEXT):
+    """Run args on the daemon listening on path, with results in the output
+    format output, and print its output.
+
+    Returns the exit status of the command, or None if no daemon is running
+    so the command should be run locally instead.
+    """
+    if not hasattr(socket, "AF_UNIX") or os.environ.get("EPIC_NO_DAEMON"):
+        return None
+    if not os.path.exists(path):
+        return None
+    try:
+        response = _request(path, {"args": args, "output": output})
+    except (OSError, ValueError):
+        return None
+    sys.stdout.write(response["stdout"])
+    sys.stdout.flush()
+    sys.stderr.write(response["stderr"])
+    return response["status"]
+
+
+def control(path, command):
+    """ Send a control command to the daemon on path and return its reply """
+    return _request(path, {"control": command}, timeout=10)
+
+
+class _ThreadOutput(object):
+    """Stand in for sys.stdout or sys.stderr that sends what each request
+    handler thread writes to that thread's own buffer"""
+
+    encoding = "utf-8"
+    errors = "strict"
+
+    def __init__(self, stream):
+        self._stream = stream
+        self._local = threading.local()
+
+    def capture(self):
+        self._local.buffer = io.StringIO()
+
+    def release(self):
+        buffer = self._local.buffer
+        self._local.buffer = None
+        return buffer.getvalue()
+
+    def _target(self):
+        buffer = getattr(self._local, "buffer", None)
+        return buffer if buffer is not None else self._stream
+
+    def write(self, text):
+        return self._target().write(text)
+
+    def flush(self):
+        self._target().flush()
+
+    def isatty(self):
+        if getattr(self._local, "buffer", None) is not None:
+            return False
+        return self._stream.isatty()
+
+    def __getattr__(self, name):
+        return getattr(self._stream, name)
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        try:
+            message = json.loads(self.rfile.readline().decode("utf-8"))
+        except ValueError:
+            return
+        if "control" in message:
+            response = self.server.epic_daemon.control(message["control"])
+        else:
+            response = self.server.epic_daemon.run(
+                message["args"], message.get("output", TEXT)
+            )
+        self.wfile.write(json.dumps(response).encode("utf-8"))
+
+
+class _Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+    # Many scripts may connect at once, and a full backlog makes connect fail
+    request_queue_size = 128
+
+
+class EpicDaemon(object):
+    """Serve CLI commands to other epic processes over a Unix socket.
+
+    Commands run in this process against ctx, so every caller shares its EPIC
+    client, connection pool and cache. The output of the queries in
+    CACHE_TTLS is kept and served again to identical command lines until it
+    expires.
+    """
+
+    def __init__(self, ctx, path):
+        self.ctx = ctx
+        self.path = path
+        self.started = time.time()
+        self.requests = 0
+        self.hits = 0
+        self._cache = {}
+        self._lock = threading.Lock()
+        self._server = None
+
+    def run(self, args, output=TEXT):
+        key = (output, *args)
+        now = time.monotonic()
+        with self._lock:
+            self.requests += 1
+            cached = self._cache.get(key)
+            if cached is not None and cached[0] > now:
+                self.hits += 1
+                return cached[1]
+        stdout, stderr = sys.stdout, sys.stderr
+        stdout.capture()
+        stderr.capture()
+        try:
+            set_format(output)
+            status = run_command(self.ctx, args)
+        except Exception as e:
+            click.echo("Error: {}".format(e), err=True)
+            status = 1
+        finally:
+            response = {
+                "stdout": stdout.release(),
+                "stderr": stderr.release(),
+            }
+        response["status"] = status
+        ttl = CACHE_TTLS.get(tuple(args[:2]))
+        if status == 0 and ttl:
+            with self._lock:
+                self._cache[key] = (now + ttl, response)
+        return response
+
+    def control(self, command):
+        if command == "stop":
+            threading.Thread(target=self._server.shutdown).start()
+        with self._lock:
+            self._cache = {
+                key: value
+                for key, value in self._cache.items()
+                if value[0] > time.monotonic()
+            }
+            return {
+                "pid": os.getpid(),
+                "uptime": time.time() - self.started,
+                "requests": self.requests,
+                "hits": self.hits,
+                "cached": len(self._cache),
+            }
+
+    def serve(self):
+        """ Serve requests until stopped """
+        if os.path.exists(self.path):
+            try:
+                control(self.path, "status")
+            except OSError:
+                # Left behind by a daemon that did not shut down cleanly
+                os.remove(self.path)
+            else:
+                raise RuntimeError("A daemon is already running on {}".format(self.path))
+        os.makedirs(os.path.dirname(self.path), mode=0o700, exist_ok=True)
+        os.chmod(os.path.dirname(self.path), 0o700)
+        # Create the socket with no access for other users, rather than
+        # restricting it afterwards, so there is no moment they can connect
+        umask = os.umask(0o177)
+        try:
+            self._server = _Server(self.path, _Handler)
+        finally:
+            os.umask(umask)
+        self._server.epic_daemon = self
+        stdout, stderr = sys.stdout, sys.stderr
+        sys.stdout, sys.stderr = _ThreadOutput(stdout), _ThreadOutput(stderr)
+        try:
+            self._server.serve_forever()
+        finally:
+            sys.stdout, sys.stderr = stdout, stderr
+            self._server.server_close()
+            if os.path.exists(self.path):
+                os.remove(self.path)
@@ -0,0 +1,140 @@
+# BSD 3 - Clause License
+
+# Copyright(c) 2020, Zenotech
+# All rights reserved.
+
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+
+# 1. Redistributions of source code must retain the above copyright notice, this
+# list of conditions and the following disclaimer.
+
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and / or other materials provided with the distribution.
+
+# 3. Neither the name of the copyright holder nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES(INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+#         SERVICES
+#         LOSS OF USE, DATA, OR PROFITS
+#         OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT(INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import os
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+
+# The largest number of keys S3 accepts in a single DeleteObjects request
+MAX_BATCH_SIZE = 1000
+
+DEFAULT_WORKERS = 8
+
+
+class DeleteResult(object):
+    """ Outcome of a bulk delete """
+
+    def __init__(self):
+        self.deleted = 0
+        self.errors = []
+
+
+class BatchDeleter(object):
+    """Delete large numbers of objects with concurrent DeleteObjects requests.
+
+    Keys are grouped into batches of batch_size as they are read from the
+    iterable passed to delete, so listing and deleting overlap and memory
+    use does not grow with the number of keys. At most workers batches are
+    in flight at once. If a request fails every key in its batch is
+    reported as an error and the other batches carry on.
+    """
+
+    def __init__(self, storage, workers=DEFAULT_WORKERS, batch_size=MAX_BATCH_SIZE):
+        self.storage = storage
+        self.workers = max(workers, 1)
+        self.batch_size = min(max(batch_size, 1), MAX_BATCH_SIZE)
+
+    def delete(self, keys, progress=None):
+        """Delete every key in keys, calling progress(deleted) after each
+        batch completes. Returns a DeleteResult."""
+        result = DeleteResult()
+        pending = set()
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            for batch in self._batches(keys):
+                if len(pending) >= self.workers * 2:
+                    pending = self._collect(pending, result, progress, FIRST_COMPLETED)
+                pending.add(executor.submit(self._delete_batch, batch))
+            while pending:
+                pending = self._collect(pending, result, progress, FIRST_COMPLETED)
+        return result
+
+    def _batches(self, keys):
+        batch = []
+        for key in keys:
+            batch.append(key)
+            if len(batch) >= self.batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    def _collect(self, pending, result, progress, return_when):
+        done, pending = wait(pending, return_when=return_when)
+        for future in done:
+            deleted, errors = future.result()
+            result.deleted += deleted
+            result.errors.extend(errors)
+        if progress is not None:
+            progress(result.deleted)
+        return pending
+
+    def _delete_batch(self, batch):
+        from botocore.exceptions import BotoCoreError, ClientError
+
+        try:
+            response = self.storage.s3_client.delete_objects(
+                Bucket=self.storage.bucket,
+                Delete={"Objects": [{"Key": key} for key in batch], "Quiet": True},
+            )
+        except (BotoCoreError, ClientError) as e:
+            # The whole request failed, so none of the batch was deleted
+            return 0, [(key, str(e)) for key in batch]
+        errors = [
+            (error["Key"], error.get("Message", error.get("Code")))
+            for error in response.get("Errors", [])
+        ]
+        return len(batch) - len(errors), errors
+
+
+def delete_local(paths, root):
+    """Delete the local files in paths, and then the folders below root that
+    deleting them left empty. Returns a DeleteResult."""
+    result = DeleteResult()
+    folders = set()
+    for path in paths:
+        try:
+            os.remove(path)
+        except OSError as e:
+            result.errors.append((path, e.strerror or str(e)))
+            continue
+        result.deleted += 1
+        folders.add(os.path.dirname(os.path.abspath(path)))
+    root = os.path.abspath(root)
+    # Deepest first, so a folder is only removed once its sub folders have been
+    for folder in sorted(folders, key=len, reverse=True):
+        while folder.startswith(root + os.sep):
+            try:
+                os.rmdir(folder)
+            except OSError:
+                break
+            folder = os.path.dirname(folder)
+    return result
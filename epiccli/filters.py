@@ -0,0 +1,191 @@
+# BSD 3 - Clause License
+
+# Copyright(c) 2020, Zenotech
+# All rights reserved.
+
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+
+# 1. Redistributions of source code must retain the above copyright notice, this
+# list of conditions and the following disclaimer.
+
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and / or other materials provided with the distribution.
+
+# 3. Neither the name of the copyright holder nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES(INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+#         SERVICES
+#         LOSS OF USE, DATA, OR PROFITS
+#         OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT(INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import re
+
+from .exceptions import CommandError
+
+
+def _glob_to_regex(pattern):
+    """Translate a glob into a regular expression for "/" separated paths.
+
+    "*" and "?" do not match "/", "**" matches across folders and "[...]"
+    character classes are passed through.
+    """
+    i = 0
+    regex = []
+    while i < len(pattern):
+        char = pattern[i]
+        if pattern.startswith("**/", i):
+            regex.append("(?:.*/)?")
+            i += 3
+            continue
+        if pattern.startswith("**", i):
+            regex.append(".*")
+            i += 2
+            continue
+        if char == "*":
+            regex.append("[^/]*")
+        elif char == "?":
+            regex.append("[^/]")
+        elif char == "[":
+            end = pattern.find("]", i + 2 if pattern[i + 1 : i + 2] == "!" else i + 1)
+            if end == -1:
+                regex.append(re.escape(char))
+            else:
+                body = pattern[i + 1 : end]
+                if body.startswith("!"):
+                    body = "^" + body[1:]
+                regex.append("[" + body.replace("\\", "\\\\") + "]")
+                i = end
+        else:
+            regex.append(re.escape(char))
+        i += 1
+    return "".join(regex)
+
+
+def _split_pattern(pattern):
+    """ Return (glob, anchored, folder_only) for an include or exclude pattern """
+    # A leading "/" anchors the pattern to the top folder like any other "/"
+    anchored = "/" in pattern.rstrip("/")
+    folder_only = pattern.endswith("/")
+    pattern = pattern.strip("/") if folder_only else pattern.lstrip("/")
+    return pattern, anchored, folder_only
+
+
+def _pattern_to_regex(pattern, folder=False):
+    """Build the regular expression for a single include or exclude pattern.
+
+    Patterns without a "/" match any file or folder name at any depth, so
+    "*.log" matches "a/b/run.log". Patterns containing a "/" are matched from
+    the top of the folder. A trailing "/" only matches folders, so
+    "processor*/" matches everything inside the processor folders. A path is
+    also matched if one of the folders it is in matches. If folder is set the
+    expression matches folder paths, which have no trailing "/".
+    """
+    pattern, anchored, folder_only = _split_pattern(pattern)
+    regex = _glob_to_regex(pattern)
+    prefix = "" if anchored else "(?:.*/)?"
+    suffix = "/.+" if folder_only and not folder else "(?:/.*)?"
+    return prefix + regex + suffix
+
+
+def _check_pattern(pattern):
+    try:
+        re.compile(_pattern_to_regex(pattern))
+    except re.error as e:
+        raise CommandError("Invalid pattern {!r}, {}".format(pattern, e.msg))
+
+
+class PathFilter(object):
+    """Select paths with --include and --exclude glob patterns.
+
+    A path is selected if it matches at least one include pattern, or there
+    are no include patterns, and does not match any exclude pattern. All the
+    patterns of each kind are compiled once into a single regular
+    expression. Paths are relative to the folder being worked on and use
+    "/" as the separator.
+
+    prune tells a walk of a folder tree when it can skip a whole sub folder
+    without listing it, because nothing inside could be selected. A
+    CommandError naming the pattern is raised if one is not a valid glob.
+    """
+
+    def __init__(self, include=(), exclude=()):
+        self.include = tuple(include or ())
+        self.exclude = tuple(exclude or ())
+        for pattern in self.include + self.exclude:
+            _check_pattern(pattern)
+        self._include = self._compile(self.include)
+        self._exclude = self._compile(self.exclude)
+        self._exclude_folder = self._compile(self.exclude, folder=True)
+        # Includes anchored to the top folder, split into the pattern for each
+        # level. Any unanchored include can match at any depth, so if there is
+        # one no folder can be pruned because of the includes.
+        self._anchored_includes = []
+        for pattern in self.include:
+            glob, anchored, _ = _split_pattern(pattern)
+            if not anchored:
+                self._anchored_includes = None
+                break
+            self._anchored_includes.append(
+                [
+                    None if part == "**" else re.compile(_glob_to_regex(part) + r"\Z")
+                    for part in glob.split("/")
+                ]
+            )
+
+    @staticmethod
+    def _compile(patterns, folder=False):
+        if not patterns:
+            return None
+        return re.compile(
+            "(?:{})\\Z".format(
+                "|".join(
+                    "(?:{})".format(_pattern_to_regex(p, folder=folder))
+                    for p in patterns
+                )
+            ),
+            re.DOTALL,
+        )
+
+    @property
+    def can_prune(self):
+        """ True if prune can ever skip a folder """
+        return bool(self.exclude) or bool(self._anchored_includes)
+
+    def prune(self, folder):
+        """Return True if no path inside folder, given without a trailing "/",
+        can be selected"""
+        if self._exclude_folder is not None and self._exclude_folder.match(folder):
+            return True
+        if not self._anchored_includes:
+            return False
+        parts = folder.split("/")
+        return not any(self._could_contain(levels, parts) for levels in self._anchored_includes)
+
+    @staticmethod
+    def _could_contain(levels, parts):
+        for level, part in zip(levels, parts):
+            if level is None:
+                return True
+            if not level.match(part):
+                return False
+        return True
+
+    def __bool__(self):
+        return bool(self.include or self.exclude)
+
+    def matches(self, path):
+        if self._exclude is not None and self._exclude.match(path):
+            return False
+        return self._include is None or self._include.match(path) is not None
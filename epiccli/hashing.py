@@ -0,0 +1,179 @@
+# BSD 3 - Clause License
+
+# Copyright(c) 2020, Zenotech
+# All rights reserved.
+
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+
+# 1. Redistributions of source code must retain the above copyright notice, this
+# list of conditions and the following disclaimer.
+
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and / or other materials provided with the distribution.
+
+# 3. Neither the name of the copyright holder nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES(INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+#         SERVICES
+#         LOSS OF USE, DATA, OR PROFITS
+#         OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT(INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import hashlib
+import os
+import sqlite3
+from pathlib import Path
+
+from .chunked import DEFAULT_PART_SIZE, MIN_PART_SIZE, choose_part_size
+
+
+HASH_CACHE_FILE = os.path.join(Path.home(), ".epic", "cache", "hashes.db")
+
+READ_SIZE = 1024 * 1024
+
+# Part sizes commonly used by other S3 tools, tried when working out how a
+# multipart object was split up
+COMMON_PART_SIZES = [8 * 1024 * 1024, 16 * 1024 * 1024, MIN_PART_SIZE]
+
+
+def multipart_part_size(size, etag, part_size=DEFAULT_PART_SIZE):
+    """Work out the part size used to upload an object from its ETag.
+
+    Returns None for objects uploaded in a single part, or if no likely part
+    size gives the number of parts recorded in the ETag.
+    """
+    etag = etag.strip('"')
+    if "-" not in etag:
+        return None
+    try:
+        parts = int(etag.rsplit("-", 1)[1])
+    except ValueError:
+        return None
+    mib = 1024 * 1024
+    estimate = ((size + parts - 1) // parts + mib - 1) // mib * mib
+    candidates = [choose_part_size(size, part_size), part_size, estimate]
+    for candidate in candidates + COMMON_PART_SIZES:
+        if candidate > 0 and (size + candidate - 1) // candidate == parts:
+            return candidate
+    return None
+
+
+def file_etag(filename, part_size=None):
+    """Compute the S3 ETag of filename as it would be if uploaded in parts of
+    part_size bytes, or in a single request if part_size is None"""
+    with open(filename, "rb") as source:
+        if part_size is None:
+            digest = hashlib.md5()
+            for chunk in iter(lambda: source.read(READ_SIZE), b""):
+                digest.update(chunk)
+            return '"{}"'.format(digest.hexdigest())
+        part_digests = []
+        while True:
+            digest = hashlib.md5()
+            remaining = part_size
+            while remaining > 0:
+                chunk = source.read(min(READ_SIZE, remaining))
+                if not chunk:
+                    break
+                digest.update(chunk)
+                remaining -= len(chunk)
+            if remaining == part_size:
+                break
+            part_digests.append(digest.digest())
+            if remaining > 0:
+                break
+    combined = hashlib.md5(b"".join(part_digests))
+    return '"{}-{}"'.format(combined.hexdigest(), len(part_digests))
+
+
+def _file_etag_job(args):
+    return file_etag(*args)
+
+
+class ETagHasher(object):
+    """Compute S3 compatible ETags for local files.
+
+    Digests are calculated on a pool of processes and cached on disk keyed
+    by inode, modification time and size, so a file is only read again once
+    it has been changed.
+    """
+
+    def __init__(self, cache_file=HASH_CACHE_FILE, processes=None):
+        self.processes = processes
+        os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+        self._db = sqlite3.connect(cache_file, timeout=30)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS hashes ("
+            "device INTEGER, inode INTEGER, mtime INTEGER, size INTEGER, "
+            "part_size INTEGER, etag TEXT, "
+            "PRIMARY KEY (device, inode, mtime, size, part_size))"
+        )
+        self._db.commit()
+
+    def matches(self, files):
+        """For each (filename, remote_size, remote_etag) in files return
+        whether the local file has the same content as the remote object"""
+        results = [False] * len(files)
+        jobs = []
+        for index, (filename, size, etag) in enumerate(files):
+            if not etag:
+                continue
+            part_size = multipart_part_size(size, etag)
+            if part_size is None and "-" in etag:
+                continue
+            stat = os.stat(filename)
+            key = (
+                stat.st_dev,
+                stat.st_ino,
+                stat.st_mtime_ns,
+                stat.st_size,
+                part_size or 0,
+            )
+            row = self._db.execute(
+                "SELECT etag FROM hashes WHERE device = ? AND inode = ? AND mtime = ? "
+                "AND size = ? AND part_size = ?",
+                key,
+            ).fetchone()
+            if row is not None:
+                results[index] = row[0] == etag
+            else:
+                jobs.append((index, key, filename, part_size, etag))
+        for (index, key, _, _, etag), local_etag in zip(jobs, self._compute(jobs)):
+            self._db.execute(
+                "INSERT OR REPLACE INTO hashes VALUES (?, ?, ?, ?, ?, ?)",
+                key + (local_etag,),
+            )
+            results[index] = local_etag == etag
+        self._db.commit()
+        return results
+
+    def _compute(self, jobs):
+        args = [(filename, part_size) for _, _, filename, part_size, _ in jobs]
+        if len(args) <= 1:
+            return [_file_etag_job(arg) for arg in args]
+        # multiprocessing is only imported when there is work to spread out
+        from concurrent.futures import ProcessPoolExecutor
+
+        with ProcessPoolExecutor(max_workers=self.processes) as executor:
+            return list(executor.map(_file_etag_job, args))
+
+    def close(self):
+        self._db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -0,0 +1,258 @@
+# BSD 3 - Clause License
+
+# Copyright(c) 2020, Zenotech
+# All rights reserved.
+
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+
+# 1. Redistributions of source code must retain the above copyright notice, this
+# list of conditions and the following disclaimer.
+
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and / or other materials provided with the distribution.
+
+# 3. Neither the name of the copyright holder nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES(INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+#         SERVICES
+#         LOSS OF USE, DATA, OR PROFITS
+#         OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT(INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import contextvars
+import json
+import threading
+import time
+from urllib.parse import urlencode, urlparse
+
+from .retry import get_policy
+
+
+_pools = {}
+_lock = threading.Lock()
+_original_init = None
+_original_request = None
+
+# The (ResponseCache, paths) used for GET requests to paths containing one
+# of paths, if any. Kept per thread, so the commands a daemon runs at the
+# same time do not change each other's caching.
+_response_cache = contextvars.ContextVar("response_cache", default=(None, ()))
+
+# The Tracer recording every request sent, if any
+_tracer = None
+
+_urllib3_retries = None
+
+
+def _pool_key(configuration, pools_size, maxsize):
+    return (
+        configuration.verify_ssl,
+        configuration.ssl_ca_cert,
+        configuration.cert_file,
+        configuration.key_file,
+        configuration.assert_hostname,
+        configuration.retries,
+        configuration.proxy,
+        repr(configuration.proxy_headers),
+        pools_size,
+        maxsize or configuration.connection_pool_maxsize,
+    )
+
+
+def _no_retries():
+    global _urllib3_retries
+    if _urllib3_retries is None:
+        import urllib3
+
+        _urllib3_retries = urllib3.Retry(
+            total=None, connect=0, read=0, status=0, other=0, redirect=5
+        )
+    return _urllib3_retries
+
+
+def _shared_init(self, configuration, pools_size=4, maxsize=None):
+    if configuration.retries is None:
+        # Requests are retried by _send following the RetryPolicy, so urllib3
+        # must not retry them as well
+        configuration.retries = _no_retries()
+    key = _pool_key(configuration, pools_size, maxsize)
+    with _lock:
+        pool_manager = _pools.get(key)
+        if pool_manager is None:
+            _original_init(self, configuration, pools_size, maxsize)
+            _pools[key] = self.pool_manager
+        else:
+            self.pool_manager = pool_manager
+
+
+def _send_once(self, method, url, query_params, args, kwargs, attempt):
+    tracer = _tracer
+    if tracer is None:
+        return _original_request(self, method, url, query_params, *args, **kwargs)
+    body = kwargs.get("body")
+    sent = len(json.dumps(body, default=str)) if body is not None else 0
+    started = tracer.clock()
+    try:
+        response = _original_request(self, method, url, query_params, *args, **kwargs)
+    except Exception as e:
+        tracer.record(
+            "epic",
+            method,
+            url,
+            getattr(e, "status", None),
+            started,
+            sent=sent,
+            retries=attempt,
+            error=type(e).__name__,
+        )
+        raise
+    received = len(response.data) if kwargs.get("_preload_content", True) else 0
+    tracer.record(
+        "epic", method, url, response.status, started, sent, received, retries=attempt
+    )
+    return response
+
+
+def _in_background(send, *args):
+    """Call send(*args) on a daemon thread, so a request that is no longer
+    needed does not keep the CLI from exiting, returning a Future"""
+    from concurrent.futures import Future
+
+    future = Future()
+
+    def run():
+        try:
+            future.set_result(send(*args))
+        except BaseException as e:
+            future.set_exception(e)
+
+    threading.Thread(target=run, name="epic-hedge", daemon=True).start()
+    return future
+
+
+def _hedged(policy, send, *args):
+    """Call send(*args) and, if it has not returned after policy.hedge_after
+    seconds, call it again at the same time and return whichever succeeds
+    first"""
+    from concurrent.futures import FIRST_COMPLETED, wait
+
+    first = _in_background(send, *args)
+    done, _ = wait([first], timeout=policy.hedge_after)
+    if done:
+        return first.result()
+    second = _in_background(send, *args)
+    done, _ = wait([first, second], return_when=FIRST_COMPLETED)
+    winner = done.pop()
+    if winner.exception() is None:
+        return winner.result()
+    # The first to finish failed, the other may still succeed
+    return (second if winner is first else first).result()
+
+
+def _send(self, method, url, query_params=None, *args, **kwargs):
+    policy = get_policy()
+    if kwargs.get("_request_timeout") is None:
+        kwargs["_request_timeout"] = policy.timeout
+    hedge = (
+        policy.hedge_after
+        and method.upper() == "GET"
+        and kwargs.get("_preload_content", True)
+    )
+    attempt = 0
+    while True:
+        try:
+            if hedge:
+                return _hedged(
+                    policy, _send_once, self, method, url, query_params, args, kwargs, attempt
+                )
+            return _send_once(self, method, url, query_params, args, kwargs, attempt)
+        except Exception as e:
+            if not policy.should_retry(method, attempt, e):
+                raise
+            delay = policy.delay(attempt, e)
+        time.sleep(delay)
+        attempt += 1
+
+
+def _cached_request(self, method, url, query_params=None, *args, **kwargs):
+    cache, cached_paths = _response_cache.get()
+    if (
+        cache is None
+        or method.upper() != "GET"
+        or not kwargs.get("_preload_content", True)
+        or not any(path in urlparse(url).path for path in cached_paths)
+    ):
+        return _send(self, method, url, query_params, *args, **kwargs)
+
+    import urllib3
+    from epiccore import rest
+
+    key = url
+    if query_params:
+        key += "?" + urlencode(query_params)
+    cached = cache.get(key)
+    if cached is not None:
+        return rest.RESTResponse(
+            urllib3.HTTPResponse(
+                body=cached.body.encode("utf-8"),
+                headers=cached.headers,
+                status=cached.status,
+                reason="OK",
+            )
+        )
+    response = _send(self, method, url, query_params, *args, **kwargs)
+    cache.put(
+        key,
+        response.status,
+        {"Content-Type": response.getheader("Content-Type", "application/json")},
+        response.data.decode("utf-8"),
+    )
+    return response
+
+
+def use_response_cache(cache, paths=("/catalog/",)):
+    """Answer GET requests made through epiccore for URLs whose path contains
+    one of paths from cache, a ResponseCache, or stop caching if cache is
+    None. This applies to requests made from the calling thread only.
+    share_connections must have been called."""
+    _response_cache.set((cache, tuple(paths)))
+
+
+def trace_requests(tracer):
+    """Record every request sent through epiccore in tracer, a Tracer, or
+    stop recording if tracer is None. share_connections must have been
+    called for requests to be recorded."""
+    global _tracer
+    _tracer = tracer
+
+
+def share_connections():
+    """Make every epiccore API client in this process share one urllib3 pool.
+
+    pyepic creates a new epiccore ApiClient, and with it a new connection
+    pool, for every request, so no connection is ever reused. Once this has
+    been called clients with the same connection settings share a pool and
+    keep their connections alive between requests. Failed requests are
+    retried following the current RetryPolicy, see epiccli.retry, and can be
+    answered from a cache, see use_response_cache.
+    """
+    global _original_init, _original_request
+    from epiccore import rest
+
+    with _lock:
+        if _original_init is None:
+            _original_init = rest.RESTClientObject.__init__
+            _original_request = rest.RESTClientObject.request
+            rest.RESTClientObject.__init__ = _shared_init
+            rest.RESTClientObject.request = _cached_request
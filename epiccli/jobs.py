@@ -0,0 +1,289 @@
+# BSD 3 - Clause License
+
+# Copyright(c) 2020, Zenotech
+# All rights reserved.
+
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+
+# 1. Redistributions of source code must retain the above copyright notice, this
+# list of conditions and the following disclaimer.
+
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and / or other materials provided with the distribution.
+
+# 3. Neither the name of the copyright holder nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES(INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+#         SERVICES
+#         LOSS OF USE, DATA, OR PROFITS
+#         OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT(INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import csv
+import datetime
+from concurrent.futures import ThreadPoolExecutor
+
+from .exceptions import CommandError
+from .pool import ordered_map
+
+
+PAGE_SIZE = 100
+
+
+def parse_time(value):
+    """Parse an ISO 8601 time from the API into an aware datetime, or
+    return None if it cannot be parsed"""
+    if isinstance(value, datetime.datetime):
+        parsed = value
+    else:
+        if not value:
+            return None
+        try:
+            parsed = datetime.datetime.fromisoformat(value.replace("Z", "+00:00"))
+        except ValueError:
+            return None
+    if parsed.tzinfo is None:
+        parsed = parsed.astimezone()
+    return parsed
+
+
+class JobFilter(object):
+    """Select jobs by status, application, submitter and submission time.
+
+    The jobs API cannot filter on any of these, so jobs are checked one at a
+    time as they are listed. Each condition is optional. Statuses, apps and
+    submitters are compared ignoring case, and an app matches if it
+    contains any of the given names. since and until are datetimes, naive
+    ones are taken to be local time.
+    """
+
+    def __init__(self, status=(), app=(), submitted_by=(), since=None, until=None):
+        self.status = {value.lower() for value in status}
+        self.app = [value.lower() for value in app]
+        self.submitted_by = {value.lower() for value in submitted_by}
+        self.since = parse_time(since)
+        self.until = parse_time(until)
+
+    def __bool__(self):
+        return bool(
+            self.status or self.app or self.submitted_by or self.since or self.until
+        )
+
+    def too_old(self, job):
+        """ True if job was submitted before since """
+        submitted = parse_time(job.submitted_at)
+        return self.since is not None and submitted is not None and submitted < self.since
+
+    def matches(self, job):
+        if self.status and (job.status or "").lower() not in self.status:
+            return False
+        if self.app and not any(app in (job.app or "").lower() for app in self.app):
+            return False
+        if self.submitted_by and (job.submitted_by or "").lower() not in self.submitted_by:
+            return False
+        if self.since is not None or self.until is not None:
+            submitted = parse_time(job.submitted_at)
+            if submitted is None:
+                return False
+            if self.since is not None and submitted < self.since:
+                return False
+            if self.until is not None and submitted > self.until:
+                return False
+        return True
+
+
+def iter_jobs(job_client, job_filter=None, limit=None, job_array=None):
+    """Yield up to limit jobs visible to job_client, a pyepic JobClient,
+    newest first, that job_filter selects, or all of them if limit is None.
+
+    Jobs are fetched a page at a time with the next page requested while the
+    current one is being yielded, so memory use stays constant and the first
+    jobs are available straight away. Listing stops early once a whole page
+    was submitted before job_filter.since.
+    """
+    import epiccore
+
+    if limit is not None and limit <= 0:
+        return
+    # Without a filter every job fetched is yielded, so only ask for as many as needed
+    page_size = PAGE_SIZE
+    if limit is not None and not job_filter:
+        page_size = min(limit, PAGE_SIZE)
+    extra = {} if job_array is None else {"job_array": str(job_array)}
+    with epiccore.ApiClient(job_client.configuration) as api_client, ThreadPoolExecutor(
+        max_workers=1
+    ) as executor:
+        instance = epiccore.JobApi(api_client)
+
+        def fetch(offset):
+            return instance.job_list(limit=page_size, offset=offset, **extra)
+
+        offset = 0
+        count = 0
+        page = executor.submit(fetch, offset)
+        while page is not None:
+            results = page.result()
+            offset += len(results.results)
+            page = None
+            if (
+                results.next is not None
+                and results.results
+                and (job_filter or limit is None or offset < limit)
+            ):
+                page = executor.submit(fetch, offset)
+            if job_filter and all(job_filter.too_old(job) for job in results.results):
+                if page is not None:
+                    page.cancel()
+                return
+            for job in results.results:
+                if not job_filter or job_filter.matches(job):
+                    yield job
+                    count += 1
+                    if count == limit:
+                        if page is not None:
+                            page.cancel()
+                        return
+
+
+# Keys accepted by filter_from_settings and the JobFilter argument they set
+FILTER_KEYS = {
+    "status": "status",
+    "app": "app",
+    "submitted-by": "submitted_by",
+    "submitted_by": "submitted_by",
+    "since": "since",
+    "until": "until",
+}
+
+
+def filter_from_settings(settings):
+    """Build a JobFilter from (key, value) pairs such as ("status", "running"),
+    keys other than since and until can be given more than once"""
+    kwargs = {}
+    for key, value in settings:
+        name = FILTER_KEYS.get(key.lower())
+        if name is None:
+            raise CommandError(
+                "Unknown filter {!r}, expected one of status, app, submitted-by, "
+                "since or until".format(key)
+            )
+        if name in ("since", "until"):
+            kwargs[name] = parse_time(value)
+            if kwargs[name] is None:
+                raise CommandError("{} must be a date or time, not {!r}".format(key, value))
+        else:
+            kwargs.setdefault(name, []).append(value)
+    return JobFilter(**kwargs)
+
+
+def parse_job_ids(values):
+    """Yield the job IDs in values, each of which is an ID or an inclusive
+    range such as 100-120"""
+    for value in values:
+        first, sep, last = value.strip().partition("-")
+        try:
+            if not sep:
+                yield int(first)
+                continue
+            first, last = int(first), int(last)
+        except ValueError:
+            raise CommandError("{!r} is not a job ID or range of IDs".format(value))
+        if last < first:
+            raise CommandError("Range {!r} is empty".format(value))
+        yield from range(first, last + 1)
+
+
+def read_job_ids(path):
+    """Read job IDs from path, one ID or range per line, or the job_id
+    column of a CSV file such as the results of job submit-batch"""
+    with open(path, newline="") as f:
+        lines = [line.strip() for line in f]
+    lines = [line for line in lines if line and not line.startswith("#")]
+    if lines and "," in lines[0]:
+        rows = csv.DictReader(lines)
+        if "job_id" not in (rows.fieldnames or []):
+            raise CommandError("{} has no job_id column".format(path))
+        return list(parse_job_ids(row["job_id"] for row in rows if row["job_id"]))
+    return list(parse_job_ids(lines))
+
+
+def map_jobs(func, job_ids, workers):
+    """Yield (job_id, func(job_id), error) for each of job_ids in order,
+    running up to workers calls at once. error is the exception func raised,
+    in which case the result is None."""
+
+    def call(job_id):
+        try:
+            return job_id, func(job_id), None
+        except Exception as e:
+            return job_id, None, e
+
+    return ordered_map(call, job_ids, workers=workers)
+
+
+def openfoam_job(
+    version,
+    name,
+    input_folder,
+    np=1,
+    cycles=0,
+    decompose=True,
+    solve=True,
+    reconstruct=True,
+    rs=1,
+    rd=1,
+    rr=1,
+):
+    """ Build a pyepic OpenFoamJob, the options are those of job create openfoam """
+    from pyepic.applications.openfoam import OpenFoamJob
+
+    job = OpenFoamJob(version, name, input_folder)
+
+    job.decomposePar.execute = decompose
+    job.decomposePar.runtime = rd
+
+    job.solver.execute = solve
+    job.solver.partitions = np
+    job.solver.runtime = rs
+    job.solver.endTime = cycles
+
+    job.reconstructPar.execute = reconstruct
+    job.reconstructPar.runtime = rr
+    return job
+
+
+def zcfd_job(
+    version, name, input_folder, np=1, r=1, cycles=1000, p=None, c=None, restart=False
+):
+    """ Build a pyepic ZCFDJob, the options are those of job create zcfd """
+    from pyepic.applications.zcfd import ZCFDJob
+
+    job = ZCFDJob(
+        version,
+        name,
+        input_folder,
+        c,
+        p,
+        cycles=cycles,
+        restart=restart,
+        partitions=np,
+    )
+    job.zcfd.runtime = r
+    return job
+
+
+JOB_BUILDERS = {
+    "openfoam": openfoam_job,
+    "zcfd": zcfd_job,
+}
@@ -0,0 +1,171 @@
+# BSD 3 - Clause License
+
+# Copyright(c) 2020, Zenotech
+# All rights reserved.
+
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+
+# 1. Redistributions of source code must retain the above copyright notice, this
+# list of conditions and the following disclaimer.
+
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and / or other materials provided with the distribution.
+
+# 3. Neither the name of the copyright holder nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES(INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+#         SERVICES
+#         LOSS OF USE, DATA, OR PROFITS
+#         OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT(INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import hashlib
+import json
+import os
+import threading
+from pathlib import Path
+
+
+TRANSFERS_DIR = os.path.join(Path.home(), ".epic", "transfers")
+
+
+class TransferJournal(object):
+    """On-disk checkpoint of a transfer so that it can be resumed.
+
+    The journal is an append-only file of JSON records, one per line, noting
+    every finished file and every finished part of a chunked upload or
+    download. Records are flushed as they are written so that the journal
+    survives the process being killed. A partially written last line is
+    ignored when the journal is loaded.
+    """
+
+    def __init__(self, path, resume=False):
+        self.path = path
+        self._lock = threading.Lock()
+        self._files = {}
+        self._uploads = {}
+        self._downloads = {}
+        if resume and os.path.isfile(path):
+            self._load()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._file = open(path, "a" if resume else "w")
+
+    @classmethod
+    def open_for(cls, kind, source, destination, resume=False):
+        """Open the journal for a kind ("upload", "download" or "sync") of
+        transfer between source and destination"""
+        name = "\0".join([kind, source, destination]).encode("utf-8")
+        filename = hashlib.sha1(name).hexdigest() + ".journal"
+        return cls(os.path.join(TRANSFERS_DIR, filename), resume=resume)
+
+    def _load(self):
+        with open(self.path) as journal:
+            for line in journal:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    break
+                self._apply(record)
+
+    def _apply(self, record):
+        if "file" in record:
+            self._files[record["file"]] = record["sig"]
+        elif "upload" in record:
+            self._uploads[record["upload"]] = {
+                "id": record["id"],
+                "sig": record["sig"],
+                "part_size": record["part_size"],
+                "parts": {},
+            }
+        elif "upload_part" in record:
+            upload = self._uploads.get(record["upload_part"])
+            if upload is not None:
+                upload["parts"][record["part"]] = record["etag"]
+        elif "download" in record:
+            self._downloads[record["download"]] = {
+                "sig": record["sig"],
+                "part_size": record["part_size"],
+                "parts": set(),
+            }
+        elif "download_part" in record:
+            download = self._downloads.get(record["download_part"])
+            if download is not None:
+                download["parts"].add(record["offset"])
+
+    def _write(self, record):
+        with self._lock:
+            self._apply(record)
+            self._file.write(json.dumps(record) + "\n")
+            self._file.flush()
+
+    def file_done(self, name, sig):
+        return self._files.get(name) == sig
+
+    def record_file(self, name, sig):
+        self._write({"file": name, "sig": sig})
+
+    def upload_state(self, key, sig, part_size):
+        """Return (upload_id, {part_number: etag}) for an unfinished multipart
+        upload of key, or (None, {}) if there is nothing to resume"""
+        upload = self._uploads.get(key)
+        if upload is None or upload["sig"] != sig or upload["part_size"] != part_size:
+            return None, {}
+        return upload["id"], dict(upload["parts"])
+
+    def start_upload(self, key, upload_id, sig, part_size):
+        self._write({"upload": key, "id": upload_id, "sig": sig, "part_size": part_size})
+
+    def record_upload_part(self, key, part_number, etag):
+        self._write({"upload_part": key, "part": part_number, "etag": etag})
+
+    def download_state(self, filename, sig, part_size):
+        """Return the set of part offsets already written for a download to
+        filename, or None if there is nothing to resume"""
+        download = self._downloads.get(filename)
+        if (
+            download is None
+            or download["sig"] != sig
+            or download["part_size"] != part_size
+        ):
+            return None
+        return set(download["parts"])
+
+    def start_download(self, filename, sig, part_size):
+        self._write({"download": filename, "sig": sig, "part_size": part_size})
+
+    def record_download_part(self, filename, offset):
+        self._write({"download_part": filename, "offset": offset})
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        # Keep the journal for a later --resume unless the transfer completed
+        if exc_type is None:
+            self.remove()
+        else:
+            self.close()
+
+    def close(self):
+        with self._lock:
+            if not self._file.closed:
+                self._file.close()
+
+    def remove(self):
+        """ Close and delete the journal once a transfer has completed """
+        self.close()
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
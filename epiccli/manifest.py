@@ -0,0 +1,173 @@
+# BSD 3 - Clause License
+
+# Copyright(c) 2020, Zenotech
+# All rights reserved.
+
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+
+# 1. Redistributions of source code must retain the above copyright notice, this
+# list of conditions and the following disclaimer.
+
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and / or other materials provided with the distribution.
+
+# 3. Neither the name of the copyright holder nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES(INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+#         SERVICES
+#         LOSS OF USE, DATA, OR PROFITS
+#         OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT(INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import hashlib
+import os
+import sqlite3
+from pathlib import Path
+
+
+MANIFESTS_DIR = os.path.join(Path.home(), ".epic", "manifests")
+
+# Number of updates to batch up before committing them to disk
+COMMIT_INTERVAL = 1000
+
+# Sorts after any path that starts with the same characters
+_PATH_END = "\U0010ffff"
+
+
+class ManifestEntry(object):
+    """ The state of a file when it was last known to be in sync """
+
+    __slots__ = ("size", "mtime", "etag")
+
+    def __init__(self, size, mtime, etag):
+        self.size = size
+        self.mtime = mtime
+        self.etag = etag
+
+
+class SyncManifest(object):
+    """Persistent index of the files a sync pair last agreed on.
+
+    Each row holds the path of a file relative to the sync folders, its size
+    and local modification time, and the ETag of the copy in EPIC. Later syncs
+    between the same pair of folders use it to skip files that have not
+    changed on either side without comparing them again. The index is stored
+    in an SQLite database under ~/.epic/manifests/, along with the pair of
+    folders it is for.
+    """
+
+    def __init__(self, path, rescan=False, pair=None):
+        self.path = path
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._db = sqlite3.connect(path, timeout=30)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            "path TEXT PRIMARY KEY, size INTEGER, mtime REAL, etag TEXT)"
+        )
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS pair (source TEXT, destination TEXT)"
+        )
+        if rescan:
+            self._db.execute("DELETE FROM entries")
+        if pair is not None:
+            self._db.execute("DELETE FROM pair")
+            self._db.execute("INSERT INTO pair (source, destination) VALUES (?, ?)", pair)
+        self._db.commit()
+        self.pair = self._db.execute("SELECT source, destination FROM pair").fetchone()
+        self._pending = 0
+        self.populated = (
+            self._db.execute("SELECT 1 FROM entries LIMIT 1").fetchone() is not None
+        )
+
+    @classmethod
+    def open_for(cls, source, destination, rescan=False):
+        """ Open the manifest for a sync from source to destination """
+        name = "\0".join([source, destination]).encode("utf-8")
+        filename = hashlib.sha1(name).hexdigest() + ".db"
+        return cls(
+            os.path.join(MANIFESTS_DIR, filename),
+            rescan=rescan,
+            pair=(source, destination),
+        )
+
+    def get(self, path):
+        row = self._db.execute(
+            "SELECT size, mtime, etag FROM entries WHERE path = ?", (path,)
+        ).fetchone()
+        if row is None:
+            return None
+        return ManifestEntry(*row)
+
+    def update(self, path, size, mtime, etag):
+        self._db.execute(
+            "INSERT OR REPLACE INTO entries (path, size, mtime, etag) VALUES (?, ?, ?, ?)",
+            (path, size, mtime, etag),
+        )
+        self._changed()
+
+    def remove(self, path):
+        self._db.execute("DELETE FROM entries WHERE path = ?", (path,))
+        self._changed()
+
+    def forget(self, locations):
+        """Remove the entries for the files at or below any of locations, as
+        passed to open_for, on either side of the sync"""
+        for side in self.pair or ():
+            for location in locations:
+                if side.startswith(location):
+                    self._db.execute("DELETE FROM entries")
+                    break
+                if location.startswith(side):
+                    path = location[len(side) :]
+                    self._db.execute(
+                        "DELETE FROM entries WHERE path >= ? AND path < ?",
+                        (path, path + _PATH_END),
+                    )
+        self.commit()
+
+    def _changed(self):
+        self._pending += 1
+        if self._pending >= COMMIT_INTERVAL:
+            self.commit()
+
+    def commit(self):
+        self._db.commit()
+        self._pending = 0
+
+    def close(self):
+        self.commit()
+        self._db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def forget_removed(locations, exclude=None):
+    """Remove the entries for files at or below any of locations, which were
+    deleted outside of a sync, from every manifest apart from the one at the
+    path exclude"""
+    if not os.path.isdir(MANIFESTS_DIR):
+        return
+    locations = list(locations)
+    for filename in sorted(os.listdir(MANIFESTS_DIR)):
+        path = os.path.join(MANIFESTS_DIR, filename)
+        if not filename.endswith(".db") or path == exclude:
+            continue
+        with SyncManifest(path) as manifest:
+            manifest.forget(locations)
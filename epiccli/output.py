@@ -0,0 +1,220 @@
+# BSD 3 - Clause License
+
+# Copyright(c) 2020, Zenotech
+# All rights reserved.
+
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+
+# 1. Redistributions of source code must retain the above copyright notice, this
+# list of conditions and the following disclaimer.
+
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and / or other materials provided with the distribution.
+
+# 3. Neither the name of the copyright holder nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES(INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+#         SERVICES
+#         LOSS OF USE, DATA, OR PROFITS
+#         OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT(INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import contextvars
+import csv
+import datetime
+import decimal
+import io
+import json
+import pprint
+
+import click
+
+
+TEXT = "text"
+JSON = "json"
+NDJSON = "ndjson"
+CSV = "csv"
+FORMATS = (TEXT, JSON, NDJSON, CSV)
+
+# Held per thread, so daemon requests asking for different formats can run
+# at the same time
+_format = contextvars.ContextVar("output_format", default=TEXT)
+
+
+def set_format(fmt):
+    """ Make fmt, one of FORMATS, the output format of this thread """
+    _format.set(fmt)
+
+
+def get_format():
+    return _format.get()
+
+
+def machine_readable():
+    """ True if output is meant for another program rather than a person """
+    return get_format() != TEXT
+
+
+def _json_default(value):
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+    if isinstance(value, decimal.Decimal):
+        return str(value)
+    to_dict = getattr(value, "to_dict", None)
+    if to_dict is not None:
+        return to_dict()
+    return str(value)
+
+
+def to_json(value, indent=None):
+    return json.dumps(value, default=_json_default, indent=indent)
+
+
+def _csv_value(value):
+    if value is None:
+        return ""
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+    if isinstance(value, (dict, list, tuple)) or hasattr(value, "to_dict"):
+        return to_json(value)
+    return value
+
+
+def _csv_line(values):
+    line = io.StringIO()
+    csv.writer(line).writerow([_csv_value(value) for value in values])
+    return line.getvalue()
+
+
+class Table(object):
+    """Write the rows of a table in the current output format as they are
+    produced, without holding on to them.
+
+    columns is a list of (name, heading) pairs. In text mode the title, the
+    headings and each row are printed separated by " | ", or header in place
+    of the headings if it is given and no heading line if it is False. json
+    writes an array of objects keyed by column name, ndjson one object per
+    line and csv a header line of column names followed by the rows. Use as
+    a context manager so the json array is closed.
+    """
+
+    def __init__(self, columns, title=None, header=None, fmt=None):
+        self.names = [name for name, _ in columns]
+        self.header = (
+            " | ".join(heading for _, heading in columns) if header is None else header
+        )
+        self.title = title
+        self.fmt = fmt or get_format()
+        self.rows = 0
+
+    @property
+    def text(self):
+        return self.fmt == TEXT
+
+    def __enter__(self):
+        if self.fmt == TEXT:
+            if self.title is not None:
+                click.echo(self.title)
+            if self.header:
+                click.echo(self.header)
+            click.echo("-" * len(self.header or self.title or ""))
+        elif self.fmt == JSON:
+            click.echo("[", nl=False)
+        elif self.fmt == CSV:
+            click.echo(_csv_line(self.names), nl=False)
+        return self
+
+    def row(self, *values, text=None):
+        """Write one row of values, in column order. text replaces the
+        whole line in text mode."""
+        if self.fmt == TEXT:
+            click.echo(text if text is not None else " | ".join(str(v) for v in values))
+        elif self.fmt == CSV:
+            click.echo(_csv_line(values), nl=False)
+        else:
+            record = to_json(dict(zip(self.names, values)))
+            if self.fmt == NDJSON:
+                click.echo(record)
+            else:
+                click.echo(("\n  " if self.rows == 0 else ",\n  ") + record, nl=False)
+        self.rows += 1
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if self.fmt == JSON:
+            click.echo("\n]" if self.rows else "]")
+
+
+def render(value):
+    """Write a single record, such as the details of a job, in the current
+    output format. Text mode pretty prints it."""
+    fmt = get_format()
+    if fmt == TEXT:
+        pprint.pprint(value)
+        return
+    record = json.loads(to_json(value))
+    if fmt == JSON:
+        click.echo(json.dumps(record, indent=2))
+    elif fmt == NDJSON:
+        click.echo(json.dumps(record))
+    elif isinstance(record, dict):
+        click.echo(_csv_line(record.keys()), nl=False)
+        click.echo(_csv_line(record.values()), nl=False)
+    else:
+        click.echo(_csv_line(record if isinstance(record, list) else [record]), nl=False)
+
+
+class Records(object):
+    """Write a series of records, such as the details of many jobs, in the
+    current output format as they are produced.
+
+    Text mode pretty prints each record after its title, json writes an
+    array, ndjson one record per line and csv a row per record with the
+    fields of the first record as the columns.
+    """
+
+    def __init__(self, fmt=None):
+        self.fmt = fmt or get_format()
+        self.fields = None
+        self.rows = 0
+
+    def __enter__(self):
+        if self.fmt == JSON:
+            click.echo("[", nl=False)
+        return self
+
+    def write(self, value, title=None):
+        if self.fmt == TEXT:
+            if title is not None:
+                click.echo(title)
+            pprint.pprint(value)
+            self.rows += 1
+            return
+        record = json.loads(to_json(value))
+        if self.fmt == NDJSON:
+            click.echo(json.dumps(record))
+        elif self.fmt == JSON:
+            text = json.dumps(record, indent=2).replace("\n", "\n  ")
+            click.echo(("\n  " if self.rows == 0 else ",\n  ") + text, nl=False)
+        else:
+            if not isinstance(record, dict):
+                record = {"value": record}
+            if self.fields is None:
+                self.fields = list(record)
+                click.echo(_csv_line(self.fields), nl=False)
+            click.echo(_csv_line(record.get(field) for field in self.fields), nl=False)
+        self.rows += 1
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if self.fmt == JSON:
+            click.echo("\n]" if self.rows else "]")
@@ -0,0 +1,170 @@
+# BSD 3 - Clause License
+
+# Copyright(c) 2020, Zenotech
+# All rights reserved.
+
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+
+# 1. Redistributions of source code must retain the above copyright notice, this
+# list of conditions and the following disclaimer.
+
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and / or other materials provided with the distribution.
+
+# 3. Neither the name of the copyright holder nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES(INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+#         SERVICES
+#         LOSS OF USE, DATA, OR PROFITS
+#         OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT(INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import random
+
+
+DEFAULT_RETRIES = 3
+DEFAULT_BACKOFF = 0.5
+DEFAULT_MAX_BACKOFF = 20.0
+DEFAULT_CONNECT_TIMEOUT = 10.0
+DEFAULT_READ_TIMEOUT = 120.0
+
+# Methods that have the same effect however many times they are sent
+IDEMPOTENT_METHODS = frozenset(("GET", "HEAD", "OPTIONS", "PUT", "DELETE"))
+
+# Statuses meaning the server did not act on the request, so any request
+# can be sent again
+NOT_PROCESSED_STATUSES = (429, 503)
+
+# Statuses after which an idempotent request is worth sending again
+RETRY_STATUSES = (500, 502, 504) + NOT_PROCESSED_STATUSES
+
+
+def _connection_error(error):
+    """Return "connect" if error means a connection could not be made, so
+    the request was never sent, "read" if the request may have been sent but
+    no complete response arrived, or None for any other error"""
+    import urllib3
+
+    exceptions = urllib3.exceptions
+    if isinstance(error, exceptions.MaxRetryError) and error.reason is not None:
+        error = error.reason
+    if isinstance(error, (exceptions.NewConnectionError, exceptions.ConnectTimeoutError)):
+        return "connect"
+    if isinstance(error, (exceptions.ReadTimeoutError, exceptions.ProtocolError)):
+        return "read"
+    return None
+
+
+def _retry_after(error):
+    headers = getattr(error, "headers", None)
+    value = headers.get("Retry-After") if headers is not None else None
+    try:
+        return max(float(value), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+class RetryPolicy(object):
+    """How failed requests to EPIC and the data store are retried.
+
+    A request is retried up to retries times, after a random delay of up to
+    backoff * 2 ** attempt seconds, capped at max_backoff, or as long as the
+    server asks for in Retry-After. Requests the server turned away or that
+    never reached it are always retried. Requests that may have been acted on
+    are only retried if sending them twice is harmless, so a job is never
+    submitted twice. If hedge_after is set, a GET with no response after that
+    many seconds is sent a second time and the first response used.
+    """
+
+    def __init__(
+        self,
+        retries=DEFAULT_RETRIES,
+        backoff=DEFAULT_BACKOFF,
+        max_backoff=DEFAULT_MAX_BACKOFF,
+        hedge_after=None,
+        connect_timeout=DEFAULT_CONNECT_TIMEOUT,
+        read_timeout=DEFAULT_READ_TIMEOUT,
+    ):
+        self.retries = max(int(retries), 0)
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.hedge_after = hedge_after or None
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+
+    @classmethod
+    def from_config(cls, config):
+        """ The policy set by the retry settings of an EpicConfig """
+        settings = {
+            "retries": config.RETRIES,
+            "backoff": config.RETRY_BACKOFF,
+            "max_backoff": config.RETRY_MAX_BACKOFF,
+            "hedge_after": config.HEDGE_AFTER,
+            "connect_timeout": config.CONNECT_TIMEOUT,
+            "read_timeout": config.READ_TIMEOUT,
+        }
+        return cls(**{key: value for key, value in settings.items() if value is not None})
+
+    @property
+    def timeout(self):
+        """ (connect, read) timeout in seconds for urllib3 """
+        return (self.connect_timeout, self.read_timeout)
+
+    def retryable(self, method, error):
+        """ True if a request with method that failed with error may be sent again """
+        idempotent = method.upper() in IDEMPOTENT_METHODS
+        status = getattr(error, "status", None)
+        if status:
+            return status in NOT_PROCESSED_STATUSES or (
+                idempotent and status in RETRY_STATUSES
+            )
+        failure = _connection_error(error)
+        return failure == "connect" or (failure == "read" and idempotent)
+
+    def should_retry(self, method, attempt, error):
+        """ True if attempt, counting from 0, should be followed by another """
+        return attempt < self.retries and self.retryable(method, error)
+
+    def delay(self, attempt, error=None):
+        """ Seconds to wait before retrying after attempt failed with error """
+        delay = random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+        retry_after = _retry_after(error)
+        if retry_after is not None:
+            delay = max(delay, min(retry_after, self.max_backoff))
+        return delay
+
+    def boto_config(self):
+        """Keyword arguments for a botocore Config applying this policy to S3.
+
+        botocore retries with the same exponential backoff and jitter, only
+        for errors that are safe to retry.
+        """
+        return {
+            "retries": {"mode": "standard", "total_max_attempts": self.retries + 1},
+            "connect_timeout": self.connect_timeout,
+            "read_timeout": self.read_timeout,
+        }
+
+
+_policy = RetryPolicy()
+
+
+def set_policy(policy):
+    """ Make policy the RetryPolicy for every request made from now on """
+    global _policy
+    _policy = policy
+
+
+def get_policy():
+    return _policy
@@ -0,0 +1,148 @@
+# BSD 3 - Clause License
+
+# Copyright(c) 2020, Zenotech
+# All rights reserved.
+
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+
+# 1. Redistributions of source code must retain the above copyright notice, this
+# list of conditions and the following disclaimer.
+
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and / or other materials provided with the distribution.
+
+# 3. Neither the name of the copyright holder nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES(INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+#         SERVICES
+#         LOSS OF USE, DATA, OR PROFITS
+#         OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT(INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import shlex
+import sys
+import time
+
+import click
+
+
+PROMPT = "epic> "
+
+# Commands that cannot be run from inside a shell or batch
+NOT_NESTED = ("shell", "batch")
+
+
+def run_command(ctx, args):
+    """Run one command line, without the program name, inside this process.
+
+    The command runs as a sub command of the root context, so it shares the
+    loaded configuration, EPIC client and connection pool with every other
+    command run this way. Returns the exit status of the command.
+    """
+    root = ctx.find_root()
+    group = root.command
+    try:
+        cmd_name, cmd, cmd_args = group.resolve_command(root, args)
+        if cmd_name in NOT_NESTED:
+            raise click.UsageError(f"'{cmd_name}' cannot be run from a shell or batch")
+        with cmd.make_context(cmd_name, cmd_args, parent=root) as sub_ctx:
+            cmd.invoke(sub_ctx)
+    except click.exceptions.Exit as e:
+        return e.exit_code
+    except click.ClickException as e:
+        e.show()
+        return e.exit_code
+    except click.Abort:
+        click.echo("Aborted!", err=True)
+        return 1
+    except SystemExit as e:
+        if e.code is None:
+            return 0
+        return e.code if isinstance(e.code, int) else 1
+    return 0
+
+
+def run_shell(ctx):
+    """ Read and run commands interactively until end of file or "exit" """
+    try:
+        # Gives the prompt line editing and history where it is available
+        import readline  # noqa: F401
+    except ImportError:
+        pass
+    click.echo('EPIC shell, type "help" for a list of commands and "exit" to leave')
+    while True:
+        try:
+            line = input(PROMPT)
+        except EOFError:
+            click.echo("")
+            break
+        except KeyboardInterrupt:
+            click.echo("")
+            continue
+        try:
+            args = shlex.split(line, comments=True)
+        except ValueError as e:
+            click.echo("Error: {}".format(e))
+            continue
+        if not args:
+            continue
+        if args[0] in ("exit", "quit"):
+            break
+        if args[0] == "help":
+            args = args[1:] + ["--help"] if len(args) > 1 else []
+            if not args:
+                click.echo(ctx.find_root().get_help())
+                continue
+        try:
+            run_command(ctx, args)
+        except KeyboardInterrupt:
+            click.echo("")
+
+
+def run_batch(ctx, lines, stop_on_error=False, echo=False):
+    """Run each command line in lines, skipping blank lines and comments.
+
+    Returns the number of commands that failed.
+    """
+    commands = 0
+    failed = 0
+    started = time.monotonic()
+    for number, line in enumerate(lines, 1):
+        try:
+            args = shlex.split(line, comments=True)
+        except ValueError as e:
+            click.echo("Error on line {}: {}".format(number, e))
+            failed += 1
+            if stop_on_error:
+                break
+            continue
+        if not args:
+            continue
+        if echo:
+            click.echo(PROMPT + " ".join(shlex.quote(arg) for arg in args))
+        commands += 1
+        status = run_command(ctx, args)
+        if status:
+            failed += 1
+            click.echo("Command on line {} failed with status {}".format(number, status))
+            if stop_on_error:
+                break
+        sys.stdout.flush()
+    click.echo(
+        "Ran {} commands in {:.2f}s, {} failed".format(
+            commands, time.monotonic() - started, failed
+        ),
+        err=True,
+    )
+    return failed
@@ -0,0 +1,340 @@
+# BSD 3 - Clause License
+
+# Copyright(c) 2020, Zenotech
+# All rights reserved.
+
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+
+# 1. Redistributions of source code must retain the above copyright notice, this
+# list of conditions and the following disclaimer.
+
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and / or other materials provided with the distribution.
+
+# 3. Neither the name of the copyright holder nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES(INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+#         SERVICES
+#         LOSS OF USE, DATA, OR PROFITS
+#         OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT(INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import heapq
+import os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from .throttle import BandwidthLimiter
+from .retry import get_policy
+from .trace import active as active_tracer
+
+
+DEFAULT_MAX_CONNECTIONS = 10
+
+
+class StorageObject(object):
+    """ A single object in the EPIC data store """
+
+    __slots__ = ("key", "size", "last_modified", "etag")
+
+    def __init__(self, key, size, last_modified, etag=None):
+        self.key = key
+        self.size = size
+        self.last_modified = last_modified
+        self.etag = etag
+
+    @property
+    def folder(self):
+        return self.key.endswith("/")
+
+
+class Storage(object):
+    """Direct access to the S3 bucket and prefix that back an EPIC data store.
+
+    The bulk data commands talk to S3 through this class rather than through
+    the pyepic DataClient so that they can share one client and connection
+    pool between many worker threads. Any boto3 S3 client can be supplied,
+    which makes it possible to run the transfer code against a local S3
+    stand-in.
+    """
+
+    def __init__(self, s3_client, bucket, prefix, meta_data=None):
+        self.s3_client = s3_client
+        self.bucket = bucket
+        self.prefix = prefix
+        self.meta_data = meta_data if meta_data is not None else {}
+
+    def epic_path_to_key(self, epic_path):
+        if not epic_path.startswith("epic://"):
+            raise ValueError("Path specification must start with epic://")
+        return self.prefix + epic_path[len("epic://") :]
+
+    def key_to_epic_path(self, key):
+        return "epic://" + key[len(self.prefix) :]
+
+    def stat(self, key):
+        """ Return the StorageObject for key, or None if it does not exist """
+        from botocore.exceptions import ClientError
+
+        try:
+            head = self.s3_client.head_object(Bucket=self.bucket, Key=key)
+        except ClientError as error:
+            if error.response["Error"]["Code"] in ("404", "NoSuchKey"):
+                return None
+            raise
+        return StorageObject(
+            key,
+            head["ContentLength"],
+            head["LastModified"].timestamp(),
+            head.get("ETag"),
+        )
+
+    def list_objects(self, key_prefix, page_size=1000):
+        """Yield a StorageObject for every key below key_prefix, one page at a time"""
+        paginator = self.s3_client.get_paginator("list_objects_v2")
+        pages = paginator.paginate(
+            Bucket=self.bucket,
+            Prefix=key_prefix,
+            PaginationConfig={"PageSize": page_size},
+        )
+        for page in pages:
+            for item in page.get("Contents", []):
+                yield StorageObject(
+                    item["Key"],
+                    item["Size"],
+                    item["LastModified"].timestamp(),
+                    item.get("ETag"),
+                )
+
+    def _list_level(self, key_prefix, page_size=1000):
+        """ Return the objects and the sub folder prefixes directly in key_prefix """
+        paginator = self.s3_client.get_paginator("list_objects_v2")
+        pages = paginator.paginate(
+            Bucket=self.bucket,
+            Prefix=key_prefix,
+            Delimiter="/",
+            PaginationConfig={"PageSize": page_size},
+        )
+        objects = []
+        folders = []
+        for page in pages:
+            folders.extend(item["Prefix"] for item in page.get("CommonPrefixes", []))
+            objects.extend(
+                StorageObject(
+                    item["Key"],
+                    item["Size"],
+                    item["LastModified"].timestamp(),
+                    item.get("ETag"),
+                )
+                for item in page.get("Contents", [])
+            )
+        return objects, folders
+
+    def _filtered_level(self, key_prefix, prefix, path_filter, page_size):
+        """Return the objects directly in prefix that path_filter selects and
+        the sub folders it does not prune, for a walk of key_prefix"""
+        objects, folders = self._list_level(prefix, page_size)
+        objects = [
+            obj for obj in objects if path_filter.matches(obj.key[len(key_prefix) :])
+        ]
+        folders = [
+            folder
+            for folder in folders
+            if not path_filter.prune(folder[len(key_prefix) : -1])
+        ]
+        return objects, folders
+
+    def walk(self, key_prefix, path_filter=None, workers=1, page_size=1000):
+        """Yield a StorageObject for every key below key_prefix that
+        path_filter selects.
+
+        Without a filter, or with one that can never prune a folder, this is a
+        flat listing. Otherwise the tree is listed one folder at a time with up
+        to workers folders in flight, and folders the filter prunes are never
+        listed. With one worker the tree is walked depth first in key order,
+        otherwise objects are yielded in the order folders finish listing.
+        """
+        if not path_filter or not path_filter.can_prune:
+            objects = self.list_objects(key_prefix, page_size=page_size)
+            if not path_filter:
+                return objects
+            return (
+                obj
+                for obj in objects
+                if path_filter.matches(obj.key[len(key_prefix) :])
+            )
+        return self._walk_tree(key_prefix, path_filter, workers, page_size)
+
+    def _walk_tree(self, key_prefix, path_filter, workers, page_size):
+        def visit(prefix):
+            return self._filtered_level(key_prefix, prefix, path_filter, page_size)
+
+        if workers <= 1:
+            stack = [key_prefix]
+            while stack:
+                objects, folders = visit(stack.pop())
+                for obj in objects:
+                    yield obj
+                stack.extend(reversed(folders))
+            return
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            pending = {executor.submit(visit, key_prefix)}
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    objects, folders = future.result()
+                    for folder in folders:
+                        pending.add(executor.submit(visit, folder))
+                    for obj in objects:
+                        yield obj
+
+    def walk_sorted(self, key_prefix, path_filter=None, workers=1, page_size=1000):
+        """Yield a StorageObject for every key below key_prefix that
+        path_filter selects, in key order.
+
+        This is the order S3 lists keys in, so without a filter that can
+        prune it is a flat listing, as for walk. Otherwise folders are listed
+        one at a time in order, with up to workers of the next sub folders
+        listed ahead, so only the listings of the folders on the way down to
+        the current one are held in memory.
+        """
+        if not path_filter or not path_filter.can_prune:
+            return self.walk(key_prefix, path_filter, page_size=page_size)
+        return self._walk_tree_sorted(key_prefix, path_filter, workers, page_size)
+
+    def _walk_tree_sorted(self, key_prefix, path_filter, workers, page_size):
+        def visit(prefix):
+            return self._filtered_level(key_prefix, prefix, path_filter, page_size)
+
+        def walk_folder(listing):
+            objects, folders = listing.result()
+            ahead = deque()
+            next_folder = iter(folders)
+            # A key inside a folder sorts after the folder's prefix and
+            # before anything that sorts after the prefix, so the objects
+            # and folders of a level can be merged by key and prefix
+            entries = heapq.merge(
+                ((obj.key, obj) for obj in objects),
+                ((folder, None) for folder in folders),
+                key=lambda entry: entry[0],
+            )
+            for _, obj in entries:
+                if obj is not None:
+                    yield obj
+                    continue
+                while len(ahead) < max(workers, 1):
+                    folder = next(next_folder, None)
+                    if folder is None:
+                        break
+                    ahead.append(executor.submit(visit, folder))
+                yield from walk_folder(ahead.popleft())
+
+        with ThreadPoolExecutor(max_workers=max(workers, 1)) as executor:
+            yield from walk_folder(executor.submit(visit, key_prefix))
+
+    def list_folder(self, key_prefix, recursive=False, page_size=1000):
+        """Yield a StorageObject for each entry in the folder key_prefix.
+
+        Entries are yielded as each page of results arrives, so memory use
+        does not grow with the size of the folder. Unless recursive is set
+        only the immediate children are listed, with sub folders yielded as
+        objects whose key ends in "/" and that have no size.
+        """
+        paginator = self.s3_client.get_paginator("list_objects_v2")
+        args = {
+            "Bucket": self.bucket,
+            "Prefix": key_prefix,
+            "PaginationConfig": {"PageSize": page_size},
+        }
+        if not recursive:
+            args["Delimiter"] = "/"
+        first_page = True
+        for page in paginator.paginate(**args):
+            if first_page and page["KeyCount"] == 0:
+                raise ValueError("Path not found")
+            first_page = False
+            for item in page.get("CommonPrefixes", []):
+                yield StorageObject(item["Prefix"], None, None)
+            for item in page.get("Contents", []):
+                if item["Key"] == key_prefix:
+                    continue
+                yield StorageObject(
+                    item["Key"],
+                    item["Size"],
+                    item["LastModified"].timestamp(),
+                    item.get("ETag"),
+                )
+
+
+def connect_storage(
+    data_client, max_connections=DEFAULT_MAX_CONNECTIONS, max_bandwidth=None
+):
+    """Create a Storage for the EPIC account behind data_client.
+
+    The S3 client is built from the same refreshable session credentials that
+    pyepic uses, but with a connection pool large enough for max_connections
+    concurrent requests. The client is also handed back to data_client so
+    that pyepic calls made later in the same command reuse it. Set
+    EPIC_S3_ENDPOINT_URL to point the client at an alternative S3 endpoint.
+
+    If max_bandwidth is given, in bytes per second, every upload and download
+    made through the client shares a single BandwidthLimiter.
+    Failed requests are retried following the current RetryPolicy, and
+    requests are recorded by the active Tracer, if there is one.
+    """
+    # boto3 is slow to import, so only load it for commands that need it
+    import boto3
+    from botocore.config import Config
+    from botocore.credentials import RefreshableCredentials
+    from botocore.session import get_session
+
+    session_details = data_client._refresh_credentials()
+    session_credentials = RefreshableCredentials.create_from_metadata(
+        metadata=session_details,
+        refresh_using=data_client._refresh_credentials,
+        method="sts-assume-role",
+    )
+    session = get_session()
+    session._credentials = session_credentials
+    session.set_config_variable("region", session_details["region"])
+    s3_client = boto3.Session(botocore_session=session).client(
+        "s3",
+        endpoint_url=os.environ.get("EPIC_S3_ENDPOINT_URL"),
+        config=Config(
+            max_pool_connections=max(max_connections, 1), **get_policy().boto_config()
+        ),
+    )
+    if max_bandwidth:
+        BandwidthLimiter(max_bandwidth).attach(s3_client)
+    tracer = active_tracer()
+    if tracer is not None:
+        tracer.attach(s3_client)
+    profile_details = data_client._fetch_profile_details_from_epic()
+    meta_data = {
+        "Source": data_client.meta_source,
+        "User-Profile": str(profile_details.id),
+    }
+
+    data_client._s3_client = s3_client
+    data_client._s3_prefix = session_details["s3_obj_key"]
+    data_client._s3_bucket = session_details["s3_location"]
+    data_client._meta_data = meta_data
+
+    return Storage(
+        s3_client,
+        session_details["s3_location"],
+        session_details["s3_obj_key"],
+        meta_data=meta_data,
+    )
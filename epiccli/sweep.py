@@ -0,0 +1,291 @@
+# BSD 3 - Clause License
+
+# Copyright(c) 2020, Zenotech
+# All rights reserved.
+
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+
+# 1. Redistributions of source code must retain the above copyright notice, this
+# list of conditions and the following disclaimer.
+
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and / or other materials provided with the distribution.
+
+# 3. Neither the name of the copyright holder nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES(INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+#         SERVICES
+#         LOSS OF USE, DATA, OR PROFITS
+#         OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT(INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import csv
+import inspect
+import itertools
+import os
+import threading
+
+from .exceptions import CommandError
+from .jobs import JOB_BUILDERS
+from .pool import ordered_map
+from .throttle import RateLimiter
+
+
+DEFAULT_RATE = 5.0
+
+# Settings of every variant, the rest of the keys in a manifest are options
+# of the application or parameters for the templates
+FIELDS = ("app", "version", "queue", "name", "input")
+
+SUBMITTED = "submitted"
+SKIPPED = "skipped"
+FAILED = "failed"
+DRYRUN = "dryrun"
+
+_TRUE = ("1", "true", "yes", "on")
+_FALSE = ("0", "false", "no", "off")
+
+
+def app_options(app):
+    """ The options of app and their defaults """
+    parameters = inspect.signature(JOB_BUILDERS[app]).parameters.values()
+    return {p.name: p.default for p in parameters if p.default is not p.empty}
+
+
+def _coerce(name, value, default):
+    """ Convert value, which may have been read from CSV, to the type of default """
+    if not isinstance(value, str) or default is None or isinstance(default, str):
+        return value
+    text = value.strip().lower()
+    if isinstance(default, bool):
+        if text in _TRUE:
+            return True
+        if text in _FALSE:
+            return False
+        raise CommandError("Option {} must be true or false, not {!r}".format(name, value))
+    try:
+        return type(default)(text)
+    except ValueError:
+        raise CommandError(
+            "Option {} must be a {}, not {!r}".format(name, type(default).__name__, value)
+        )
+
+
+class Variant(object):
+    """ One job of a sweep """
+
+    def __init__(self, settings):
+        params = {key: value for key, value in settings.items() if value is not None}
+        try:
+            settings = {
+                key: value.format(**params) if isinstance(value, str) else value
+                for key, value in settings.items()
+            }
+        except (KeyError, IndexError, ValueError) as e:
+            raise CommandError("Cannot fill in template, unknown parameter {}".format(e))
+        missing = [field for field in FIELDS if not settings.get(field)]
+        if missing:
+            raise CommandError(
+                "Variant {} has no {}".format(settings.get("name", params), ", ".join(missing))
+            )
+        self.app = str(settings["app"]).lower()
+        if self.app not in JOB_BUILDERS:
+            raise CommandError(
+                "Unknown app {!r}, expected one of {}".format(
+                    self.app, ", ".join(JOB_BUILDERS)
+                )
+            )
+        self.version = str(settings["version"])
+        self.queue = str(settings["queue"])
+        self.name = str(settings["name"])
+        self.input = str(settings["input"])
+        self.options = {
+            name: _coerce(name, settings[name], default)
+            for name, default in app_options(self.app).items()
+            if name in settings
+        }
+
+    def job_spec(self):
+        job = JOB_BUILDERS[self.app](self.version, self.name, self.input, **self.options)
+        return job.get_job_create_spec(self.queue)
+
+
+def _expand(base, matrix, variants):
+    """Yield the settings of each variant, base updated with each combination
+    of the values in matrix and then each of variants"""
+    names = [name for name in matrix]
+    values = [v if isinstance(v, (list, tuple)) else [v] for v in matrix.values()]
+    combinations = [dict(zip(names, combo)) for combo in itertools.product(*values)]
+    if not variants:
+        variants = [{}]
+    for combination in combinations:
+        for variant in variants:
+            settings = dict(base)
+            settings.update(combination)
+            settings.update(variant)
+            yield settings
+
+
+def _load_yaml(path, overrides):
+    try:
+        import yaml
+    except ImportError:
+        raise CommandError(
+            "Reading YAML manifests needs PyYAML, install it with pip install epiccli[yaml]"
+        )
+    with open(path) as f:
+        manifest = yaml.safe_load(f) or {}
+    if not isinstance(manifest, dict):
+        raise CommandError("{} should contain a mapping of settings".format(path))
+    base = dict(manifest)
+    matrix = base.pop("matrix", None) or {}
+    variants = base.pop("variants", None) or []
+    base.update(base.pop("options", None) or {})
+    base.update(overrides)
+    if not isinstance(matrix, dict) or not isinstance(variants, list):
+        raise CommandError(
+            "matrix should be a mapping of lists and variants a list of mappings"
+        )
+    return _expand(base, matrix, variants)
+
+
+def _load_csv(path, overrides):
+    with open(path, newline="") as f:
+        for row in csv.DictReader(f):
+            settings = dict(overrides)
+            settings.update((key.strip(), value) for key, value in row.items() if key)
+            yield settings
+
+
+def load_manifest(path, overrides=None):
+    """Read the variants of a sweep from a YAML or CSV manifest.
+
+    In YAML the top level keys are the settings shared by every variant:
+    app, version, queue, name, input and any application options, which can
+    also be given under options. Each combination of the values listed under
+    matrix, and each entry of variants, is one variant. In CSV each row is a
+    variant with the settings as columns. String settings are templates
+    filled in from the settings of the variant, such as name: "run-{np}".
+    overrides replace the top level settings and are the defaults for the
+    columns of a CSV manifest.
+    """
+    overrides = overrides or {}
+    if os.path.splitext(path)[1].lower() in (".yaml", ".yml"):
+        settings = _load_yaml(path, overrides)
+    else:
+        settings = _load_csv(path, overrides)
+    variants = [Variant(s) for s in settings]
+    seen = set()
+    for variant in variants:
+        if variant.name in seen:
+            raise CommandError(
+                "More than one variant is called {}, add a parameter to the name "
+                "template".format(variant.name)
+            )
+        seen.add(variant.name)
+    return variants
+
+
+def results_path(manifest_path):
+    """ The default results file for manifest_path """
+    return os.path.splitext(manifest_path)[0] + ".results.csv"
+
+
+class SweepResults(object):
+    """The jobs submitted for a sweep, kept in a CSV file next to the manifest.
+
+    Each result is appended and flushed as soon as it is known, so a sweep
+    that is interrupted can be run again and only the variants without a job
+    are submitted.
+    """
+
+    COLUMNS = ("name", "job_id", "status", "error")
+
+    def __init__(self, path):
+        self.path = path
+        self.rows = {}
+        self._lock = threading.Lock()
+        if os.path.exists(path):
+            with open(path, newline="") as f:
+                for row in csv.DictReader(f):
+                    self.rows[row["name"]] = row
+
+    def job_id(self, name):
+        """ The ID of the job already submitted for name, if any """
+        row = self.rows.get(name)
+        if row is not None and row.get("job_id"):
+            return row["job_id"]
+        return None
+
+    def record(self, name, job_id, status, error=""):
+        row = {"name": name, "job_id": job_id or "", "status": status, "error": error}
+        with self._lock:
+            self.rows[name] = row
+            new = not os.path.exists(self.path)
+            with open(self.path, "a", newline="") as f:
+                writer = csv.DictWriter(f, self.COLUMNS)
+                if new:
+                    writer.writeheader()
+                writer.writerow(row)
+
+    def compact(self, names):
+        """ Rewrite the file with one row for each of names, in that order """
+        with self._lock:
+            partial = self.path + ".partial"
+            with open(partial, "w", newline="") as f:
+                writer = csv.DictWriter(f, self.COLUMNS)
+                writer.writeheader()
+                for name in names:
+                    if name in self.rows:
+                        writer.writerow(self.rows[name])
+            os.replace(partial, self.path)
+
+
+class SweepSubmitter(object):
+    """Submit the variants of a sweep on a pool of threads.
+
+    Submissions are started at no more than rate per second across all
+    threads. Those EPIC turned away are retried by the RetryPolicy, which
+    never resends a submission that may have been accepted. Variants with a
+    job in results are skipped.
+    """
+
+    def __init__(self, job_client, results, workers=8, rate=DEFAULT_RATE):
+        self.job_client = job_client
+        self.results = results
+        self.workers = workers
+        self.limiter = RateLimiter(rate) if rate else None
+
+    def _submit(self, variant):
+        spec = variant.job_spec()
+        if self.limiter is not None:
+            self.limiter.wait()
+        return str(self.job_client.submit(spec)[0].id)
+
+    def _run(self, variant):
+        job_id = self.results.job_id(variant.name)
+        if job_id is not None:
+            return variant, job_id, SKIPPED, ""
+        try:
+            job_id = self._submit(variant)
+        except Exception as e:
+            self.results.record(variant.name, None, FAILED, str(e))
+            return variant, None, FAILED, str(e)
+        self.results.record(variant.name, job_id, SUBMITTED)
+        return variant, job_id, SUBMITTED, ""
+
+    def submit(self, variants):
+        """Yield (variant, job_id, status, error) for each of variants, in
+        order, as they are submitted"""
+        return ordered_map(self._run, variants, workers=self.workers)
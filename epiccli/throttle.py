@@ -0,0 +1,147 @@
+# BSD 3 - Clause License
+
+# Copyright(c) 2020, Zenotech
+# All rights reserved.
+
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+
+# 1. Redistributions of source code must retain the above copyright notice, this
+# list of conditions and the following disclaimer.
+
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and / or other materials provided with the distribution.
+
+# 3. Neither the name of the copyright holder nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES(INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+#         SERVICES
+#         LOSS OF USE, DATA, OR PROFITS
+#         OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT(INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import io
+import threading
+import time
+
+
+# Bandwidth is handed out in quanta of this many bytes, so that a thread
+# sending a large file has to queue again behind other threads after every
+# quantum instead of holding the link for a whole part
+DEFAULT_QUANTUM = 64 * 1024
+
+# How long the limiter may fall behind its rate before the unused bandwidth
+# is forgotten, which bounds the burst after an idle period
+DEFAULT_BURST = 0.25
+
+
+class BandwidthLimiter(object):
+    """A token bucket shared by every thread of a transfer.
+
+    consume(n) blocks until n bytes may be sent or received at the configured
+    rate. Requests are split into quanta that are granted in the order they
+    are asked for, so concurrent transfers share the bandwidth evenly and a
+    small file is never stuck behind the whole of a large one.
+    """
+
+    def __init__(self, rate, quantum=DEFAULT_QUANTUM, burst=DEFAULT_BURST):
+        if rate <= 0:
+            raise ValueError("Bandwidth limit must be greater than zero")
+        self.rate = float(rate)
+        self.quantum = max(int(quantum), 1)
+        self.burst = burst
+        self._lock = threading.Lock()
+        self._next = time.monotonic()
+
+    def consume(self, nbytes):
+        while nbytes > 0:
+            amount = min(nbytes, self.quantum)
+            nbytes -= amount
+            with self._lock:
+                now = time.monotonic()
+                start = max(self._next, now - self.burst)
+                self._next = start + amount / self.rate
+            if start > now:
+                time.sleep(start - now)
+
+    def attach(self, s3_client):
+        """Limit the request bodies sent and the response bodies read through
+        s3_client, which may be shared with other threads"""
+        events = s3_client.meta.events
+        for operation in ("PutObject", "UploadPart"):
+            events.register(
+                "before-send.s3.{}".format(operation), self._throttle_request
+            )
+        events.register("after-call.s3.GetObject", self._throttle_response)
+
+    def _throttle_request(self, request, **kwargs):
+        # Wrap the body only once it is about to be sent, botocore reads it
+        # beforehand to calculate checksums
+        body = request.body
+        if body is None or isinstance(body, _ThrottledBody):
+            return
+        if isinstance(body, (bytes, bytearray)):
+            if not body:
+                return
+            body = io.BytesIO(body)
+        elif isinstance(body, str):
+            body = io.BytesIO(body.encode("utf-8"))
+        request.body = _ThrottledBody(body, self)
+
+    def _throttle_response(self, parsed, **kwargs):
+        body = parsed.get("Body")
+        if body is not None and not isinstance(body, _ThrottledBody):
+            parsed["Body"] = _ThrottledBody(body, self)
+
+
+class RateLimiter(object):
+    """Limit how many times a second something is started, across threads.
+
+    wait() blocks until the next start is allowed. Starts are spaced evenly
+    at 1 / rate seconds apart in the order wait is called, and time spent
+    idle is not saved up, so there is never a burst.
+    """
+
+    def __init__(self, rate):
+        if rate <= 0:
+            raise ValueError("Rate limit must be greater than zero")
+        self.interval = 1.0 / rate
+        self._lock = threading.Lock()
+        self._next = time.monotonic()
+
+    def wait(self):
+        with self._lock:
+            now = time.monotonic()
+            start = max(self._next, now)
+            self._next = start + self.interval
+        if start > now:
+            time.sleep(start - now)
+
+
+class _ThrottledBody(object):
+    """ File like wrapper that passes the bytes read through a BandwidthLimiter """
+
+    def __init__(self, stream, limiter):
+        self._stream = stream
+        self._limiter = limiter
+
+    def read(self, *args, **kwargs):
+        data = self._stream.read(*args, **kwargs)
+        self._limiter.consume(len(data))
+        return data
+
+    def __iter__(self):
+        return iter(lambda: self.read(DEFAULT_QUANTUM), b"")
+
+    def __getattr__(self, name):
+        return getattr(self._stream, name)
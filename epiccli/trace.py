@@ -0,0 +1,286 @@
+# BSD 3 - Clause License
+
+# Copyright(c) 2020, Zenotech
+# All rights reserved.
+
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+
+# 1. Redistributions of source code must retain the above copyright notice, this
+# list of conditions and the following disclaimer.
+
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and / or other materials provided with the distribution.
+
+# 3. Neither the name of the copyright holder nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES(INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+#         SERVICES
+#         LOSS OF USE, DATA, OR PROFITS
+#         OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT(INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import json
+import math
+import re
+import threading
+import time
+from urllib.parse import urlparse
+
+from .units import format_size
+
+
+# Path segments that identify an object rather than an endpoint
+_ID_SEGMENT = re.compile(r"/(\d+|[0-9a-f]{8}-[0-9a-f-]{27,})(?=/|$)")
+
+_active = None
+
+
+def endpoint(service, method, url, operation=None):
+    """ A name for the endpoint of a request that is the same for every object """
+    if operation is not None:
+        return "{} {}:{}".format(method, service, operation)
+    return "{} {}".format(method, _ID_SEGMENT.sub("/{id}", urlparse(url).path))
+
+
+def percentile(values, fraction):
+    """ The nearest rank percentile of sorted values """
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, max(0, math.ceil(fraction * len(values)) - 1))]
+
+
+def _busy_time(intervals):
+    """ Total time covered by at least one of the (start, end) intervals """
+    total = 0.0
+    end = None
+    for start, finish in sorted(intervals):
+        if end is None or start > end:
+            total += finish - start
+            end = finish
+        elif finish > end:
+            total += finish - end
+            end = finish
+    return total
+
+
+class Tracer(object):
+    """Record every HTTP request made to EPIC and S3 during a command.
+
+    Each request is kept with its method, URL, status, bytes sent and
+    received, latency and the number of times it was retried. For S3
+    downloads the latency is the time until the response headers arrive,
+    the body is streamed afterwards.
+    """
+
+    def __init__(self, clock=time.monotonic):
+        self.clock = clock
+        self.started = clock()
+        self.started_at = time.time()
+        self.events = []
+        self._lock = threading.Lock()
+        # Where this tracer keeps its state in the context of a boto request
+        self._context_key = "epic_trace_{}".format(id(self))
+
+    def record(
+        self,
+        service,
+        method,
+        url,
+        status,
+        started,
+        sent=0,
+        received=0,
+        retries=0,
+        error=None,
+        operation=None,
+    ):
+        """ Record a request started at started, by clock, that has just finished """
+        finished = self.clock()
+        event = {
+            "service": service,
+            "method": method,
+            "url": url,
+            "endpoint": endpoint(service, method, url, operation),
+            "status": status,
+            "sent": sent,
+            "received": received,
+            "start": started - self.started,
+            "latency": finished - started,
+            "retries": retries,
+            "error": error,
+        }
+        with self._lock:
+            self.events.append(event)
+
+    def attach(self, s3_client):
+        """ Record the requests made by s3_client """
+        events = s3_client.meta.events
+        events.register("before-call.s3", self._before_call)
+        events.register("before-send.s3", self._before_send)
+        events.register("after-call.s3", self._after_call)
+        events.register("after-call-error.s3", self._after_call_error)
+
+    def _before_call(self, model, context, **kwargs):
+        context[self._context_key] = {
+            "started": self.clock(),
+            "sent": 0,
+            "url": "",
+            "model": model,
+        }
+
+    def _before_send(self, request, **kwargs):
+        trace = getattr(request, "context", {}).get(self._context_key)
+        if trace is not None:
+            trace["sent"] += int(request.headers.get("Content-Length", 0) or 0)
+            trace["url"] = request.url
+
+    def _boto_record(self, context, model, status, received=0, error=None):
+        trace = context.pop(self._context_key, None)
+        if trace is None:
+            return
+        self.record(
+            "s3",
+            model.http.get("method", "") if model is not None else "",
+            trace["url"],
+            status,
+            trace["started"],
+            sent=trace["sent"],
+            received=received,
+            retries=max(context.get("retries", {}).get("attempt", 1) - 1, 0),
+            error=error,
+            operation=model.name if model is not None else "unknown",
+        )
+
+    def _after_call(self, http_response, model, context, **kwargs):
+        received = int(http_response.headers.get("Content-Length", 0) or 0)
+        self._boto_record(context, model, http_response.status_code, received)
+
+    def _after_call_error(self, exception, context, **kwargs):
+        trace = context.get(self._context_key)
+        model = trace.get("model") if trace is not None else None
+        self._boto_record(context, model, None, error=type(exception).__name__)
+
+    def summary(self):
+        """Return a row for each endpoint of (endpoint, calls, errors, retries,
+        p50, p95, max, sent, received), slowest in total first"""
+        with self._lock:
+            events = [*self.events]
+        by_endpoint = {}
+        for event in events:
+            by_endpoint.setdefault(event["endpoint"], []).append(event)
+        rows = []
+        for name, group in by_endpoint.items():
+            latencies = sorted(event["latency"] for event in group)
+            rows.append(
+                (
+                    name,
+                    len(group),
+                    sum(
+                        1
+                        for event in group
+                        if event["error"] or (event["status"] or 0) >= 400
+                    ),
+                    sum(event["retries"] for event in group),
+                    percentile(latencies, 0.5),
+                    percentile(latencies, 0.95),
+                    latencies[-1],
+                    sum(event["sent"] for event in group),
+                    sum(event["received"] for event in group),
+                    sum(latencies),
+                )
+            )
+        rows.sort(key=lambda row: row[-1], reverse=True)
+        return [row[:-1] for row in rows]
+
+    def report(self):
+        """ Lines summarising the requests, for printing when the command exits """
+        wall = self.clock() - self.started
+        with self._lock:
+            events = [*self.events]
+        network = _busy_time(
+            (event["start"], event["start"] + event["latency"]) for event in events
+        )
+        width = max([len(row[0]) for row in self.summary()] + [8])
+        lines = [
+            "{:<{w}} {:>6} {:>6} {:>7} {:>9} {:>9} {:>9} {:>10} {:>10}".format(
+                "Endpoint",
+                "Calls",
+                "Errors",
+                "Retries",
+                "p50",
+                "p95",
+                "Max",
+                "Sent",
+                "Received",
+                w=width,
+            )
+        ]
+        for name, calls, errors, retries, p50, p95, slowest, sent, received in self.summary():
+            lines.append(
+                "{:<{w}} {:>6} {:>6} {:>7} {:>7.1f}ms {:>7.1f}ms {:>7.1f}ms {:>10} {:>10}".format(
+                    name,
+                    calls,
+                    errors,
+                    retries,
+                    p50 * 1000,
+                    p95 * 1000,
+                    slowest * 1000,
+                    format_size(sent),
+                    format_size(received),
+                    w=width,
+                )
+            )
+        lines.append(
+            "{} requests, {} sent, {} received".format(
+                len(events),
+                format_size(sum(event["sent"] for event in events)),
+                format_size(sum(event["received"] for event in events)),
+            )
+        )
+        lines.append(
+            "Total {:.2f}s: {:.2f}s waiting for the network, {:.2f}s in the CLI".format(
+                wall, network, max(wall - network, 0.0)
+            )
+        )
+        return lines
+
+    def dump(self, path):
+        """ Write every request recorded to path as JSON """
+        with self._lock:
+            events = [*self.events]
+        with open(path, "w") as f:
+            json.dump(
+                {
+                    "started": self.started_at,
+                    "duration": self.clock() - self.started,
+                    "requests": events,
+                },
+                f,
+                indent=1,
+            )
+
+
+def start_tracing():
+    """ Start recording requests, returning the Tracer they are recorded in """
+    global _active
+    from .http import trace_requests
+
+    _active = Tracer()
+    trace_requests(_active)
+    return _active
+
+
+def active():
+    """ The Tracer recording requests, or None """
+    return _active
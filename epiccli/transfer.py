@@ -0,0 +1,710 @@
+# BSD 3 - Clause License
+
+# Copyright(c) 2020, Zenotech
+# All rights reserved.
+
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+
+# 1. Redistributions of source code must retain the above copyright notice, this
+# list of conditions and the following disclaimer.
+
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and / or other materials provided with the distribution.
+
+# 3. Neither the name of the copyright holder nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES(INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+#         SERVICES
+#         LOSS OF USE, DATA, OR PROFITS
+#         OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT(INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from .chunked import ChunkedTransfer
+from .delete import BatchDeleter, DeleteResult, delete_local
+from .hashing import ETagHasher
+from .manifest import forget_removed
+
+
+UPLOAD = "upload"
+DOWNLOAD = "download"
+
+DEFAULT_WORKERS = 8
+
+COMPARE_MTIME = "mtime"
+COMPARE_SIZE = "size"
+COMPARE_HASH = "hash"
+COMPARE_MODES = [COMPARE_MTIME, COMPARE_SIZE, COMPARE_HASH]
+
+# Number of files to compare by content at once
+HASH_BATCH = 1000
+
+# What a sync does with a file
+COPY = "copy"
+SKIP = "skip"
+DELETE = "delete"
+
+# Why it does it
+NEW = "not in destination"
+NEWER = "newer"
+SIZE_DIFFERS = "size differs"
+CONTENT_DIFFERS = "content differs"
+SAME = "up to date"
+UNCHANGED = "unchanged since last sync"
+NOT_IN_SOURCE = "not in source"
+
+
+class TransferTask(object):
+    """A single file in a transfer plan.
+
+    For uploads source is a local path and target an S3 key, for downloads
+    it is the other way round. path is the location of the file relative to
+    the folders being synced. copy is False when the planner decided the
+    file is already up to date in the destination, and reason says why the
+    file is copied or not. A task with delete set is for a file that is
+    only in the destination, with source None and target the file.
+    """
+
+    __slots__ = (
+        "direction",
+        "source",
+        "target",
+        "size",
+        "copy",
+        "folder",
+        "etag",
+        "mtime",
+        "path",
+        "delete",
+        "reason",
+    )
+
+    def __init__(
+        self,
+        direction,
+        source,
+        target,
+        size=0,
+        copy=True,
+        folder=False,
+        etag=None,
+        mtime=None,
+        path=None,
+        delete=False,
+        reason=NEW,
+    ):
+        self.direction = direction
+        self.source = source
+        self.target = target
+        self.size = size
+        self.copy = copy
+        self.folder = folder
+        self.etag = etag
+        self.mtime = mtime
+        self.path = path
+        self.delete = delete
+        self.reason = reason
+
+    @property
+    def action(self):
+        if self.delete:
+            return DELETE
+        return COPY if self.copy else SKIP
+
+    @property
+    def signature(self):
+        """ Identifies the version of the source file this task copies """
+        return "{}:{}:{}".format(self.size, self.mtime, self.etag)
+
+
+class TransferStats(object):
+    """ Counters for a batch of transfers """
+
+    def __init__(self):
+        self.files = 0
+        self.bytes = 0
+        self.skipped = 0
+        self.failed = []
+        self.started = time.monotonic()
+        self.finished = None
+
+    def stop(self):
+        self.finished = time.monotonic()
+
+    @property
+    def elapsed(self):
+        end = self.finished if self.finished is not None else time.monotonic()
+        return max(end - self.started, 1e-6)
+
+    @property
+    def files_per_second(self):
+        return self.files / self.elapsed
+
+    @property
+    def mb_per_second(self):
+        return self.bytes / self.elapsed / 1e6
+
+    def summary(self):
+        return (
+            "Transferred {} files ({:.1f} MB) in {:.1f}s, {:.1f} files/s, {:.2f} MB/s. "
+            "{} skipped, {} failed".format(
+                self.files,
+                self.bytes / 1e6,
+                self.elapsed,
+                self.files_per_second,
+                self.mb_per_second,
+                self.skipped,
+                len(self.failed),
+            )
+        )
+
+
+def _scan_folder(rel_dir, full_dir, path_filter):
+    """Return the (relative_path, entry) of the files and sub folders of
+    full_dir that path_filter selects, in the order of their keys"""
+    entries = []
+    with os.scandir(full_dir) as scan:
+        for entry in scan:
+            rel_path = rel_dir + entry.name
+            if entry.is_dir():
+                if path_filter and path_filter.prune(rel_path):
+                    continue
+                entries.append((rel_path + "/", entry))
+            elif path_filter and not path_filter.matches(rel_path):
+                continue
+            elif entry.is_file():
+                entries.append((rel_path, entry))
+    # Everything inside folder "a" has a key starting "a/", so folders are
+    # sorted by that to put them where their files come in a listing
+    entries.sort(key=lambda item: item[0])
+    return entries
+
+
+def walk_local(root, path_filter=None):
+    """Yield (relative_path, full_path, size, mtime) for every file below root.
+
+    relative_path always uses "/" as the separator so that it can be joined
+    directly onto an S3 key prefix, and files are yielded in the order S3
+    lists the same keys. Folders are read as the walk reaches them, so only
+    the folders on the way down to the current file are held in memory. If
+    a PathFilter is given only the files it selects are yielded, and folders
+    it prunes are not scanned. A root that does not exist has no files.
+    """
+    if not os.path.isdir(root):
+        return
+    stack = [iter(_scan_folder("", root, path_filter))]
+    while stack:
+        item = next(stack[-1], None)
+        if item is None:
+            stack.pop()
+            continue
+        rel_path, entry = item
+        if rel_path.endswith("/"):
+            stack.append(iter(_scan_folder(rel_path, entry.path, path_filter)))
+            continue
+        stat = entry.stat()
+        yield rel_path, entry.path, stat.st_size, stat.st_mtime
+
+
+def merge_join(source, destination):
+    """Pair up the entries of two listings sorted by path.
+
+    source and destination yield (path, item) in increasing order of path.
+    For every path in either, (path, source_item, destination_item) is
+    yielded, with None for a listing the path is not in. Only the current
+    entry of each listing is held, so listings of any size can be compared.
+    """
+    done = (None, None)
+    source = iter(source)
+    destination = iter(destination)
+    source_path, source_item = next(source, done)
+    destination_path, destination_item = next(destination, done)
+    while source_path is not None or destination_path is not None:
+        if destination_path is None or (
+            source_path is not None and source_path < destination_path
+        ):
+            yield source_path, source_item, None
+            previous = source_path
+            source_path, source_item = next(source, done)
+        elif source_path is None or destination_path < source_path:
+            yield destination_path, None, destination_item
+            previous = destination_path
+            destination_path, destination_item = next(destination, done)
+        else:
+            yield source_path, source_item, destination_item
+            previous = source_path
+            source_path, source_item = next(source, done)
+            destination_path, destination_item = next(destination, done)
+        for path in (source_path, destination_path):
+            if path is not None and path <= previous:
+                raise ValueError("Listing is not sorted, {} follows {}".format(path, previous))
+
+
+class _PendingHashes(object):
+    """Tasks waiting for the content of a local file to be compared with the
+    remote ETag. Files are hashed HASH_BATCH at a time so the hashing can be
+    spread over several processes."""
+
+    def __init__(self, overwrite, manifest):
+        self.overwrite = overwrite
+        self.manifest = manifest
+        self.pending = []
+        self._hasher = None
+
+    def add(self, task, filename, size, mtime, remote):
+        """Queue task, returning the tasks that have been decided"""
+        self.pending.append((task, filename, size, mtime, remote))
+        if len(self.pending) >= HASH_BATCH:
+            return self.resolve()
+        return []
+
+    def resolve(self):
+        pending, self.pending = self.pending, []
+        if not pending:
+            return []
+        if self._hasher is None:
+            self._hasher = ETagHasher()
+        matches = self._hasher.matches(
+            [(filename, remote.size, remote.etag) for _, filename, _, _, remote in pending]
+        )
+        for (task, _, size, mtime, remote), same in zip(pending, matches):
+            task.reason = SAME if same else CONTENT_DIFFERS
+            task.copy = self.overwrite and not same
+            if self.manifest is not None and same:
+                self.manifest.update(task.path, size, mtime, remote.etag)
+        return [task for task, _, _, _, _ in pending]
+
+    def close(self):
+        if self._hasher is not None:
+            self._hasher.close()
+
+
+def _decide(task, differs, reason, overwrite, manifest, size, mtime, etag):
+    task.reason = reason if differs else SAME
+    task.copy = overwrite and differs
+    if manifest is not None and not differs and size == task.size:
+        manifest.update(task.path, size, mtime, etag)
+
+
+def _upload_tasks(pairs, local_root, key_prefix, overwrite, manifest, compare, delete):
+    """ Decide what to do with each (path, local, remote) of an upload """
+    hashes = _PendingHashes(overwrite, manifest)
+    try:
+        for rel_path, local, remote in pairs:
+            if local is None:
+                if remote.folder and os.path.isdir(
+                    os.path.join(local_root, *rel_path.split("/"))
+                ):
+                    # The marker of a folder that is there locally, if empty
+                    continue
+                if delete:
+                    yield TransferTask(
+                        UPLOAD,
+                        None,
+                        remote.key,
+                        remote.size,
+                        copy=False,
+                        etag=remote.etag,
+                        mtime=remote.last_modified,
+                        path=rel_path,
+                        delete=True,
+                        reason=NOT_IN_SOURCE,
+                    )
+                continue
+            full_path, size, mtime = local
+            task = TransferTask(
+                UPLOAD, full_path, key_prefix + rel_path, size, mtime=mtime, path=rel_path
+            )
+            if remote is None:
+                yield task
+                continue
+            entry = None if manifest is None else manifest.get(rel_path)
+            if (
+                compare != COMPARE_HASH
+                and entry is not None
+                and entry.size == size == remote.size
+                and entry.mtime == mtime
+                and entry.etag == remote.etag
+            ):
+                # Neither side has changed since the last sync
+                task.copy = False
+                task.reason = UNCHANGED
+                yield task
+                continue
+            if compare == COMPARE_HASH and size == remote.size:
+                yield from hashes.add(task, full_path, size, mtime, remote)
+                continue
+            if compare != COMPARE_MTIME:
+                differs, reason = size != remote.size, SIZE_DIFFERS
+            elif entry is not None and entry.etag == remote.etag:
+                # The destination has not changed since the last sync, so the
+                # local file must have
+                differs, reason = True, NEWER
+            else:
+                # S3 only keeps whole seconds for LastModified
+                differs, reason = int(mtime) > remote.last_modified, NEWER
+            _decide(task, differs, reason, overwrite, manifest, remote.size, mtime, remote.etag)
+            yield task
+        yield from hashes.resolve()
+    finally:
+        hashes.close()
+
+
+def plan_upload(
+    storage,
+    local_root,
+    key_prefix,
+    overwrite=True,
+    manifest=None,
+    compare=COMPARE_MTIME,
+    path_filter=None,
+    workers=DEFAULT_WORKERS,
+    delete=False,
+):
+    """Yield the tasks needed to copy local_root to key_prefix.
+
+    The local folder is walked and the destination listed side by side, both
+    in key order, and the two are merged in a single pass, so neither is held
+    in memory and the first files can be copied while the rest are still
+    being compared. A file is copied if it is missing from the destination,
+    or if overwrite is set and the files differ. compare selects how files
+    are compared: "mtime" copies files that are newer locally, "size" files
+    whose sizes differ, and "hash" files whose content does not match the
+    remote ETag. If delete is set a task with delete set is also yielded for
+    each file in the destination that is not in local_root, and for each
+    marker of an empty folder that local_root does not have.
+
+    If a SyncManifest is given, files whose size and modification time match
+    the manifest are skipped without comparing them, as long as the copy in
+    the destination still has the size and ETag the manifest recorded.
+    Comparing by hash always compares the content.
+
+    If a PathFilter is given only the files it selects are considered, on
+    both sides, and folders it prunes are neither scanned nor listed.
+    """
+    local = (
+        (rel_path, (full_path, size, mtime))
+        for rel_path, full_path, size, mtime in walk_local(local_root, path_filter)
+    )
+    remote = (
+        (obj.key[len(key_prefix) :], obj)
+        for obj in storage.walk_sorted(key_prefix, path_filter, workers)
+    )
+    pairs = merge_join(local, remote)
+    return _upload_tasks(
+        pairs, local_root, key_prefix, overwrite, manifest, compare, delete
+    )
+
+
+def _download_tasks(pairs, key_prefix, local_root, overwrite, manifest, compare, delete):
+    """ Decide what to do with each (path, remote, local) of a download """
+    hashes = _PendingHashes(overwrite, manifest)
+    try:
+        for rel_path, remote, local in pairs:
+            if remote is None:
+                if delete:
+                    full_path, size, mtime = local
+                    yield TransferTask(
+                        DOWNLOAD,
+                        None,
+                        full_path,
+                        size,
+                        copy=False,
+                        mtime=mtime,
+                        path=rel_path,
+                        delete=True,
+                        reason=NOT_IN_SOURCE,
+                    )
+                continue
+            full_path = os.path.join(local_root, *rel_path.split("/"))
+            if remote.folder:
+                yield TransferTask(
+                    DOWNLOAD, remote.key, full_path, copy=False, folder=True, path=rel_path
+                )
+                continue
+            task = TransferTask(
+                DOWNLOAD,
+                remote.key,
+                full_path,
+                remote.size,
+                etag=remote.etag,
+                mtime=remote.last_modified,
+                path=rel_path,
+            )
+            if local is None:
+                yield task
+                continue
+            _, size, mtime = local
+            entry = None if manifest is None else manifest.get(rel_path)
+            if (
+                compare != COMPARE_HASH
+                and entry is not None
+                and entry.size == size == remote.size
+                and entry.mtime == mtime
+                and entry.etag == remote.etag
+            ):
+                # Neither side has changed since the last sync
+                task.copy = False
+                task.reason = UNCHANGED
+                yield task
+                continue
+            if compare == COMPARE_HASH and size == remote.size:
+                yield from hashes.add(task, full_path, size, mtime, remote)
+                continue
+            if compare != COMPARE_MTIME:
+                differs, reason = size != remote.size, SIZE_DIFFERS
+            else:
+                differs, reason = remote.last_modified >= mtime, NEWER
+            _decide(task, differs, reason, overwrite, manifest, size, mtime, remote.etag)
+            yield task
+        yield from hashes.resolve()
+    finally:
+        hashes.close()
+
+
+def plan_download(
+    storage,
+    key_prefix,
+    local_root,
+    overwrite=True,
+    manifest=None,
+    compare=COMPARE_MTIME,
+    path_filter=None,
+    workers=DEFAULT_WORKERS,
+    delete=False,
+):
+    """Yield the tasks needed to copy key_prefix to local_root.
+
+    The listing of key_prefix is merged with a walk of local_root in a
+    single pass, as for plan_upload. A file is copied if it is missing
+    locally, or if overwrite is set and the files differ according to
+    compare. If a SyncManifest is given, files are skipped without comparing
+    them if the remote size and ETag and the local size and modification
+    time all match the manifest, unless compare is "hash".
+    path_filter restricts the files considered and delete adds tasks for the
+    local files that are not in key_prefix, as for plan_upload.
+    """
+    remote = (
+        (obj.key[len(key_prefix) :], obj)
+        for obj in storage.walk_sorted(key_prefix, path_filter, workers)
+    )
+    local = (
+        (rel_path, (full_path, size, mtime))
+        for rel_path, full_path, size, mtime in walk_local(local_root, path_filter)
+    )
+    pairs = merge_join(remote, local)
+    return _download_tasks(
+        pairs, key_prefix, local_root, overwrite, manifest, compare, delete
+    )
+
+
+def plan_sync(
+    storage,
+    source,
+    destination,
+    overwrite=True,
+    dryrun=False,
+    manifest=None,
+    compare=COMPARE_MTIME,
+    path_filter=None,
+    workers=DEFAULT_WORKERS,
+    delete=False,
+):
+    """Plan a sync between a local folder and an EPIC folder in either
+    direction, yielding the tasks as they are decided"""
+    if source.startswith("epic://"):
+        if destination.startswith("epic://"):
+            raise ValueError("Both source_path and target_path are EPIC paths")
+        if not source.endswith("/"):
+            source = source + "/"
+        destination = os.path.expanduser(destination)
+        if not dryrun:
+            os.makedirs(destination, exist_ok=True)
+        return plan_download(
+            storage,
+            storage.epic_path_to_key(source),
+            destination,
+            overwrite,
+            manifest=manifest,
+            compare=compare,
+            path_filter=path_filter,
+            workers=workers,
+            delete=delete,
+        )
+    elif destination.startswith("epic://"):
+        if not destination.endswith("/"):
+            destination = destination + "/"
+        source = os.path.expanduser(source)
+        if not os.path.isdir(source):
+            raise ValueError("source_path does not exist")
+        return plan_upload(
+            storage,
+            source,
+            storage.epic_path_to_key(destination),
+            overwrite,
+            manifest=manifest,
+            compare=compare,
+            path_filter=path_filter,
+            workers=workers,
+            delete=delete,
+        )
+    else:
+        raise ValueError("At least one epic:// path must be specified")
+
+
+def delete_extra(
+    storage, tasks, local_root, workers=DEFAULT_WORKERS, manifest=None, progress=None
+):
+    """Delete the destination files of tasks, as planned by plan_sync with
+    delete set, and remove them from manifest, if a SyncManifest is given,
+    and from any other manifest that syncs with the files deleted in EPIC.
+
+    Files in EPIC are deleted in batches by a BatchDeleter, calling
+    progress(deleted) as they complete, and local files are deleted along
+    with the folders below local_root they leave empty. Returns a
+    DeleteResult.
+    """
+    if not tasks:
+        return DeleteResult()
+    targets = [task.target for task in tasks]
+    # A sync only goes one way, so every task deletes from the same side
+    if tasks[0].direction == UPLOAD:
+        result = BatchDeleter(storage, workers=workers).delete(targets, progress=progress)
+    else:
+        result = delete_local(targets, local_root)
+    failed = set(target for target, _ in result.errors)
+    deleted = [task for task in tasks if task.target not in failed]
+    if manifest is not None:
+        for task in deleted:
+            manifest.remove(task.path)
+    if tasks[0].direction == UPLOAD:
+        forget_removed(
+            ("s3://{}/{}".format(storage.bucket, task.target) for task in deleted),
+            exclude=None if manifest is None else manifest.path,
+        )
+    return result
+
+
+class TransferPool(object):
+    """Execute a transfer plan on a bounded pool of worker threads.
+
+    All workers share the S3 client held by storage, and large files are
+    split into parts by chunked, a ChunkedTransfer. Completed tasks are
+    reported through callback(source, target, copied, dryrun) from the
+    calling thread, so the callback does not need to be thread safe. When a
+    TransferJournal is given, copied files are recorded in it and files it
+    already lists as copied are skipped. Copied files are also recorded in
+    manifest, if a SyncManifest is given.
+    """
+
+    def __init__(
+        self,
+        storage,
+        workers=DEFAULT_WORKERS,
+        dryrun=False,
+        callback=None,
+        cancel_event=None,
+        chunked=None,
+        journal=None,
+        manifest=None,
+    ):
+        self.storage = storage
+        self.workers = max(workers, 1)
+        self.dryrun = dryrun
+        self.callback = callback
+        self.cancel_event = cancel_event if cancel_event is not None else threading.Event()
+        self.journal = journal
+        self.manifest = manifest
+        if chunked is None:
+            chunked = ChunkedTransfer(storage, journal=journal)
+        self.chunked = chunked
+
+    def run(self, tasks):
+        stats = TransferStats()
+        max_pending = self.workers * 4
+        pending = {}
+        try:
+            with ThreadPoolExecutor(max_workers=self.workers) as executor:
+                for task in tasks:
+                    if self.cancel_event.is_set():
+                        break
+                    if (
+                        task.copy
+                        and self.journal is not None
+                        and self.journal.file_done(task.source, task.signature)
+                    ):
+                        task.copy = False
+                    if len(pending) >= max_pending:
+                        self._collect(pending, stats, FIRST_COMPLETED)
+                    pending[executor.submit(self._execute, task)] = task
+                self._collect(pending, stats, None)
+        except KeyboardInterrupt:
+            self.cancel_event.set()
+            raise
+        finally:
+            stats.stop()
+            self.chunked.close()
+        return stats
+
+    def _collect(self, pending, stats, return_when):
+        if return_when is None:
+            done, _ = wait(pending)
+        else:
+            done, _ = wait(pending, return_when=return_when)
+        for future in done:
+            task = pending.pop(future)
+            try:
+                result = future.result()
+            except Exception as e:
+                stats.failed.append((task, e))
+                continue
+            copied = result is not None
+            if copied:
+                if self.journal is not None:
+                    self.journal.record_file(task.source, task.signature)
+                if self.manifest is not None and task.path is not None:
+                    self.manifest.update(task.path, task.size, *result)
+                stats.files += 1
+                stats.bytes += task.size
+            else:
+                stats.skipped += 1
+            if self.callback is not None:
+                source, target = task.source, task.target
+                if task.direction == UPLOAD:
+                    target = self.storage.key_to_epic_path(target)
+                else:
+                    source = self.storage.key_to_epic_path(source)
+                self.callback(source, target, copied, self.dryrun)
+
+    def _execute(self, task):
+        """Copy a single file, returning None if nothing was copied, otherwise
+        the (local modification time, ETag) of the file now in both places"""
+        if self.cancel_event.is_set():
+            return None
+        if task.folder:
+            if not self.dryrun:
+                os.makedirs(task.target, exist_ok=True)
+            return None
+        if not task.copy or self.dryrun:
+            return None
+        if task.direction == UPLOAD:
+            etag = self.chunked.upload(task.source, task.target)
+            return task.mtime, etag
+        os.makedirs(os.path.dirname(task.target), exist_ok=True)
+        self.chunked.download(task.source, task.target, size=task.size, etag=task.etag)
+        return os.path.getmtime(task.target), task.etag
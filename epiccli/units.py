@@ -0,0 +1,88 @@
+# BSD 3 - Clause License
+
+# Copyright(c) 2020, Zenotech
+# All rights reserved.
+
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+
+# 1. Redistributions of source code must retain the above copyright notice, this
+# list of conditions and the following disclaimer.
+
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and / or other materials provided with the distribution.
+
+# 3. Neither the name of the copyright holder nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES(INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+#         SERVICES
+#         LOSS OF USE, DATA, OR PROFITS
+#         OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT(INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import re
+
+
+_SIZE_PATTERN = re.compile(r"^\s*(\d+(?:\.\d+)?)\s*([kmgt]i?b?|b)?\s*$", re.IGNORECASE)
+_SIZE_UNITS = {
+    "": 1,
+    "b": 1,
+    "k": 1000,
+    "kb": 1000,
+    "m": 1000 ** 2,
+    "mb": 1000 ** 2,
+    "g": 1000 ** 3,
+    "gb": 1000 ** 3,
+    "t": 1000 ** 4,
+    "tb": 1000 ** 4,
+    "ki": 1024,
+    "kib": 1024,
+    "mi": 1024 ** 2,
+    "mib": 1024 ** 2,
+    "gi": 1024 ** 3,
+    "gib": 1024 ** 3,
+    "ti": 1024 ** 4,
+    "tib": 1024 ** 4,
+}
+
+
+def parse_size(value):
+    """Convert a human readable size such as "64MB" or "8MiB" to bytes"""
+    if isinstance(value, int):
+        return value
+    match = _SIZE_PATTERN.match(value)
+    if match is None:
+        raise ValueError(f"Invalid size {value}")
+    number, unit = match.groups()
+    return int(float(number) * _SIZE_UNITS[(unit or "").lower()])
+
+
+def parse_rate(value):
+    """Convert a human readable rate such as "200MB/s" to bytes per second"""
+    if isinstance(value, int):
+        return value
+    value = value.strip()
+    if value.lower().endswith("/s"):
+        value = value[:-2]
+    return parse_size(value)
+
+
+def format_size(size):
+    """ Format a byte count for display """
+    for unit in ["B", "KB", "MB", "GB", "TB"]:
+        if abs(size) < 1000 or unit == "TB":
+            break
+        size /= 1000.0
+    if unit == "B":
+        return f"{int(size)} {unit}"
+    return f"{size:.1f} {unit}"
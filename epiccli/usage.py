@@ -0,0 +1,123 @@
+# BSD 3 - Clause License
+
+# Copyright(c) 2020, Zenotech
+# All rights reserved.
+
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+
+# 1. Redistributions of source code must retain the above copyright notice, this
+# list of conditions and the following disclaimer.
+
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and / or other materials provided with the distribution.
+
+# 3. Neither the name of the copyright holder nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES(INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+#         SERVICES
+#         LOSS OF USE, DATA, OR PROFITS
+#         OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT(INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+
+DEFAULT_WORKERS = 16
+
+
+class UsageNode(object):
+    """ Total size and object count of everything below a folder """
+
+    __slots__ = ("key", "size", "count", "children")
+
+    def __init__(self, key):
+        self.key = key
+        self.size = 0
+        self.count = 0
+        self.children = {}
+
+    def walk(self, level=0):
+        """Yield (level, node) for this node and its descendants, largest
+        folders first"""
+        yield level, self
+        for child in sorted(self.children.values(), key=lambda n: n.size, reverse=True):
+            yield from child.walk(level + 1)
+
+
+class DiskUsage(object):
+    """Aggregate the size of an EPIC folder tree.
+
+    Folders down to depth levels are listed one level at a time, and the
+    listings of sibling folders run concurrently on a pool of workers
+    threads. Below depth each sub tree is listed in a single flat listing
+    and rolled up into its ancestor. Running totals are kept in objects and
+    bytes while the scan is in progress.
+    """
+
+    def __init__(self, storage, depth=1, workers=DEFAULT_WORKERS):
+        self.storage = storage
+        self.depth = max(depth, 0)
+        self.workers = max(workers, 1)
+        self.objects = 0
+        self.bytes = 0
+        self._lock = threading.Lock()
+
+    def scan(self, key_prefix, progress=None, interval=1.0):
+        """Return the UsageNode tree for key_prefix, calling
+        progress(objects, bytes) every interval seconds while scanning"""
+        root = UsageNode(key_prefix)
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            pending = {executor.submit(self._list, [root], 0)}
+            while pending:
+                done, pending = wait(
+                    pending, timeout=interval, return_when=FIRST_COMPLETED
+                )
+                for future in done:
+                    for path, level in future.result():
+                        pending.add(executor.submit(self._list, path, level))
+                if progress is not None:
+                    progress(self.objects, self.bytes)
+        return root
+
+    def _add(self, path, size, count):
+        with self._lock:
+            for node in path:
+                node.size += size
+                node.count += count
+            self.objects += count
+            self.bytes += size
+
+    def _list(self, path, level):
+        """List the folder at the end of path, returning the (path, level) of
+        each sub folder that still needs listing"""
+        node = path[-1]
+        recursive = level >= self.depth
+        pending = []
+        args = {"Bucket": self.storage.bucket, "Prefix": node.key}
+        if not recursive:
+            args["Delimiter"] = "/"
+        paginator = self.storage.s3_client.get_paginator("list_objects_v2")
+        for page in paginator.paginate(**args):
+            size = 0
+            count = 0
+            for item in page.get("Contents", []):
+                size += item["Size"]
+                count += 1
+            self._add(path, size, count)
+            for item in page.get("CommonPrefixes", []):
+                child = UsageNode(item["Prefix"])
+                node.children[child.key] = child
+                pending.append((path + [child], level + 1))
+        return pending
@@ -0,0 +1,208 @@
+# BSD 3 - Clause License
+
+# Copyright(c) 2020, Zenotech
+# All rights reserved.
+
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+
+# 1. Redistributions of source code must retain the above copyright notice, this
+# list of conditions and the following disclaimer.
+
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and / or other materials provided with the distribution.
+
+# 3. Neither the name of the copyright holder nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES(INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+#         SERVICES
+#         LOSS OF USE, DATA, OR PROFITS
+#         OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT(INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import time
+
+
+DEFAULT_INTERVAL = 2.0
+DEFAULT_MAX_INTERVAL = 60.0
+
+# Statuses of a job step that will not change again
+FINISHED_STATUSES = (
+    "finished",
+    "complete",
+    "completed",
+    "failed",
+    "error",
+    "cancelled",
+    "canceled",
+)
+
+LOGS = ("stdout", "stderr", "app")
+
+
+class LogFollower(object):
+    """Find the new part of a log that is fetched again and again.
+
+    The log API only returns whole logs, so the follower remembers how long
+    the log was and the last anchor_size characters it ended with. If the log
+    has grown the new text is everything after the old length. If the server
+    only returns the end of a long log, the new text is found after the last
+    occurrence of the anchor. Memory use does not grow with the log.
+    """
+
+    def __init__(self, anchor_size=1024):
+        self.anchor_size = anchor_size
+        self.offset = 0
+        self.anchor = ""
+
+    def update(self, text):
+        """ Return the part of text that has not been seen before """
+        text = text or ""
+        start = self.offset - len(self.anchor)
+        if not self.anchor:
+            new = text
+        elif start >= 0 and text.startswith(self.anchor, start):
+            new = text[self.offset :]
+        else:
+            index = text.rfind(self.anchor)
+            new = text[index + len(self.anchor) :] if index >= 0 else text
+        self.offset = len(text)
+        self.anchor = text[-self.anchor_size :]
+        return new
+
+
+def step_finished(step):
+    if step.end is not None or step.exit_code is not None:
+        return True
+    return (step.status or "").lower() in FINISHED_STATUSES
+
+
+def step_exit_code(step):
+    """ The exit code of a finished step, 1 if it failed without one """
+    if step.exit_code is not None:
+        return step.exit_code
+    return 1 if (step.status or "").lower() in ("failed", "error") else 0
+
+
+def follow(
+    fetch_log,
+    finished,
+    write,
+    interval=DEFAULT_INTERVAL,
+    max_interval=DEFAULT_MAX_INTERVAL,
+    sleep=time.sleep,
+):
+    """Poll fetch_log() and pass new log text to write until finished()
+    returns True.
+
+    The delay between polls starts at interval and doubles, up to
+    max_interval, each time nothing new is logged. The log is fetched once
+    more after finished() first returns True so that no output is lost.
+    """
+    follower = LogFollower()
+    delay = interval
+    while True:
+        done = finished()
+        new = follower.update(fetch_log())
+        if new:
+            write(new)
+            delay = interval
+        else:
+            delay = min(delay * 2, max_interval)
+        if done:
+            return
+        sleep(delay)
+
+
+class JobWatcher(object):
+    """Follow the logs of the steps of an EPIC job as it runs.
+
+    Each poll fetches the job once, which gives the state of every step, and
+    then the log of the step being followed. The log is asked to be refreshed
+    from the cluster once per poll without waiting for it, so new output
+    shows up by the next poll.
+    """
+
+    def __init__(
+        self,
+        client,
+        job_id,
+        log="stdout",
+        interval=DEFAULT_INTERVAL,
+        max_interval=DEFAULT_MAX_INTERVAL,
+        sleep=time.sleep,
+    ):
+        self.client = client
+        self.job_id = job_id
+        self.log = log
+        self.interval = interval
+        self.max_interval = max_interval
+        self.sleep = sleep
+        self.job = None
+
+    def _step(self, step_id):
+        for step in self.job.job_steps:
+            if step.id == step_id:
+                return step
+        raise ValueError("Step {} is not part of job {}".format(step_id, self.job_id))
+
+    def _poll(self, step_id):
+        self.job = self.client.job.get_details(self.job_id)
+        return self.job.finished or step_finished(self._step(step_id))
+
+    def _request_refresh(self, step_id):
+        import epiccore
+
+        with epiccore.ApiClient(self.client.job.configuration) as api_client:
+            try:
+                epiccore.JobrefreshApi(api_client).jobrefresh_create(
+                    {"job_step": step_id}
+                )
+            except epiccore.exceptions.ApiException as e:
+                # Sent when the step has no logs to refresh
+                if e.status != 400:
+                    raise
+
+    def _fetch_log(self, step_id):
+        self._request_refresh(step_id)
+        logs = self.client.job.get_step_logs(step_id, refresh=False)
+        return getattr(logs, self.log)
+
+    def follow_step(self, step_id, write):
+        """ Write the log of step_id as it grows and return its exit code """
+        follow(
+            lambda: self._fetch_log(step_id),
+            lambda: self._poll(step_id),
+            write,
+            interval=self.interval,
+            max_interval=self.max_interval,
+            sleep=self.sleep,
+        )
+        return step_exit_code(self._step(step_id))
+
+    def watch(self, write, on_step=None):
+        """Follow every step of the job in turn and return the exit code of
+        the first step that failed, or 0"""
+        self.job = self.client.job.get_details(self.job_id)
+        exit_code = 0
+        for step_id in [step.id for step in self.job.job_steps]:
+            step = self._step(step_id)
+            if self.job.finished and step.start is None:
+                # Never ran, e.g. because an earlier step failed
+                continue
+            if on_step is not None:
+                on_step(step)
+            code = self.follow_step(step_id, write)
+            if code and not exit_code:
+                exit_code = code
+        return exit_code
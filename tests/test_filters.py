@@ -0,0 +1,162 @@
+# BSD 3 - Clause License
+
+# Copyright(c) 2020, Zenotech
+# All rights reserved.
+
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+
+# 1. Redistributions of source code must retain the above copyright notice, this
+# list of conditions and the following disclaimer.
+
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and / or other materials provided with the distribution.
+
+# 3. Neither the name of the copyright holder nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES(INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+#         SERVICES
+#         LOSS OF USE, DATA, OR PROFITS
+#         OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT(INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+""" Tests for selecting paths with include and exclude glob patterns """
+
+import pytest
+
+from epiccli.exceptions import CommandError
+from epiccli.filters import PathFilter
+
+
+def test_empty_filter_selects_everything():
+    path_filter = PathFilter()
+    assert not path_filter
+    assert not path_filter.can_prune
+    assert path_filter.matches("a/b/c.txt")
+    assert not path_filter.prune("a")
+
+
+@pytest.mark.parametrize(
+    "pattern, path, expected",
+    [
+        ("*.log", "run.log", True),
+        ("*.log", "a/b/run.log", True),
+        ("*.log", "run.log.gz", False),
+        ("*", "a/b", True),
+        ("?.txt", "a.txt", True),
+        ("?.txt", "ab.txt", False),
+        ("a/*.txt", "a/b.txt", True),
+        ("a/*.txt", "a/b/c.txt", False),
+        ("a/*.txt", "x/a/b.txt", False),
+        ("a/**/c.txt", "a/c.txt", True),
+        ("a/**/c.txt", "a/b/d/c.txt", True),
+        ("a/**", "a/b/c", True),
+        ("[ab].txt", "b.txt", True),
+        ("[!ab].txt", "b.txt", False),
+        ("[!ab].txt", "c.txt", True),
+        ("processor*/", "processor0/U", True),
+        ("processor*/", "case/processor0/U", True),
+        ("processor*/", "processor0", False),
+        ("data", "data/a/b", True),
+        ("/foo", "foo", True),
+        ("/foo", "foo/bar", True),
+        ("/foo", "a/foo", False),
+        ("/processor*/", "processor1/U", True),
+        ("/processor*/", "case/processor1/U", False),
+    ],
+)
+def test_include_pattern(pattern, path, expected):
+    assert PathFilter(include=[pattern]).matches(path) is expected
+
+
+def test_exclude_overrides_include():
+    path_filter = PathFilter(include=["*.dat"], exclude=["tmp/"])
+    assert path_filter.matches("a/b.dat")
+    assert not path_filter.matches("tmp/b.dat")
+    assert not path_filter.matches("a/tmp/b.dat")
+    assert not path_filter.matches("a/b.txt")
+
+
+def test_any_include_selects():
+    path_filter = PathFilter(include=["*.dat", "*.txt"])
+    assert path_filter.matches("a.dat")
+    assert path_filter.matches("a.txt")
+    assert not path_filter.matches("a.log")
+
+
+def test_excluded_folders_are_pruned():
+    path_filter = PathFilter(exclude=["processor*/", "/postProcessing"])
+    assert path_filter.can_prune
+    assert path_filter.prune("processor0")
+    assert path_filter.prune("case/processor0")
+    assert path_filter.prune("postProcessing")
+    assert not path_filter.prune("case/postProcessing")
+    assert not path_filter.prune("constant")
+
+
+def test_excluded_file_pattern_prunes_matching_folder():
+    # A path is excluded if a folder it is in matches
+    path_filter = PathFilter(exclude=["*.tmp"])
+    assert path_filter.prune("a.tmp")
+    assert not path_filter.matches("a.tmp/b")
+
+
+def test_anchored_includes_prune_other_folders():
+    path_filter = PathFilter(include=["case/*/U"])
+    assert path_filter.can_prune
+    assert not path_filter.prune("case")
+    assert not path_filter.prune("case/0")
+    assert path_filter.prune("other")
+    assert path_filter.prune("case/0/U/x") is False
+    assert path_filter.matches("case/0/U")
+    assert not path_filter.matches("other/0/U")
+
+
+def test_double_star_include_prunes_only_above_it():
+    path_filter = PathFilter(include=["case/**/U"])
+    assert path_filter.prune("other")
+    assert not path_filter.prune("case/a/b/c")
+
+
+def test_unanchored_include_never_prunes():
+    path_filter = PathFilter(include=["*.dat", "case/*.dat"])
+    assert not path_filter.can_prune
+    assert not path_filter.prune("other")
+
+
+def test_pruned_folders_contain_nothing_selected():
+    path_filter = PathFilter(include=["a/*/c.txt"], exclude=["b/"])
+    paths = ["a/x/c.txt", "a/b/c.txt", "b/x/c.txt", "x/a/x/c.txt", "a/x/y/c.txt"]
+    for path in paths:
+        folders = path.split("/")[:-1]
+        for depth in range(1, len(folders) + 1):
+            if path_filter.prune("/".join(folders[:depth])):
+                assert not path_filter.matches(path), path
+
+
+@pytest.mark.parametrize("pattern", ["[]", "[z-a]", "a/[]/b"])
+def test_invalid_pattern_is_named(pattern):
+    with pytest.raises(CommandError) as error:
+        PathFilter(include=["*.dat"], exclude=[pattern])
+    assert repr(pattern) in str(error.value)
+
+
+def test_every_pattern_matches_whole_names():
+    path_filter = PathFilter(include=["a", "b.txt"], exclude=["c/", "*.log"])
+    assert path_filter.matches("a")
+    assert path_filter.matches("x/b.txt")
+    assert not path_filter.matches("ab")
+    assert not path_filter.matches("b.txt2")
+    assert path_filter.prune("c")
+    assert not path_filter.prune("cd")
+    assert path_filter.matches("a/cd/x")
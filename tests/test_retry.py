@@ -0,0 +1,231 @@
+# BSD 3 - Clause License
+
+# Copyright(c) 2020, Zenotech
+# All rights reserved.
+
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+
+# 1. Redistributions of source code must retain the above copyright notice, this
+# list of conditions and the following disclaimer.
+
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and / or other materials provided with the distribution.
+
+# 3. Neither the name of the copyright holder nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES(INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+#         SERVICES
+#         LOSS OF USE, DATA, OR PROFITS
+#         OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT(INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""Tests for the retry and hedging of epiccore requests against a local
+HTTP server that fails requests as each test tells it to."""
+
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from epiccore import Configuration, rest
+from epiccore.exceptions import ApiException
+
+from epiccli.http import share_connections
+from epiccli.retry import RetryPolicy, get_policy, set_policy
+
+
+class FaultyServer(object):
+    """An HTTP server that answers each request with the next of a script of
+    faults, then with 200 "ok" once the script runs out.
+
+    A fault is ("status", code, headers), ("drop",) to close the connection
+    without a response, or ("slow", seconds, body) to answer 200 with body
+    after a delay.
+    """
+
+    def __init__(self, script=()):
+        self.script = [*script]
+        self.requests = []
+        self._lock = threading.Lock()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                server._answer(self)
+
+            def do_POST(self):
+                self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                server._answer(self)
+
+            def log_message(self, *args):
+                pass
+
+        self._httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._httpd.daemon_threads = True
+        self.url = "http://127.0.0.1:{}".format(self._httpd.server_address[1])
+        threading.Thread(target=self._httpd.serve_forever, daemon=True).start()
+
+    def _answer(self, handler):
+        with self._lock:
+            self.requests.append((handler.command, time.monotonic()))
+            fault = self.script.pop(0) if self.script else ("status", 200, {})
+        if fault[0] == "drop":
+            handler.close_connection = True
+            return
+        status, headers, body = 200, {}, b"ok"
+        if fault[0] == "slow":
+            time.sleep(fault[1])
+            body = fault[2]
+        else:
+            status, headers = fault[1], fault[2]
+        handler.send_response(status)
+        for name, value in headers.items():
+            handler.send_header(name, value)
+        handler.send_header("Content-Length", str(len(body)))
+        handler.end_headers()
+        handler.wfile.write(body)
+
+    def close(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+
+@pytest.fixture
+def policy():
+    """ Install a RetryPolicy with short delays for the test """
+    share_connections()
+    previous = get_policy()
+    policy = RetryPolicy(retries=3, backoff=0.01, max_backoff=1.0, read_timeout=5.0)
+    set_policy(policy)
+    yield policy
+    set_policy(previous)
+
+
+@pytest.fixture
+def server():
+    servers = []
+
+    def start(*script):
+        servers.append(FaultyServer(script))
+        return servers[-1]
+
+    yield start
+    for faulty in servers:
+        faulty.close()
+
+
+def request(server, method="GET"):
+    client = rest.RESTClientObject(Configuration(host=server.url))
+    body = {} if method == "POST" else None
+    return client.request(method, server.url + "/api/v2/test/", body=body)
+
+
+def test_server_errors_are_retried(policy, server):
+    faulty = server(("status", 503, {}), ("status", 500, {}), ("status", 502, {}))
+    response = request(faulty)
+    assert response.status == 200
+    assert len(faulty.requests) == 4
+
+
+def test_gives_up_after_retries(policy, server):
+    faulty = server(*[("status", 500, {})] * 5)
+    with pytest.raises(ApiException) as error:
+        request(faulty)
+    assert error.value.status == 500
+    assert len(faulty.requests) == policy.retries + 1
+
+
+def test_retry_after_is_respected(policy, server):
+    faulty = server(("status", 429, {"Retry-After": "0.3"}))
+    response = request(faulty)
+    assert response.status == 200
+    (_, first), (_, second) = faulty.requests
+    assert second - first >= 0.3
+
+
+def test_retry_after_is_capped(server):
+    share_connections()
+    previous = get_policy()
+    set_policy(RetryPolicy(retries=1, backoff=0.01, max_backoff=0.2))
+    try:
+        faulty = server(("status", 503, {"Retry-After": "3600"}))
+        started = time.monotonic()
+        assert request(faulty).status == 200
+        assert time.monotonic() - started < 2
+    finally:
+        set_policy(previous)
+
+
+def test_dropped_connection_is_retried(policy, server):
+    faulty = server(("drop",), ("drop",))
+    response = request(faulty)
+    assert response.status == 200
+    assert len(faulty.requests) == 3
+
+
+def test_post_is_not_retried_after_server_error(policy, server):
+    faulty = server(("status", 500, {}))
+    with pytest.raises(ApiException) as error:
+        request(faulty, "POST")
+    assert error.value.status == 500
+    assert len(faulty.requests) == 1
+
+
+def test_post_is_not_retried_after_dropped_connection(policy, server):
+    faulty = server(("drop",))
+    with pytest.raises(Exception):
+        request(faulty, "POST")
+    assert len(faulty.requests) == 1
+
+
+def test_post_is_retried_when_not_processed(policy, server):
+    faulty = server(("status", 503, {}), ("status", 429, {"Retry-After": "0"}))
+    response = request(faulty, "POST")
+    assert response.status == 200
+    assert len(faulty.requests) == 3
+
+
+def test_hedged_get_uses_first_response(policy, server):
+    policy.hedge_after = 0.1
+    faulty = server(("slow", 2.0, b"slow"), ("slow", 0.0, b"fast"))
+    started = time.monotonic()
+    response = request(faulty)
+    assert response.data == b"fast"
+    assert time.monotonic() - started < 1.5
+    assert len(faulty.requests) == 2
+
+
+def test_fast_get_is_not_hedged(policy, server):
+    policy.hedge_after = 1.0
+    faulty = server()
+    assert request(faulty).data == b"ok"
+    assert len(faulty.requests) == 1
+
+
+def test_post_is_not_hedged(policy, server):
+    policy.hedge_after = 0.1
+    faulty = server(("slow", 0.5, b"slow"))
+    assert request(faulty, "POST").data == b"slow"
+    assert len(faulty.requests) == 1
+
+
+def test_backoff_is_jittered_and_capped():
+    policy = RetryPolicy(backoff=0.5, max_backoff=4.0)
+    random.seed(1)
+    for attempt in range(8):
+        delays = [policy.delay(attempt) for _ in range(200)]
+        limit = min(4.0, 0.5 * 2 ** attempt)
+        assert all(0 <= delay <= limit for delay in delays)
+        assert len(set(delays)) > 100
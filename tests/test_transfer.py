@@ -0,0 +1,283 @@
+# BSD 3 - Clause License
+
+# Copyright(c) 2020, Zenotech
+# All rights reserved.
+
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+
+# 1. Redistributions of source code must retain the above copyright notice, this
+# list of conditions and the following disclaimer.
+
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and / or other materials provided with the distribution.
+
+# 3. Neither the name of the copyright holder nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES(INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+#         SERVICES
+#         LOSS OF USE, DATA, OR PROFITS
+#         OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT(INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""Tests for planning syncs by merging a sorted local walk with a sorted
+listing of the S3 stand-in used by the benchmarks."""
+
+import os
+import sys
+import time
+
+import pytest
+
+from epiccli.filters import PathFilter
+from epiccli.storage import Storage
+from epiccli.transfer import (
+    COPY,
+    DELETE,
+    SKIP,
+    NEW,
+    NOT_IN_SOURCE,
+    SIZE_DIFFERS,
+    NEWER,
+    SAME,
+    merge_join,
+    plan_download,
+    plan_upload,
+    walk_local,
+)
+
+sys.path.insert(
+    0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks")
+)
+from fake_s3 import FakeS3, StoredObject  # noqa: E402
+
+BUCKET = "bucket"
+PREFIX = "user/sync/"
+
+# Names around "/" in sort order: "-" and "." sort before it and "0"
+# after, so a folder's files must come between them
+TRICKY_PATHS = ["a-b", "a.txt", "a/x", "a/y/z", "a0", "ab/c", "b"]
+
+
+@pytest.fixture(scope="module")
+def fake_s3():
+    server = FakeS3().start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def storage(fake_s3):
+    import boto3
+
+    fake_s3.store.pop(BUCKET, None)
+    client = boto3.client(
+        "s3",
+        endpoint_url=fake_s3.url,
+        region_name="eu-west-1",
+        aws_access_key_id="test",
+        aws_secret_access_key="test",
+    )
+    return Storage(client, BUCKET, "user/")
+
+
+def put_remote(fake_s3, paths, size=1, modified=None):
+    bucket = fake_s3.bucket(BUCKET)
+    modified = time.time() if modified is None else modified
+    for path in paths:
+        body = b"x" * size
+        bucket.put(PREFIX + path, StoredObject(size, '"etag-{}"'.format(size), modified, body))
+
+
+def put_local(root, paths, size=1, mtime=None):
+    for path in paths:
+        full_path = os.path.join(str(root), *path.split("/"))
+        os.makedirs(os.path.dirname(full_path), exist_ok=True)
+        with open(full_path, "wb") as f:
+            f.write(b"x" * size)
+        if mtime is not None:
+            os.utime(full_path, (mtime, mtime))
+
+
+def decisions(tasks):
+    return {
+        task.path: (task.action, task.reason) for task in tasks if not task.folder
+    }
+
+
+def test_merge_join_pairs_paths():
+    source = [("a", 1), ("b", 2), ("d", 4)]
+    destination = [("b", 20), ("c", 30), ("d", 40), ("e", 50)]
+    assert [*merge_join(source, destination)] == [
+        ("a", 1, None),
+        ("b", 2, 20),
+        ("c", None, 30),
+        ("d", 4, 40),
+        ("e", None, 50),
+    ]
+
+
+def test_merge_join_with_an_empty_side():
+    assert [*merge_join([], [("a", 1)])] == [("a", None, 1)]
+    assert [*merge_join([("a", 1)], [])] == [("a", 1, None)]
+    assert [*merge_join([], [])] == []
+
+
+@pytest.mark.parametrize(
+    "source, destination",
+    [
+        ([("b", 1), ("a", 2)], []),
+        ([], [("b", 1), ("a", 2)]),
+        ([("a", 1), ("a", 2)], [("a", 3)]),
+    ],
+)
+def test_merge_join_rejects_unsorted_listings(source, destination):
+    with pytest.raises(ValueError):
+        [*merge_join(source, destination)]
+
+
+def test_walk_local_yields_key_order(tmp_path):
+    put_local(tmp_path, TRICKY_PATHS)
+    assert [path for path, _, _, _ in walk_local(str(tmp_path))] == sorted(TRICKY_PATHS)
+
+
+def test_walk_local_prunes_and_filters(tmp_path):
+    put_local(tmp_path, TRICKY_PATHS)
+    path_filter = PathFilter(exclude=["a/", "*.txt"])
+    paths = [path for path, _, _, _ in walk_local(str(tmp_path), path_filter)]
+    assert paths == ["a-b", "a0", "ab/c", "b"]
+
+
+def test_walk_local_of_missing_root(tmp_path):
+    assert [*walk_local(str(tmp_path / "missing"))] == []
+
+
+@pytest.mark.parametrize("workers", [1, 4])
+@pytest.mark.parametrize("exclude", [[], ["skip/"]])
+def test_walk_sorted_yields_key_order(fake_s3, storage, workers, exclude):
+    put_remote(fake_s3, TRICKY_PATHS + ["skip/x", "a/y-z", "a/y.z"])
+    # An exclude that can prune makes the walk list one folder at a time
+    path_filter = PathFilter(exclude=exclude)
+    keys = [
+        obj.key[len(PREFIX) :]
+        for obj in storage.walk_sorted(PREFIX, path_filter, workers=workers)
+    ]
+    expected = sorted(TRICKY_PATHS + ["a/y-z", "a/y.z"] + ([] if exclude else ["skip/x"]))
+    assert keys == expected
+
+
+def test_upload_of_identical_tricky_trees_copies_nothing(fake_s3, storage, tmp_path):
+    put_local(tmp_path, TRICKY_PATHS)
+    put_remote(fake_s3, TRICKY_PATHS)
+    tasks = [
+        *plan_upload(storage, str(tmp_path), PREFIX, compare="size", delete=True)
+    ]
+    assert decisions(tasks) == {path: (SKIP, SAME) for path in TRICKY_PATHS}
+
+
+def test_download_of_identical_tricky_trees_copies_nothing(fake_s3, storage, tmp_path):
+    put_local(tmp_path, TRICKY_PATHS)
+    put_remote(fake_s3, TRICKY_PATHS)
+    tasks = [
+        *plan_download(storage, PREFIX, str(tmp_path), compare="size", delete=True)
+    ]
+    assert decisions(tasks) == {path: (SKIP, SAME) for path in TRICKY_PATHS}
+
+
+def test_upload_decisions(fake_s3, storage, tmp_path):
+    now = time.time()
+    put_local(tmp_path, ["new", "a/same", "a/bigger"], mtime=now - 3600)
+    put_local(tmp_path, ["a.newer"], mtime=now)
+    put_local(tmp_path, ["a/bigger"], size=5, mtime=now - 3600)
+    put_remote(fake_s3, ["a/same", "a/bigger", "a.newer", "a-only", "a/only"], modified=now - 60)
+    tasks = [*plan_upload(storage, str(tmp_path), PREFIX)]
+    assert decisions(tasks) == {
+        "new": (COPY, NEW),
+        "a/same": (SKIP, SAME),
+        "a/bigger": (SKIP, SAME),
+        "a.newer": (COPY, NEWER),
+    }
+    tasks = [*plan_upload(storage, str(tmp_path), PREFIX, compare="size", delete=True)]
+    assert decisions(tasks) == {
+        "new": (COPY, NEW),
+        "a/same": (SKIP, SAME),
+        "a/bigger": (COPY, SIZE_DIFFERS),
+        "a.newer": (SKIP, SAME),
+        "a-only": (DELETE, NOT_IN_SOURCE),
+        "a/only": (DELETE, NOT_IN_SOURCE),
+    }
+    deletes = [task for task in tasks if task.delete]
+    assert sorted(task.target for task in deletes) == [PREFIX + "a-only", PREFIX + "a/only"]
+
+
+def test_download_decisions(fake_s3, storage, tmp_path):
+    put_remote(fake_s3, ["new", "a/same", "a/smaller"])
+    put_local(tmp_path, ["a/same", "a-only", "a/only/x"])
+    put_local(tmp_path, ["a/smaller"], size=5)
+    tasks = [*plan_download(storage, PREFIX, str(tmp_path), compare="size")]
+    assert decisions(tasks) == {
+        "a/same": (SKIP, SAME),
+        "a/smaller": (COPY, SIZE_DIFFERS),
+        "new": (COPY, NEW),
+    }
+    tasks = [*plan_download(storage, PREFIX, str(tmp_path), compare="size", delete=True)]
+    deletes = sorted(task.target for task in tasks if task.delete)
+    assert deletes == [
+        os.path.join(str(tmp_path), "a-only"),
+        os.path.join(str(tmp_path), "a", "only", "x"),
+    ]
+
+
+def test_upload_delete_spares_excluded_files(fake_s3, storage, tmp_path):
+    put_local(tmp_path, ["keep/a"])
+    put_remote(fake_s3, ["keep/a", "keep/b", "logs/run.log", "x.log", "processor0/U"])
+    path_filter = PathFilter(exclude=["*.log", "processor*/"])
+    tasks = [
+        *plan_upload(
+            storage, str(tmp_path), PREFIX, compare="size", path_filter=path_filter, delete=True
+        )
+    ]
+    assert decisions(tasks) == {
+        "keep/a": (SKIP, SAME),
+        "keep/b": (DELETE, NOT_IN_SOURCE),
+    }
+
+
+def test_download_delete_spares_excluded_files(fake_s3, storage, tmp_path):
+    put_remote(fake_s3, ["keep/a"])
+    put_local(tmp_path, ["keep/a", "keep/b", "x.log", "processor0/U"])
+    path_filter = PathFilter(exclude=["*.log", "processor*/"])
+    tasks = [
+        *plan_download(
+            storage, PREFIX, str(tmp_path), compare="size", path_filter=path_filter, delete=True
+        )
+    ]
+    assert decisions(tasks) == {
+        "keep/a": (SKIP, SAME),
+        "keep/b": (DELETE, NOT_IN_SOURCE),
+    }
+
+
+def test_upload_delete_of_folder_markers(fake_s3, storage, tmp_path):
+    os.makedirs(str(tmp_path / "empty"))
+    put_remote(fake_s3, ["empty/", "gone/"], size=0)
+    tasks = [*plan_upload(storage, str(tmp_path), PREFIX, delete=True)]
+    assert [(task.path, task.action) for task in tasks] == [("gone/", DELETE)]
+
+
+def test_upload_without_delete_keeps_extra_files(fake_s3, storage, tmp_path):
+    put_local(tmp_path, ["a"])
+    put_remote(fake_s3, ["b"])
+    tasks = [*plan_upload(storage, str(tmp_path), PREFIX)]
+    assert decisions(tasks) == {"a": (COPY, NEW)}